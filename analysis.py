@@ -0,0 +1,518 @@
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import openai
+
+import metrics
+import prefilter
+from storage import closing_connection, conversation_stem
+
+# 관련성 분석 모델 및 동시 실행 설정
+RELEVANCE_MODEL = "gpt-4o"
+DEFAULT_MAX_WORKERS = 8
+
+# 한 번의 요청으로 판단할 메시지 수 (1이면 메시지마다 따로 요청)
+DEFAULT_BATCH_SIZE = 20
+
+# 요청 한도(429)·일시적 오류 재시도 설정
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+# 이보다 짧은 메시지는 GPT에 보내지 않고 관련없음으로 처리
+MIN_MESSAGE_LENGTH = 3
+
+_metrics = metrics.get_registry()
+RETRIES = _metrics.counter("openai_retries_total", "일시적 오류로 다시 보낸 API 호출 수", ("source", "error"))
+VERDICT_CACHE_LOOKUPS = _metrics.counter("relevance_cache_lookups_total", "관련성 판정 캐시 조회 수", ("result",))
+
+
+def _retry_delay(error, attempt):
+    """서버가 알려준 Retry-After를 우선 사용하고, 없으면 지수 백오프 + 지터"""
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), RETRY_MAX_DELAY)
+            except ValueError:
+                pass
+    delay = min(RETRY_BASE_DELAY * (2 ** attempt), RETRY_MAX_DELAY)
+    return delay * (0.5 + random.random() / 2)
+
+
+def call_with_retry(func, *args, **kwargs):
+    """요청 한도 초과나 일시적 오류일 때 기다렸다가 다시 호출"""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return func(*args, **kwargs)
+        except RETRYABLE_ERRORS as e:
+            if attempt == MAX_RETRIES:
+                raise
+            RETRIES.inc(source="analysis", error=type(e).__name__)
+            time.sleep(_retry_delay(e, attempt))
+
+
+RELEVANCE_PROMPT_TEMPLATE = """
+    다음 학생의 메시지가 기후 위기 스토리보드 작성과 관련된 의미있는 내용인지 판단해주세요.
+    
+    학생 메시지: "{message_content}"
+    
+    다음 기준으로 판단해주세요:
+    
+    관련된 내용:
+    - 스토리보드 주제, 구성, 캐릭터, 장면에 대한 질문이나 아이디어
+    - 기후 위기 관련 내용 문의 및 토론
+    - 창작 과정에서의 구체적인 고민이나 요청
+    - 스토리보드 제작 방법에 대한 질문
+    - 발표 준비나 피드백 요청
+    - 구체적인 시나리오나 상황 설정에 대한 논의
+    
+    관련없는 내용:
+    - 단순 인사말 ("안녕하세요", "감사합니다", "네", "좋아요")
+    - 수행평가와 무관한 잡담이나 개인적인 이야기
+    - 너무 짧거나 의미없는 응답 ("몰라요", "음", "어")
+    - 단순 확인 응답 ("알겠습니다", "네 맞아요")
+    
+    답변: "관련됨" 또는 "관련없음" 중 하나만 정확히 답하세요.
+    """
+
+
+# GPT를 활용한 메시지 관련성 분석 함수
+def _request_relevance(client, message_content):
+    """메시지 하나를 GPT로 판단 (실패하면 예외 발생)"""
+    analysis_prompt = RELEVANCE_PROMPT_TEMPLATE.format(message_content=message_content)
+    response = call_with_retry(
+        client.chat.completions.create,
+        model=RELEVANCE_MODEL,
+        messages=[{"role": "user", "content": analysis_prompt}],
+        temperature=0.1,
+    )
+    result = response.choices[0].message.content.strip()
+    return "관련됨" in result
+
+
+def analyze_message_relevance(client, message_content):
+    """GPT를 사용해서 메시지가 스토리보드 관련인지 판단"""
+    try:
+        return _request_relevance(client, message_content)
+    except Exception as e:
+        print(f"메시지 분석 중 오류: {str(e)}")
+        return True
+
+
+BATCH_RELEVANCE_INSTRUCTIONS = """
+다음은 기후 위기 스토리보드 수행평가 중 학생들이 보낸 메시지 목록입니다.
+각 메시지가 기후 위기 스토리보드 작성과 관련된 의미있는 내용인지 판단해주세요.
+
+관련된 내용:
+- 스토리보드 주제, 구성, 캐릭터, 장면에 대한 질문이나 아이디어
+- 기후 위기 관련 내용 문의 및 토론
+- 창작 과정에서의 구체적인 고민이나 요청
+- 스토리보드 제작 방법에 대한 질문
+- 발표 준비나 피드백 요청
+- 구체적인 시나리오나 상황 설정에 대한 논의
+
+관련없는 내용:
+- 단순 인사말 ("안녕하세요", "감사합니다", "네", "좋아요")
+- 수행평가와 무관한 잡담이나 개인적인 이야기
+- 너무 짧거나 의미없는 응답 ("몰라요", "음", "어")
+- 단순 확인 응답 ("알겠습니다", "네 맞아요")
+
+메시지 목록은 {"index": 번호, "message": 내용} 형식의 JSON 배열로 주어집니다.
+반드시 아래 JSON 형식으로, 모든 index에 대해 관련됨이면 true, 관련없음이면 false로 답하세요:
+{"verdicts": {"0": true, "1": false}}
+"""
+
+
+def _parse_batch_verdicts(text, count):
+    """배치 응답에서 index별 판정을 꺼냄 (형식이 어긋나거나 빠진 index가 있으면 None)"""
+    try:
+        results = json.loads(text)["verdicts"]
+    except (TypeError, ValueError, KeyError):
+        return None
+    if not isinstance(results, dict) or len(results) != count:
+        return None
+
+    verdicts = []
+    for index in range(count):
+        relevant = results.get(str(index))
+        if not isinstance(relevant, bool):
+            return None
+        verdicts.append(relevant)
+    return verdicts
+
+
+def _classify_batch(client, contents):
+    """여러 메시지를 한 번의 JSON 응답 요청으로 판단 (요청이 실패한 메시지는 None)
+
+    응답이 형식에 맞지 않거나 요청이 실패하면 메시지마다 따로 판단한다.
+    """
+    verdicts = None
+    if len(contents) > 1:
+        payload = json.dumps(
+            [{"index": index, "message": content} for index, content in enumerate(contents)],
+            ensure_ascii=False
+        )
+        try:
+            response = call_with_retry(
+                client.chat.completions.create,
+                model=RELEVANCE_MODEL,
+                messages=[{"role": "system", "content": BATCH_RELEVANCE_INSTRUCTIONS},
+                          {"role": "user", "content": f"메시지 목록:\n{payload}"}],
+                temperature=0.1,
+                response_format={"type": "json_object"}
+            )
+            verdicts = _parse_batch_verdicts(response.choices[0].message.content, len(contents))
+        except Exception as e:
+            print(f"배치 메시지 분석 중 오류: {str(e)}")
+
+    if verdicts is None:
+        verdicts = []
+        for content in contents:
+            try:
+                verdicts.append(_request_relevance(client, content))
+            except Exception as e:
+                print(f"메시지 분석 중 오류: {str(e)}")
+                verdicts.append(None)
+    return verdicts
+
+
+def classify_batch(client, contents):
+    """여러 메시지를 한 번의 요청으로 판단 (실패한 메시지는 기존처럼 관련됨으로 처리)"""
+    return [True if verdict is None else verdict for verdict in _classify_batch(client, contents)]
+
+
+# ─────────────────────────────────────────────
+# 판정 캐시 (메시지 내용 + 프롬프트 + 모델 기준)
+# ─────────────────────────────────────────────
+# 프롬프트나 모델이 바뀌면 키가 달라져 이전 판정을 재사용하지 않음
+PROMPT_VERSION = hashlib.sha256(
+    (RELEVANCE_PROMPT_TEMPLATE + BATCH_RELEVANCE_INSTRUCTIONS).encode("utf-8")
+).hexdigest()[:12]
+
+
+def normalize_message(content):
+    """공백·유니코드 표기 차이를 없앤 메시지 (같은 내용이면 같은 키)"""
+    return " ".join(unicodedata.normalize("NFC", content).split())
+
+
+def verdict_key(content):
+    raw = f"{PROMPT_VERSION}\0{RELEVANCE_MODEL}\0{normalize_message(content)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """디스크(SQLite)에 남는 관련성 판정 캐시
+
+    과거 메시지는 바뀌지 않으므로 한 번 판단한 메시지는 다시 분석할 때 GPT를 부르지 않는다.
+    hits / misses는 프로세스 시작 후 누적값이다. (분석 한 번의 값은 classify_messages의 stats로 받음)
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts ("
+                "key TEXT PRIMARY KEY, relevant INTEGER NOT NULL, created_at TEXT NOT NULL)"
+            )
+
+    def _connect(self):
+        return closing_connection(sqlite3.connect(self.db_path, timeout=30))
+
+    def get_many(self, keys):
+        keys = list(keys)
+        found = {}
+        with self._connect() as conn:
+            # SQLite 변수 개수 제한을 넘지 않도록 나눠서 조회
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for key, relevant in conn.execute(
+                        f"SELECT key, relevant FROM verdicts WHERE key IN ({placeholders})", chunk):
+                    found[key] = bool(relevant)
+        return found
+
+    def put_many(self, verdicts):
+        if not verdicts:
+            return
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO verdicts (key, relevant, created_at) VALUES (?, ?, ?)",
+                [(key, int(relevant), now) for key, relevant in verdicts.items()]
+            )
+
+    def record(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        VERDICT_CACHE_LOOKUPS.inc(hits, result="hit")
+        VERDICT_CACHE_LOOKUPS.inc(misses, result="miss")
+
+    def size(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_verdict_cache(db_path):
+    """경로별로 프로세스 전체에서 공유하는 판정 캐시"""
+    key = os.path.abspath(db_path)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = VerdictCache(db_path)
+        return _caches[key]
+
+
+def _user_messages(conversation):
+    """분석 대상이 되는 학생 메시지 (너무 짧은 메시지 제외)"""
+    return [
+        msg["content"] for msg in conversation["messages"]
+        if msg["role"] == "user" and len(msg["content"].strip()) >= MIN_MESSAGE_LENGTH
+    ]
+
+
+def count_relevant_prompts(client, conversation, use_prefilter=True):
+    """대화에서 스토리보드 관련 프롬프트 수 계산 (한 번에 하나씩 순차 호출)"""
+    count = 0
+    for content in _user_messages(conversation):
+        verdict = prefilter.get_prefilter().classify(content) if use_prefilter else None
+        if verdict is None:
+            verdict = analyze_message_relevance(client, content)
+        count += 1 if verdict else 0
+    return count
+
+
+def _add_stats(stats, **counts):
+    for name, value in counts.items():
+        stats[name] = stats.get(name, 0) + value
+
+
+def classify_messages(client, contents, max_workers=DEFAULT_MAX_WORKERS, progress_callback=None,
+                      batch_size=DEFAULT_BATCH_SIZE, cache=None, use_prefilter=True, stats=None):
+    """여러 메시지의 관련성을 제한된 스레드 풀에서 동시에 판단
+
+    로컬 사전 분류(prefilter)로 확실한 메시지는 바로 판정하고, 같은 내용의 메시지는 한 번만,
+    캐시에 있는 메시지는 요청 없이 처리한 뒤 나머지를 batch_size개씩 묶어 보낸다.
+    결과는 입력 순서대로 반환한다. progress_callback은 호출한 스레드에서만 불리므로
+    Streamlit 요소를 그대로 갱신해도 된다.
+    stats(dict)를 주면 로컬 판정 수(relevant / irrelevant / ambiguous)와 캐시 적중·미스 수
+    (hits / misses)를 더한다. 여러 번 나눠 부른 분석의 합계를 따로 모을 때 사용한다.
+    """
+    if not contents:
+        return []
+
+    if use_prefilter:
+        local = prefilter.get_prefilter().classify_many(contents)
+        if stats is not None:
+            _add_stats(stats, relevant=local.count(True), irrelevant=local.count(False),
+                       ambiguous=local.count(None))
+        ambiguous = [content for content, verdict in zip(contents, local) if verdict is None]
+        remote = iter(classify_messages(client, ambiguous, max_workers=max_workers,
+                                        progress_callback=progress_callback, batch_size=batch_size,
+                                        cache=cache, use_prefilter=False, stats=stats))
+        return [next(remote) if verdict is None else verdict for verdict in local]
+
+    keys = [verdict_key(content) for content in contents]
+    known = cache.get_many(set(keys)) if cache is not None else {}
+
+    pending = {}
+    for key, content in zip(keys, contents):
+        if key not in known and key not in pending:
+            pending[key] = content
+    pending_keys = list(pending)
+
+    batch_size = max(1, batch_size)
+    batches = [pending_keys[start:start + batch_size] for start in range(0, len(pending_keys), batch_size)]
+    new_verdicts = {}
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(_classify_batch, client, [pending[key] for key in batch]): batch
+                   for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            new_verdicts.update(zip(batch, future.result()))
+            done += len(batch)
+            if progress_callback:
+                progress_callback(done, len(pending_keys))
+
+    if cache is not None:
+        # 요청이 실패한 판정(None)은 저장하지 않아 다음 분석 때 다시 시도
+        cache.put_many({key: verdict for key, verdict in new_verdicts.items() if verdict is not None})
+        hits = sum(1 for key in keys if key in known)
+        cache.record(hits, len(keys) - hits)
+        if stats is not None:
+            _add_stats(stats, hits=hits, misses=len(keys) - hits)
+
+    verdicts = dict(known, **new_verdicts)
+    return [True if verdicts[key] is None else verdicts[key] for key in keys]
+
+
+def summarize_conversation(conversation):
+    """대화 하나의 기본 통계 (메시지 수, 대화 시간, 피드백 여부)"""
+    messages = conversation["messages"]
+    if messages:
+        first_msg_time = datetime.strptime(messages[0]["timestamp"], "%Y-%m-%d %H:%M:%S")
+        last_msg_time = datetime.strptime(messages[-1]["timestamp"], "%Y-%m-%d %H:%M:%S")
+        duration = (last_msg_time - first_msg_time).total_seconds() / 60
+    else:
+        duration = 0
+
+    return {
+        "user_messages": sum(1 for msg in messages if msg["role"] == "user"),
+        "assistant_messages": sum(1 for msg in messages if msg["role"] == "assistant"),
+        "duration": round(duration, 1),
+        "has_feedback": "feedback" in conversation and len(conversation["feedback"]) > 0
+    }
+
+
+def summarize_student(conversation):
+    """관리자 대시보드의 학생별 요약 행"""
+    summary = summarize_conversation(conversation)
+    summary.update({
+        "student_name": conversation["student_name"],
+        "student_id": conversation["student_id"],
+        "total_messages": len(conversation["messages"])
+    })
+    return summary
+
+
+class SummaryIndex:
+    """학생별 요약 행을 보관하고, 바뀐 학생의 대화만 다시 읽어 계산하는 증분 집계
+
+    Streamlit이 다시 실행될 때마다(라디오 버튼 변경 포함) 모든 대화를 읽고
+    계산하지 않도록 저장소의 버전(파일 수정 시각·크기 또는 DB 행 수)만 비교한다.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._rows = {}
+        self.last_refresh = {"changed": 0, "removed": 0, "total": 0}
+
+    def refresh(self):
+        """변경된 학생만 다시 계산하고 전체 요약 행 목록을 반환"""
+        with self._lock:
+            versions = self.backend.conversation_versions()
+            changed = [key for key, version in versions.items()
+                       if key not in self._rows or self._rows[key][0] != version]
+            removed = [key for key in self._rows if key not in versions]
+
+            for key in removed:
+                del self._rows[key]
+            for key in changed:
+                conversation = self.backend.load_conversation_by_key(key)
+                if conversation is None:
+                    self._rows.pop(key, None)
+                else:
+                    self._rows[key] = (versions[key], summarize_student(conversation))
+
+            self.last_refresh = {"changed": len(changed), "removed": len(removed), "total": len(self._rows)}
+            return [self._rows[key][1] for key in sorted(self._rows, key=str)]
+
+
+_summary_indexes = {}
+_summary_indexes_lock = threading.Lock()
+
+
+def get_summary_index(backend):
+    """저장소별로 프로세스 전체에서 공유하는 요약 집계"""
+    with _summary_indexes_lock:
+        if id(backend) not in _summary_indexes:
+            _summary_indexes[id(backend)] = SummaryIndex(backend)
+        return _summary_indexes[id(backend)]
+
+
+def analyze_conversations_with_gpt(client, conversations, progress_callback=None,
+                                   max_workers=DEFAULT_MAX_WORKERS, batch_size=DEFAULT_BATCH_SIZE, cache=None,
+                                   stats=None):
+    """여러 대화를 GPT로 분석 (진행 상황 표시 포함)
+
+    모든 학생의 메시지를 한꺼번에 모아 묶음 단위로 동시에 판단한 뒤 학생별로 다시 나눈다.
+    progress_callback(완료한 메시지 수, 전체 메시지 수), stats는 classify_messages와 같음
+    """
+    per_student = [_user_messages(conv) for conv in conversations]
+    flat = [content for contents in per_student for content in contents]
+    verdicts = classify_messages(client, flat, max_workers=max_workers, progress_callback=progress_callback,
+                                 batch_size=batch_size, cache=cache, stats=stats)
+
+    analyzed_data = []
+    offset = 0
+    for conv, contents in zip(conversations, per_student):
+        relevant_count = sum(1 for verdict in verdicts[offset:offset + len(contents)] if verdict)
+        offset += len(contents)
+
+        summary = summarize_conversation(conv)
+        total_user_messages = summary["user_messages"]
+
+        analyzed_data.append({
+            "학생명": conv["student_name"],
+            "학번": conv["student_id"],
+            "관련 프롬프트 수": relevant_count,
+            "전체 메시지 수": total_user_messages,
+            "AI 응답 수": summary["assistant_messages"],
+            "관련도": f"{relevant_count}/{total_user_messages}" if total_user_messages > 0 else "0/0",
+            "대화 시간(분)": summary["duration"],
+            "피드백 여부": "O" if summary["has_feedback"] else "X"
+        })
+
+    return analyzed_data
+
+
+# 백그라운드 일괄 분석 (jobs.JobRunner에 등록해서 사용)
+ANALYSIS_JOB_KIND = "gpt_analysis"
+# 이만큼의 학생을 분석할 때마다 결과를 저장 (중단되어도 저장된 학생은 다시 분석하지 않음)
+JOB_CHUNK_SIZE = 10
+
+
+def run_analysis_job(job, client, backend, cache=None, chunk_size=JOB_CHUNK_SIZE):
+    """전체 학생 대화를 몇 명씩 나눠 분석하고 학생별 결과를 작업 저장소에 남김
+
+    job.params: max_workers, batch_size (선택)
+    묶음 사이마다 취소 요청을 확인하며, 이어서 실행하면 이미 저장된 학생은 건너뛴다.
+    로컬 판정 수와 캐시 적중·미스 수는 묶음마다 더해 작업 요약(job.summary)에 남긴다.
+    """
+    stats = dict(job.summary)
+    conversations = backend.load_all_conversations()
+    done_keys = job.done_keys()
+    pending = [conv for conv in conversations
+               if conversation_stem(conv["student_id"], conv["student_name"]) not in done_keys]
+    total = len(conversations)
+    done = total - len(pending)
+    job.progress(done, total)
+
+    for start in range(0, len(pending), chunk_size):
+        if job.cancelled():
+            return
+        chunk = pending[start:start + chunk_size]
+        rows = analyze_conversations_with_gpt(
+            client, chunk,
+            max_workers=job.params.get("max_workers", DEFAULT_MAX_WORKERS),
+            batch_size=job.params.get("batch_size", DEFAULT_BATCH_SIZE),
+            cache=cache,
+            stats=stats
+        )
+        job.save_summary(stats)
+        job.checkpoint({conversation_stem(conv["student_id"], conv["student_name"]): row
+                        for conv, row in zip(chunk, rows)})
+        done += len(chunk)
+        job.progress(done, total)
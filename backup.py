@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from datetime import datetime
+
+from storage import file_lock
+
+# 데이터 백업 (ZIP)
+# - 저장된 파일을 해석하지 않고 바이트 그대로 조금씩 복사해 임시 파일에 씀 (전체를 메모리에 올리지 않음)
+# - 변경분 백업은 지난 백업 이후 바뀐 파일만 넣음 (크기·수정 시각이 같으면 건너뛰고, 다르면 해시로 확인)
+# - 압축 파일마다 manifest.json에 그 시점 전체 파일의 해시 목록을 넣어, 전체 백업 위에 변경분 백업을
+#   순서대로 풀면 같은 상태가 됨 (removed에 있는 파일은 지움)
+
+BACKUP_DIRNAME = "backups"
+MANIFEST_NAME = "manifest.json"
+# 지난 백업의 파일 목록 (변경분 백업의 기준)
+STATE_FILENAME = "last_manifest.json"
+
+CHUNK_SIZE = 1024 * 1024
+
+# 이미 압축된 형식은 다시 압축하지 않음
+STORED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+
+FULL = "full"
+INCREMENTAL = "incremental"
+
+
+def _read_chunks(f, size):
+    """파일 앞부분 size 바이트를 조각으로 읽음 (복사하는 동안 로그 뒤에 추가된 기록은 다음 백업에 포함)"""
+    remaining = size
+    while remaining > 0:
+        chunk = f.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _sha256(f, size):
+    """열린 파일 앞부분 size 바이트의 해시 (읽은 뒤 처음 위치로 되돌림)"""
+    digest = hashlib.sha256()
+    for chunk in _read_chunks(f, size):
+        digest.update(chunk)
+    f.seek(0)
+    return digest.hexdigest()
+
+
+class BackupExporter:
+    """저장소 파일과 업로드 이미지를 ZIP으로 내보내는 백업 도구
+
+    만든 압축 파일은 data/backups/에 남는다 (변경분 백업을 복원하려면 앞선 백업도 필요).
+    """
+
+    def __init__(self, backend, backup_dir, image_root=None):
+        self.backend = backend
+        self.backup_dir = backup_dir
+        self.image_root = image_root
+        self.state_path = os.path.join(backup_dir, STATE_FILENAME)
+        os.makedirs(backup_dir, exist_ok=True)
+
+    def _sources(self):
+        """(압축 파일 내 경로, 실제 파일 경로) - 저장소 파일 다음에 이미지 원본 (썸네일은 다시 만들 수 있어 제외)"""
+        yield from self.backend.backup_files()
+        if not self.image_root or not os.path.isdir(self.image_root):
+            return
+        for directory, dirnames, filenames in os.walk(self.image_root):
+            dirnames[:] = sorted(name for name in dirnames if name != "thumbnails" and not name.startswith("."))
+            for filename in sorted(filenames):
+                if filename.startswith("."):
+                    continue
+                path = os.path.join(directory, filename)
+                yield "images/" + os.path.relpath(path, self.image_root).replace(os.sep, "/"), path
+
+    def load_state(self):
+        """지난 백업 정보 (없으면 None)"""
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def export(self, incremental=False):
+        """백업 파일을 만들고 요약을 돌려줌
+
+        지난 백업이 없으면 변경분 백업을 요청해도 전체 백업으로 만든다.
+        """
+        with file_lock(os.path.join(self.backup_dir, ".backup.lock")):
+            previous = self.load_state() if incremental else None
+            mode = INCREMENTAL if previous is not None else FULL
+            previous_files = previous["files"] if previous is not None else {}
+            created_at = datetime.now()
+            archive_name = f"storyboard_backup_{created_at.strftime('%Y%m%d_%H%M%S_%f')}_{mode}.zip"
+
+            files = {}
+            included = []
+            fd, tmp_path = tempfile.mkstemp(dir=self.backup_dir, prefix=".tmp-", suffix=".zip")
+            os.close(fd)
+            try:
+                with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                    for arcname, path in self._sources():
+                        entry = self._add_file(zipf, arcname, path, previous_files.get(arcname))
+                        if entry is None:
+                            continue
+                        if entry.pop("included"):
+                            included.append(arcname)
+                        files[arcname] = entry
+
+                    manifest = {
+                        "created_at": created_at.strftime("%Y-%m-%d %H:%M:%S"),
+                        "mode": mode,
+                        "base": previous["archive"] if previous is not None else None,
+                        "files": {name: {"sha256": entry["sha256"], "size": entry["size"]}
+                                  for name, entry in files.items()},
+                        "included": included,
+                        "removed": sorted(set(previous_files) - set(files)),
+                    }
+                    zipf.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+
+                archive_path = os.path.join(self.backup_dir, archive_name)
+                os.replace(tmp_path, archive_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            # 압축 파일이 완성된 뒤에만 기준을 바꿈 (중간에 실패하면 다음 변경분 백업이 이번 변경도 포함)
+            state = {"archive": archive_name, "created_at": manifest["created_at"], "files": files}
+            state_tmp = self.state_path + ".tmp"
+            with open(state_tmp, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(state_tmp, self.state_path)
+
+        return {
+            "path": archive_path,
+            "archive": archive_name,
+            "mode": mode,
+            "files": len(files),
+            "included": len(included),
+            "removed": len(manifest["removed"]),
+            "included_bytes": sum(files[name]["size"] for name in included),
+            "archive_bytes": os.path.getsize(archive_path),
+        }
+
+    def _add_file(self, zipf, arcname, path, previous):
+        """파일을 압축 파일에 넣고 목록 항목을 돌려줌 (바뀌지 않았으면 넣지 않음, 그사이 지워졌으면 None)"""
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        with f:
+            stat = os.fstat(f.fileno())
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            if previous is not None:
+                if (previous["size"], previous["mtime_ns"]) == (entry["size"], entry["mtime_ns"]):
+                    return dict(entry, sha256=previous["sha256"], included=False)
+                # 수정 시각만 바뀐 파일(다시 만든 SQLite 사본 등)은 내용으로 확인
+                sha256 = _sha256(f, entry["size"])
+                if sha256 == previous["sha256"]:
+                    return dict(entry, sha256=sha256, included=False)
+
+            info = zipfile.ZipInfo(arcname, date_time=datetime.fromtimestamp(stat.st_mtime).timetuple()[:6])
+            extension = os.path.splitext(arcname)[1].lower()
+            info.compress_type = zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            digest = hashlib.sha256()
+            with zipf.open(info, 'w', force_zip64=entry["size"] > 2 ** 31) as target:
+                for chunk in _read_chunks(f, entry["size"]):
+                    digest.update(chunk)
+                    target.write(chunk)
+            return dict(entry, sha256=digest.hexdigest(), included=True)
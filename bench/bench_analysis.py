@@ -0,0 +1,53 @@
+"""GPT 정밀 분석 벤치마크 - 순차 실행과 동시 실행 비교
+
+로컬 목 서버에 대해 analyze_conversations_with_gpt를 순차(max_workers=1)와
+동시 실행으로 각각 돌려 결과가 같은지 확인하고 소요 시간을 비교한다.
+
+실행: python -m bench.bench_analysis --students 30 --messages 40 --latency 0.05 --error-rate 0.05
+"""
+import argparse
+import sys
+import time
+
+from openai import OpenAI
+
+import analysis
+from bench.mock_openai import MockOpenAIServer
+from bench.synthetic import make_conversations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GPT 정밀 분석 순차/동시 실행 비교")
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--messages", type=int, default=40, help="학생당 메시지 수 (학생/AI 합계)")
+    parser.add_argument("--workers", type=int, default=analysis.DEFAULT_MAX_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=1, help="요청당 메시지 수 (1이면 메시지별 요청)")
+    parser.add_argument("--latency", type=float, default=0.05, help="목 서버 응답 지연(초)")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="목 서버 429 비율")
+    args = parser.parse_args(argv)
+
+    conversations = make_conversations(args.students, args.messages)
+    analysis.RETRY_BASE_DELAY = 0.01
+
+    with MockOpenAIServer(latency=args.latency, error_rate=args.error_rate) as server:
+        # 429 재시도는 analysis 쪽에서 처리하므로 SDK 자체 재시도는 끔
+        client = OpenAI(api_key="sk-mock", base_url=server.base_url, max_retries=0)
+
+        timings = {}
+        results = {}
+        for label, workers in (("순차", 1), ("동시", args.workers)):
+            server.reset_stats()
+            started = time.perf_counter()
+            results[label] = analysis.analyze_conversations_with_gpt(
+                client, conversations, max_workers=workers, batch_size=args.batch_size)
+            timings[label] = time.perf_counter() - started
+            print(f"{label}({workers}): {timings[label]:.2f}초, 요청 {server.stats['requests']}건, "
+                  f"429 {server.stats['rate_limited']}건")
+
+    same = results["순차"] == results["동시"]
+    print(f"속도 향상: {timings['순차'] / timings['동시']:.1f}배, 결과 일치: {'예' if same else '아니오'}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
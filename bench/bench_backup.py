@@ -0,0 +1,151 @@
+"""데이터 백업 벤치마크 - 메모리를 모두 쓰는 이전 방식과 파일을 그대로 복사하는 방식 비교
+
+가상 학급 데이터(대화 + 업로드 이미지)로 다음을 측정·확인한다.
+- 이전 방식(모든 대화를 읽어 문자열로 만든 뒤 메모리 안에서 ZIP 생성)과 전체 백업의
+  소요 시간, 파이썬 메모리 최대 사용량(tracemalloc)
+- 일부 학생이 대화를 더 한 뒤 변경분 백업에 담긴 파일 수와 크기
+- 전체 백업 위에 변경분 백업을 풀어 복원한 폴더가 원래 데이터와 같은지 (manifest 해시와 대화 내용)
+
+실행: python -m bench.bench_backup --students 300 --messages 40 --images 100
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+import backup
+import images
+import storage
+from bench.synthetic import make_conversations
+
+
+def populate(backend, image_store, conversations, image_count, image_kb, seed=0):
+    for conversation in conversations:
+        backend.save_data({"type": "student_info", "session_id": conversation["session_id"],
+                           "student_id": conversation["student_id"], "student_name": conversation["student_name"],
+                           "timestamp": conversation["messages"][0]["timestamp"]})
+        for message in conversation["messages"]:
+            add_message(backend, conversation, message["role"], message["content"], message["timestamp"])
+    rng = random.Random(seed)
+    for _ in range(image_count):
+        # 내용은 무작위 바이트 (압축되지 않는 사진과 같은 크기로 취급)
+        image_store.put(rng.randbytes(image_kb * 1024), "image/jpeg")
+
+
+def add_message(backend, conversation, role, content, timestamp):
+    backend.save_data({"type": f"{role}_message", "session_id": conversation["session_id"],
+                       "student_id": conversation["student_id"], "student_name": conversation["student_name"],
+                       "content": content, "timestamp": timestamp})
+
+
+def legacy_backup(backend):
+    """이전 관리자 화면의 백업 (대화를 모두 문자열로 만든 뒤 메모리 안의 ZIP에 씀)"""
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        zipf.writestr("students.json", json.dumps(backend.load_students(), ensure_ascii=False, indent=2))
+        for conversation in backend.load_all_conversations():
+            stem = storage.conversation_stem(conversation["student_id"], conversation["student_name"])
+            zipf.writestr(f"conversations/{stem}.json", json.dumps(conversation, ensure_ascii=False, indent=2))
+    zip_buffer.seek(0)
+    return zip_buffer
+
+
+def measure(func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def restore(archives, target_dir):
+    """압축 파일을 만든 순서대로 풀고, 마지막 manifest와 파일 해시가 모두 맞는지 확인"""
+    manifest = None
+    for archive in archives:
+        with zipfile.ZipFile(archive) as zipf:
+            manifest = json.loads(zipf.read(backup.MANIFEST_NAME))
+            for name in manifest["removed"]:
+                path = os.path.join(target_dir, name)
+                if os.path.exists(path):
+                    os.remove(path)
+            for name in manifest["included"]:
+                zipf.extract(name, target_dir)
+    mismatched = []
+    for name, entry in manifest["files"].items():
+        with open(os.path.join(target_dir, name), 'rb') as f:
+            if hashlib.sha256(f.read()).hexdigest() != entry["sha256"]:
+                mismatched.append(name)
+    return mismatched
+
+
+def _conversation_snapshot(backend):
+    return sorted(json.dumps(conversation, ensure_ascii=False, sort_keys=True)
+                  for conversation in backend.load_all_conversations())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="데이터 백업 방식 비교")
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--messages", type=int, default=40, help="학생당 메시지 수")
+    parser.add_argument("--images", type=int, default=100, help="업로드 이미지 수")
+    parser.add_argument("--image-kb", type=int, default=300, help="이미지 한 장 크기(KB)")
+    parser.add_argument("--changed", type=float, default=0.1, help="변경분 백업 전에 대화를 더 하는 학생 비율")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bench-backup-")
+    try:
+        data_dir = os.path.join(workdir, "data")
+        backend = storage.get_backend(data_dir, args.backend)
+        image_root = os.path.join(data_dir, "images")
+        image_store = images.get_image_store(image_root)
+        conversations = make_conversations(args.students, args.messages)
+        populate(backend, image_store, conversations, args.images, args.image_kb)
+        exporter = backup.BackupExporter(backend, os.path.join(data_dir, backup.BACKUP_DIRNAME), image_root)
+
+        print(f"학생 {args.students}명 × 메시지 {args.messages}개, 이미지 {args.images}장({args.image_kb}KB), "
+              f"저장소 {args.backend}")
+        print(f"{'방식':<22}{'시간(초)':>10}{'메모리 최대(MB)':>18}{'담은 파일':>10}{'압축 파일(MB)':>16}")
+        legacy, elapsed, peak = measure(lambda: legacy_backup(backend))
+        print(f"{'이전 방식 (대화만)':<22}{elapsed:>10.2f}{peak / 2 ** 20:>18.1f}{'-':>10}"
+              f"{len(legacy.getvalue()) / 2 ** 20:>16.1f}")
+        del legacy
+
+        full, elapsed, peak = measure(exporter.export)
+        print(f"{'전체 백업 (이미지 포함)':<22}{elapsed:>10.2f}{peak / 2 ** 20:>18.1f}{full['included']:>10}"
+              f"{full['archive_bytes'] / 2 ** 20:>16.1f}")
+
+        # 일부 학생만 대화를 더 한 뒤 변경분 백업
+        rng = random.Random(1)
+        for conversation in rng.sample(conversations, max(1, int(len(conversations) * args.changed))):
+            add_message(backend, conversation, "user", "마지막 장면을 바꿔 보고 싶어요", "2024-05-13 12:00:00")
+            add_message(backend, conversation, "assistant", "좋아요! 어떤 느낌으로 바꾸고 싶나요?",
+                        "2024-05-13 12:00:05")
+        image_store.put(rng.randbytes(args.image_kb * 1024), "image/jpeg")
+        incremental, elapsed, peak = measure(lambda: exporter.export(incremental=True))
+        print(f"{'변경분 백업':<22}{elapsed:>10.2f}{peak / 2 ** 20:>18.1f}{incremental['included']:>10}"
+              f"{incremental['archive_bytes'] / 2 ** 20:>16.1f}")
+
+        restored_dir = os.path.join(workdir, "restored")
+        mismatched = restore([full["path"], incremental["path"]], restored_dir)
+        restored_backend = (storage.JsonFileBackend(restored_dir) if args.backend == "json"
+                            else storage.SqliteBackend(os.path.join(restored_dir, storage.SQLITE_FILENAME)))
+        same = _conversation_snapshot(restored_backend) == _conversation_snapshot(backend)
+        print(f"복원 확인: 해시 불일치 {len(mismatched)}개, 대화 내용 {'같음' if same else '다름'}")
+        return 0 if same and not mismatched else 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
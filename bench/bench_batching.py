@@ -0,0 +1,56 @@
+"""배치 관련성 판정 벤치마크 - 메시지별 요청과 묶음 요청 비교
+
+stub 클라이언트로 analyze_conversations_with_gpt를 batch_size=1과 묶음 크기로
+각각 실행해 요청 수, 토큰 수, 소요 시간을 비교한다.
+
+실행: python -m bench.bench_batching --students 30 --messages 40 --batch-size 20
+"""
+import argparse
+import sys
+import time
+
+import analysis
+from bench.stub_client import StubOpenAI
+from bench.synthetic import make_conversations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="배치 관련성 판정 토큰/시간 비교")
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--messages", type=int, default=40, help="학생당 메시지 수 (학생/AI 합계)")
+    parser.add_argument("--batch-size", type=int, default=analysis.DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="동시 요청 수 (1이면 순수 배치 효과만 측정)")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="배치 응답을 깨뜨릴 비율")
+    parser.add_argument("--base-latency", type=float, default=0.02, help="요청당 기본 지연(초)")
+    args = parser.parse_args(argv)
+
+    conversations = make_conversations(args.students, args.messages)
+    client = StubOpenAI(base_latency=args.base_latency, prompt_token_latency=0.00001,
+                        completion_token_latency=0.0005, malformed_rate=args.malformed_rate)
+
+    rows = {}
+    results = {}
+    for label, batch_size in (("메시지별", 1), (f"묶음({args.batch_size})", args.batch_size)):
+        client.reset_stats()
+        started = time.perf_counter()
+        results[label] = analysis.analyze_conversations_with_gpt(
+            client, conversations, max_workers=args.workers, batch_size=batch_size)
+        rows[label] = dict(client.stats, seconds=time.perf_counter() - started)
+
+    print(f"{'방식':<10}{'요청 수':>8}{'입력 토큰':>12}{'출력 토큰':>10}{'시간(초)':>10}")
+    for label, row in rows.items():
+        print(f"{label:<10}{row['calls']:>8}{row['prompt_tokens']:>12}{row['completion_tokens']:>10}"
+              f"{row['seconds']:>10.2f}")
+    single, batched = rows.values()
+    single_tokens = single["prompt_tokens"] + single["completion_tokens"]
+    batched_tokens = batched["prompt_tokens"] + batched["completion_tokens"]
+    print(f"토큰 절감: {single_tokens / batched_tokens:.1f}배, 시간 단축: {single['seconds'] / batched['seconds']:.1f}배, "
+          f"깨진 배치 응답: {batched['malformed']}건")
+
+    same = list(results.values())[0] == list(results.values())[1]
+    print(f"결과 일치: {'예' if same else '아니오'}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""OpenAI 클라이언트 재사용 벤치마크 - 호출마다 새 클라이언트 vs 공유 클라이언트
+
+목 서버에 같은 요청을 보내며, Streamlit 재실행처럼 호출마다 클라이언트를 새로 만들 때와
+openai_client.get_client()의 공유 클라이언트를 쓸 때의 새 연결 수와 지연 시간을 비교한다.
+실제 API 주소(--base-url)로 실행하면 TLS 연결 수립 비용까지 확인할 수 있다.
+
+실행: python -m bench.bench_client --calls 50 --latency 0.02
+"""
+import argparse
+import os
+
+from openai import OpenAI
+
+import openai_client
+from bench.mock_openai import MockOpenAIServer
+
+
+def run(make_client, calls):
+    openai_client.get_latency_stats().reset()
+    for index in range(calls):
+        make_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": f"연결 재사용 확인 {index}"}],
+            max_tokens=5,
+        )
+    return openai_client.get_latency_stats().stats()[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="호출마다 새 클라이언트와 공유 클라이언트의 연결·지연 비교")
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="목 서버 응답 지연(초)")
+    parser.add_argument("--base-url", default=None, help="지정하면 목 서버 대신 이 주소로 요청")
+    args = parser.parse_args(argv)
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = MockOpenAIServer(latency=args.latency).start()
+        base_url = server.base_url
+    api_key = os.environ.get("OPENAI_API_KEY", "sk-mock")
+
+    def new_client():
+        return OpenAI(api_key=api_key, base_url=base_url, timeout=openai_client.build_timeout(),
+                      max_retries=openai_client.OPENAI_MAX_RETRIES,
+                      http_client=openai_client.build_http_client())
+
+    def shared_client():
+        return openai_client.get_client(api_key, base_url)
+
+    try:
+        print(f"{'방식':<14}{'호출 수':>8}{'새 연결':>8}{'연결 평균(ms)':>14}{'p50(ms)':>10}{'p95(ms)':>10}")
+        for label, make_client in (("호출마다 새로", new_client), ("공유 클라이언트", shared_client)):
+            row = run(make_client, args.calls)
+            print(f"{label:<14}{row['calls']:>8}{row['new_connections']:>8}{row['connect_avg'] * 1000:>14.2f}"
+                  f"{row['total_p50'] * 1000:>10.1f}{row['total_p95'] * 1000:>10.1f}")
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""대화 문맥 관리 벤치마크 - 전체 기록 전송과 누적 요약 방식 비교
+
+stub 클라이언트로 긴 대화를 흉내 내며, 턴마다 보내는 입력 토큰 수와
+요약 요청 수를 전체 기록을 그대로 보내는 방식과 비교한다.
+
+실행: python -m bench.bench_context --turns 60 --budget 6000 --keep 6
+"""
+import argparse
+import random
+
+import context_window
+from bench.stub_client import StubOpenAI
+
+SYSTEM_PROMPT = "기후 위기 스토리보드 작성을 돕는 조수입니다. " * 60
+
+QUESTIONS = [
+    "맹그로브 숲이 파괴되는 장면을 어떻게 표현하면 좋을까요?",
+    "3번 컷에서 인물의 표정을 어떻게 그리면 메시지가 잘 전달될까요?",
+    "데이터 센터의 탄소 배출을 보여주는 배경 아이디어를 알려주세요.",
+    "발표할 때 강조해야 할 핵심 메시지를 정리해주세요.",
+    "패스트 패션 장면에 들어갈 내레이션을 다듬어 주세요.",
+]
+
+
+def long_reply(body):
+    """실제 답변처럼 긴 응답 (요약 요청에는 짧은 요약)"""
+    text = body["messages"][-1]["content"]
+    if text.startswith("다음은 중학생과"):
+        return "학생은 맹그로브 숲을 주제로 3개 컷의 스토리보드를 구상 중이며 배경 묘사를 보완하기로 함."
+    return "좋은 아이디어예요! 장면 구성, 인물 표정, 배경 색감을 차례로 살펴볼게요. " * 12
+
+
+def run(turns, client, context=None, seed=0):
+    rng = random.Random(seed)
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    per_turn = []
+    for _ in range(turns):
+        messages.append({"role": "user", "content": rng.choice(QUESTIONS)})
+        request = context.build(client, messages) if context else messages
+        per_turn.append(sum(context_window.message_tokens(m) for m in request))
+        reply = client.chat.completions.create(model="gpt-4o-mini", messages=request)
+        messages.append({"role": "assistant", "content": reply.choices[0].message.content})
+    return per_turn
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="전체 기록 전송과 누적 요약 방식의 입력 토큰 비교")
+    parser.add_argument("--turns", type=int, default=60)
+    parser.add_argument("--budget", type=int, default=context_window.CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--keep", type=int, default=context_window.KEEP_RECENT_TURNS)
+    parser.add_argument("--refresh", type=int, default=context_window.SUMMARY_REFRESH_TURNS)
+    args = parser.parse_args(argv)
+
+    full_client = StubOpenAI(chat_reply=long_reply)
+    full = run(args.turns, full_client)
+
+    managed_client = StubOpenAI(chat_reply=long_reply)
+    context = context_window.ConversationContext(args.budget, args.keep, args.refresh)
+    managed = run(args.turns, managed_client, context)
+
+    print(f"{'턴':>4}{'전체 기록':>12}{'요약 사용':>12}")
+    step = max(1, args.turns // 10)
+    for index in range(0, args.turns, step):
+        print(f"{index + 1:>4}{full[index]:>12,}{managed[index]:>12,}")
+    print(f"{args.turns:>4}{full[-1]:>12,}{managed[-1]:>12,}")
+    print()
+    print(f"전체 기록: 요청 {full_client.stats['calls']}회, 입력 토큰 합계 {full_client.stats['prompt_tokens']:,}")
+    print(f"요약 사용: 요청 {managed_client.stats['calls']}회 (요약 {context.summary_updates}회 포함), "
+          f"입력 토큰 합계 {managed_client.stats['prompt_tokens']:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""백그라운드 분석 작업 점검 - 중간에 취소한 뒤 이어서 실행해도 결과가 같은지 확인
+
+목 서버를 상대로 전체 학생 분석 작업을 한 번에 끝까지 돌린 결과와, 몇 명 분석한 뒤
+취소하고 이어서 실행한 결과를 비교한다. 이어서 실행할 때 이미 저장된 학생을 다시
+분석하지 않는지 목 서버의 요청 수로 확인한다.
+
+실행: python -m bench.bench_jobs --students 30 --messages 20
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from openai import OpenAI
+
+import analysis
+import jobs
+from bench.mock_openai import MockOpenAIServer
+from bench.synthetic import make_conversations
+
+
+class _Conversations:
+    """load_all_conversations()만 있는 저장소 대용"""
+
+    def __init__(self, conversations):
+        self.conversations = conversations
+
+    def load_all_conversations(self):
+        return self.conversations
+
+
+def _wait(runner, job_id, until):
+    while True:
+        job = runner.store.get(job_id)
+        if until(job):
+            return job
+        time.sleep(0.05)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="분석 작업 취소 후 이어서 실행 점검")
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--messages", type=int, default=20, help="학생당 메시지 수")
+    parser.add_argument("--chunk", type=int, default=5, help="결과를 저장하는 학생 단위")
+    parser.add_argument("--latency", type=float, default=0.05, help="목 서버 응답 지연(초)")
+    args = parser.parse_args(argv)
+
+    backend = _Conversations(make_conversations(args.students, args.messages))
+    finished = lambda job: job["status"] not in jobs.ACTIVE_STATUSES
+
+    with MockOpenAIServer(latency=args.latency) as server, tempfile.TemporaryDirectory() as tmp:
+        client = OpenAI(api_key="sk-mock", base_url=server.base_url)
+        runner = jobs.JobRunner(jobs.JobStore(os.path.join(tmp, "jobs.db")))
+        runner.register(analysis.ANALYSIS_JOB_KIND, lambda job: analysis.run_analysis_job(
+            job, client, backend, chunk_size=args.chunk))
+        params = {"max_workers": 4, "batch_size": 5}
+
+        job_id = runner.submit(analysis.ANALYSIS_JOB_KIND, params)
+        _wait(runner, job_id, finished)
+        expected = runner.store.results(job_id)
+        full_requests = server.stats["requests"]
+
+        job_id = runner.submit(analysis.ANALYSIS_JOB_KIND, params)
+        _wait(runner, job_id, lambda job: job["done"] >= args.chunk)
+        runner.cancel(job_id)
+        job = _wait(runner, job_id, finished)
+        print(f"취소: {job['status']} ({job['done']}/{job['total']}명 저장됨)")
+
+        before_resume = server.stats["requests"]
+        runner.resume(job_id)
+        job = _wait(runner, job_id, finished)
+        resumed_requests = server.stats["requests"] - full_requests
+        print(f"이어서 실행: {job['status']} ({job['done']}/{job['total']}명), "
+              f"이어서 보낸 요청 {server.stats['requests'] - before_resume}건")
+
+        rows = runner.store.results(job_id)
+        key = lambda row: row["학번"]
+        same = sorted(rows, key=key) == sorted(expected, key=key)
+        print(f"요청 수: 한 번에 {full_requests}건 / 취소 후 이어서 {resumed_requests}건")
+        print(f"결과 일치: {'예' if same else '아니오'} (학생 {len(rows)}명)")
+
+
+if __name__ == "__main__":
+    main()
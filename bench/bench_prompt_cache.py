@@ -0,0 +1,69 @@
+"""프롬프트 캐시 벤치마크 - 요청 앞부분 배치에 따른 캐시 적중률 비교
+
+여러 학생이 번갈아 대화하는 상황을 stub 클라이언트로 흉내 내며, 앱과 같은 순서
+(고정 시스템 프롬프트 → 인사말 → 대화)로 보낼 때와 요청마다 바뀌는 학생 정보를
+시스템 프롬프트 앞에 붙일 때의 캐시 처리 토큰 비율을 비교한다.
+
+실행: python -m bench.bench_prompt_cache --students 30 --turns 10
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+import context_window
+import prompts
+from bench.bench_context import QUESTIONS
+from bench.stub_client import StubOpenAI
+
+
+def stable_layout(student, messages, sent_at):
+    return messages
+
+
+def volatile_layout(student, messages, sent_at):
+    header = f"학생: {student['name']} ({student['id']}), 요청 시각: {sent_at:%Y-%m-%d %H:%M:%S}\n"
+    return [dict(messages[0], content=header + messages[0]["content"])] + messages[1:]
+
+
+LAYOUTS = (("고정 앞부분", stable_layout), ("학생 정보가 앞에", volatile_layout))
+
+
+def run(layout, students, turns, seed=0):
+    rng = random.Random(seed)
+    client = StubOpenAI()
+    usage_stats = prompts.UsageStats()
+    sessions = []
+    for index in range(students):
+        student = {"id": f"3{index:04d}", "name": f"학생{index:03d}"}
+        messages = [{"role": "system", "content": prompts.system_prompt()},
+                    {"role": "assistant", "content": prompts.welcome_message(student["name"])}]
+        sessions.append((student, messages, context_window.ConversationContext()))
+
+    sent_at = datetime(2026, 1, 1, 9, 0, 0)
+    for _ in range(turns):
+        for student, messages, context in sessions:
+            messages.append({"role": "user", "content": rng.choice(QUESTIONS)})
+            sent_at += timedelta(seconds=rng.randint(1, 5))
+            request = layout(student, context.build(client, messages), sent_at)
+            response = client.chat.completions.create(model="gpt-4o-mini", messages=request)
+            usage_stats.record(response.usage)
+            messages.append({"role": "assistant", "content": response.choices[0].message.content})
+    return usage_stats.stats()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="요청 앞부분 배치에 따른 프롬프트 캐시 적중률 비교")
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--turns", type=int, default=10, help="학생당 질문 수")
+    args = parser.parse_args(argv)
+
+    print(f"시스템 프롬프트: 약 {context_window.estimate_tokens(prompts.system_prompt()):,} 토큰")
+    print(f"{'배치':<12}{'요청 수':>8}{'입력 토큰':>12}{'캐시 토큰':>12}{'캐시 비율':>10}{'적중 요청':>10}")
+    for label, layout in LAYOUTS:
+        stats = run(layout, args.students, args.turns)
+        print(f"{label:<12}{stats['requests']:>8}{stats['prompt_tokens']:>12,}{stats['cached_tokens']:>12,}"
+              f"{stats['cached_rate']:>10.0%}{stats['cache_hit_requests'] / stats['requests']:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""장면 이미지 생성 벤치마크 - 장면을 하나씩 요청하는 방식과 작업 풀 + 이미지 캐시 + 반별 예산 비교
+
+로컬 목 서버의 이미지 생성 주소(지연 시간만 흉내, 작은 PNG 응답)로 다음을 측정·확인한다.
+- 이전 방식(장면마다 차례로 요청하고 URL만 받아 보여줌, 다시 볼 때마다 다시 요청)과
+  백그라운드 작업(장면을 동시에 요청하고 이미지를 내려받아 저장)의 스토리보드당 소요 시간
+- 다시 실행하거나 다시 볼 때 요청이 0건이고 저장된 이미지를 쓰는지
+- 한 스토리보드 안에서 장면 설명이 같은 장면은 이미지를 한 번만 만드는지
+- 반별 예산을 넘는 장면은 요청하지 않는지 (반마다 새로 만든 이미지 수 = 예산)
+- 예산을 늘린 뒤 이어서 실행하면 예산 때문에 못 만든 장면만 만드는지
+- 장면 설명이 같은 두 학생의 작업을 동시에 돌려도 같은 이미지를 두 번 만들지 않는지
+
+실행: python -m bench.bench_scene_images --students 6 --scenes 6 --latency 0.3 --workers 3 --budget 10
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from openai import OpenAI
+
+import images
+import jobs
+import scene_images
+import storage
+import storyboards
+from bench.mock_openai import MockOpenAIServer
+
+
+def make_storyboards(store, students, scenes):
+    """두 반에 나눠 학생마다 다른 스토리보드를 저장 (마지막 장면은 첫 장면과 설명이 같음)"""
+    roster = []
+    for index in range(students):
+        class_number = 1 + index % 2
+        student_id = f"30{class_number}{index // 2 + 1:02d}"
+        student_name = f"학생{index + 1}"
+        storyboard = {
+            "title": f"{student_name}의 스토리보드",
+            "theme": "새우 양식과 맹그로브 숲의 파괴",
+            "scenes": [{"scene_num": number, "visual": f"{student_name}의 장면 {number}: 베어지는 맹그로브 숲",
+                        "audio": "내레이션", "time": "5초"} for number in range(1, scenes)],
+        }
+        storyboard["scenes"].append(dict(storyboard["scenes"][0], scene_num=scenes))
+        store.put(f"bench-{index}", student_id, student_name, storyboard)
+        roster.append((student_id, student_name, f"bench-{index}", storyboard))
+    return roster
+
+
+def legacy_view(client, storyboard):
+    """이전 방식 (장면마다 차례로 요청하고 만료되는 URL만 받음)"""
+    for scene in storyboard["scenes"]:
+        prompt = scene_images.scene_prompt(storyboard["theme"], scene)
+        client.images.generate(model=scene_images.SCENE_IMAGE_MODEL, prompt=scene_images.SCENE_IMAGE_STYLE + prompt,
+                               size=scene_images.SCENE_IMAGE_SIZE, quality=scene_images.SCENE_IMAGE_QUALITY, n=1)
+
+
+def wait(runner, job_id):
+    while runner.store.get(job_id)["status"] in jobs.ACTIVE_STATUSES:
+        time.sleep(0.01)
+    return runner.store.get(job_id)
+
+
+def run_jobs(runner, roster, max_workers, job_ids=None):
+    """학생마다 차례로 작업을 실행 (관리자 화면처럼 한 번에 한 학생)
+
+    job_ids를 주면 그 작업들을 이어서 실행한다.
+    (스토리보드당 초, 이번에 저장된 장면 상태 목록, 예산 때문에 못 만든 장면 수, 작업 ID 목록)
+    """
+    started = time.perf_counter()
+    statuses, over_budget, ids = [], 0, []
+    for index, (student_id, student_name, content_hash, _) in enumerate(roster):
+        if job_ids is None:
+            job_id = runner.submit(scene_images.SCENE_IMAGE_JOB_KIND, {
+                "student_id": student_id, "student_name": student_name,
+                "content_hash": content_hash, "max_workers": max_workers})
+            saved = 0
+        else:
+            job_id = job_ids[index]
+            saved = len(runner.store.results(job_id))
+            runner.resume(job_id)
+        job = wait(runner, job_id)
+        if job["summary"].get("failed"):
+            raise RuntimeError(f"작업 실패: {job['error']}")
+        statuses += [row["status"] for row in runner.store.results(job_id)[saved:]]
+        over_budget += job["summary"].get("over_budget", 0)
+        ids.append(job_id)
+    return (time.perf_counter() - started) / len(roster), statuses, over_budget, ids
+
+
+def check_shared_prompts(client, workdir, scenes, max_workers, server):
+    """같은 반 두 학생의 스토리보드가 장면 설명을 공유할 때, 두 작업을 동시에 돌려도 설명마다 한 번만 요청"""
+    store = storyboards.StoryboardStore(os.path.join(workdir, "shared-storyboards.db"))
+    cache = scene_images.SceneImageCache(os.path.join(workdir, "shared-scene-images.db"))
+    budget = scene_images.ClassImageBudget(os.path.join(workdir, "shared-scene-images.db"), scenes * 2)
+    image_store = images.ImageStore(os.path.join(workdir, "shared-images"))
+    runner = jobs.JobRunner(jobs.JobStore(os.path.join(workdir, "shared-jobs.db")), max_workers=2)
+    runner.register(scene_images.SCENE_IMAGE_JOB_KIND,
+                    lambda job: scene_images.run_scene_image_job(job, client, store, cache, budget, image_store))
+    students = []
+    for student_id, student_name in (("30101", "공유1"), ("30102", "공유2")):
+        storyboard = {"title": "같은 장면", "theme": "새우 양식과 맹그로브 숲의 파괴",
+                      "scenes": [{"scene_num": number, "visual": f"함께 쓰는 장면 {number}", "audio": "", "time": ""}
+                                 for number in range(1, scenes + 1)]}
+        store.put(f"shared-{student_id}", student_id, student_name, storyboard)
+        students.append((student_id, student_name, f"shared-{student_id}"))
+
+    server.reset_stats()
+    job_ids = [runner.submit(scene_images.SCENE_IMAGE_JOB_KIND, {
+        "student_id": student_id, "student_name": student_name, "content_hash": content_hash,
+        "max_workers": max_workers}) for student_id, student_name, content_hash in students]
+    finished = [wait(runner, job_id) for job_id in job_ids]
+    used = budget.used(storage.class_of("30101"))
+    passed = (server.stats["requests"] == scenes and used == scenes
+              and all(job["status"] == jobs.COMPLETED for job in finished))
+    print(f"같은 장면 두 작업 동시 실행: 요청 {server.stats['requests']}건, 예산 사용 {used}장 "
+          f"(장면 설명 {scenes}개) - {'통과' if passed else '실패'}")
+    return passed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="장면 이미지 생성 방식 비교")
+    parser.add_argument("--students", type=int, default=6, help="두 반에 나눠 배정")
+    parser.add_argument("--scenes", type=int, default=6, help="학생당 장면 수 (2 이상, 마지막 장면은 첫 장면과 같음)")
+    parser.add_argument("--latency", type=float, default=0.3, help="이미지 요청 한 번의 지연(초)")
+    parser.add_argument("--workers", type=int, default=scene_images.DEFAULT_MAX_WORKERS, help="동시 이미지 요청 수")
+    parser.add_argument("--budget", type=int, default=10, help="반별 이미지 예산 (장)")
+    parser.add_argument("--response-format", choices=("b64_json", "url"), default=scene_images.IMAGE_RESPONSE_FORMAT,
+                        help="url이면 응답의 URL에서 이미지를 내려받는 경로를 확인")
+    args = parser.parse_args(argv)
+    scene_images.IMAGE_RESPONSE_FORMAT = args.response_format
+
+    workdir = tempfile.mkdtemp(prefix="bench-scene-images-")
+    try:
+        with MockOpenAIServer(latency=args.latency) as server:
+            client = OpenAI(api_key="sk-mock", base_url=server.base_url, max_retries=0)
+            store = storyboards.StoryboardStore(os.path.join(workdir, "storyboards.db"))
+            cache = scene_images.SceneImageCache(os.path.join(workdir, "scene_images.db"))
+            budget = scene_images.ClassImageBudget(os.path.join(workdir, "scene_images.db"), args.budget)
+            image_store = images.ImageStore(os.path.join(workdir, "images"))
+            runner = jobs.JobRunner(jobs.JobStore(os.path.join(workdir, "jobs.db")))
+            runner.register(scene_images.SCENE_IMAGE_JOB_KIND,
+                            lambda job: scene_images.run_scene_image_job(job, client, store, cache, budget,
+                                                                         image_store))
+            roster = make_storyboards(store, args.students, args.scenes)
+
+            print(f"학생 {args.students}명 × 장면 {args.scenes}개, 요청 지연 {args.latency}초, "
+                  f"동시 요청 {args.workers}개, 반별 예산 {args.budget}장, 응답 형식 {args.response_format}")
+            print(f"{'방식':<26}{'스토리보드당(초)':>16}{'요청 수':>10}{'새로 생성':>10}{'저장된 이미지':>14}{'예산 초과':>10}")
+
+            server.reset_stats()
+            started = time.perf_counter()
+            legacy_view(client, roster[0][3])
+            print(f"{'이전 방식 (장면마다 차례로)':<26}{time.perf_counter() - started:>16.2f}"
+                  f"{server.stats['requests']:>10}{0:>10}{0:>14}{0:>10}")
+
+            # 반마다 필요한 이미지 수 (같은 설명의 장면은 한 장)
+            needed = {}
+            for student_id, _, _, storyboard in roster:
+                class_name = storage.class_of(student_id)
+                prompts = {scene_images.scene_prompt(storyboard["theme"], scene) for scene in storyboard["scenes"]}
+                needed[class_name] = needed.get(class_name, 0) + len(prompts)
+
+            failures = 0
+
+            def report(label, result, expected):
+                nonlocal failures
+                seconds, statuses, over_budget, _ = result
+                print(f"{label:<26}{seconds:>16.2f}{server.stats['requests']:>10}"
+                      f"{statuses.count(scene_images.GENERATED):>10}{statuses.count(scene_images.CACHED):>14}"
+                      f"{over_budget:>10}")
+                if server.stats["requests"] != expected:
+                    failures += 1
+
+            server.reset_stats()
+            first = run_jobs(runner, roster, args.workers)
+            report("작업 풀 (처음)", first, sum(min(count, args.budget) for count in needed.values()))
+            server.reset_stats()
+            report("다시 실행", run_jobs(runner, roster, args.workers), 0)
+
+            # 예산을 늘리고 처음 작업들을 이어서 실행하면 예산 때문에 못 만든 장면만 요청
+            budget.limit = max(needed.values())
+            server.reset_stats()
+            report("예산 늘린 뒤 이어서 실행", run_jobs(runner, roster, args.workers, job_ids=first[3]),
+                   sum(max(0, count - args.budget) for count in needed.values()))
+            unfinished = [job_id for job_id in first[3] if runner.store.get(job_id)["status"] != jobs.COMPLETED]
+            if unfinished:
+                failures += 1
+
+            # 관리자 화면에서 다시 볼 때는 저장된 이미지만 찾음
+            started = time.perf_counter()
+            shown = sum(1 for _, _, _, storyboard in roster
+                        for _, image_id in scene_images.scene_images(cache, image_store, storyboard) if image_id)
+            print(f"다시 보기: 이미지 {shown}장, 스토리보드당 "
+                  f"{(time.perf_counter() - started) / len(roster) * 1000:.1f}ms (요청 없음)")
+            if shown != args.students * args.scenes:
+                failures += 1
+
+            # 반마다 새로 만든 이미지는 같은 설명의 장면을 한 장으로 센 수와 같아야 함
+            for class_name, count in needed.items():
+                used = budget.used(class_name)
+                print(f"{class_name}: 필요한 이미지 {count}장 (장면 {count + count // (args.scenes - 1)}개), "
+                      f"새로 만든 이미지 {used}장")
+                if used != count:
+                    failures += 1
+            if not check_shared_prompts(client, workdir, args.scenes, args.workers, server):
+                failures += 1
+            print(f"기대와 다른 결과 {failures}개")
+            return 0 if failures == 0 else 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
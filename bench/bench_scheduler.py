@@ -0,0 +1,137 @@
+"""요청 스케줄러 벤치마크 - 학급 전체가 동시에 질문할 때 429 응답과 대기 시간 비교
+
+요청 한도가 있는 목 서버에 학생 스레드들이 한꺼번에 질문을 보내고, 그동안 관리자
+일괄 분석도 함께 돌린다. 스케줄러 없이 바로 보낼 때와 scheduler.ScheduledClient를
+거칠 때의 429 응답 수, 실패한 학생 질문 수, 질문 응답 시간, 일괄 분석 소요 시간을 비교한다.
+벤치마크 시간을 줄이기 위해 "분당 한도"의 기준 시간을 --window초로 줄여서 돌린다.
+모든 요청은 같은 모델로 보내 목 서버의 한도 하나를 함께 쓴다.
+끝으로 대기 중에 on_wait에서 예외가 나도(화면 재실행 등) 대기열이 막히지 않는지 확인한다.
+
+실행: python -m bench.bench_scheduler --students 30 --questions 2 --limit 40 --window 6
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+
+import openai
+from openai import OpenAI
+
+import analysis
+import scheduler
+from bench.mock_openai import MockOpenAIServer
+from bench.synthetic import USER_MESSAGES, make_conversations
+
+MODEL = analysis.RELEVANCE_MODEL
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(base_url, args, use_scheduler):
+    client = OpenAI(api_key="sk-mock", base_url=base_url, max_retries=0)
+    request_scheduler = scheduler.RequestScheduler(
+        rate_limits={MODEL: (int(args.limit * 0.9), None)}, period=args.window, max_wait=args.window * 10)
+
+    def student_client(student_id):
+        if use_scheduler:
+            return scheduler.ScheduledClient(client, request_scheduler, student_id)
+        return client
+
+    batch_client = client
+    if use_scheduler:
+        batch_client = scheduler.ScheduledClient(client, request_scheduler, "admin-analysis",
+                                                 lane=scheduler.LANE_BATCH)
+
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+    start_gate = threading.Barrier(args.students + 1)
+
+    def student(index):
+        rng = random.Random(index)
+        chat = student_client(f"3{index:04d}")
+        start_gate.wait()
+        for _ in range(args.questions):
+            started = time.perf_counter()
+            try:
+                chat.chat.completions.create(model=MODEL,
+                                             messages=[{"role": "user", "content": rng.choice(USER_MESSAGES)}])
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+            except openai.RateLimitError:
+                with lock:
+                    failures.append(index)
+            time.sleep(rng.uniform(0.2, 0.6))
+
+    batch_result = {}
+
+    def batch():
+        started = time.perf_counter()
+        analysis.analyze_conversations_with_gpt(batch_client, make_conversations(args.batch_students, 20),
+                                                max_workers=4, batch_size=5)
+        batch_result["seconds"] = time.perf_counter() - started
+
+    threads = [threading.Thread(target=student, args=(i,)) for i in range(args.students)]
+    threads.append(threading.Thread(target=batch))
+    for thread in threads:
+        thread.start()
+    start_gate.wait()
+    for thread in threads:
+        thread.join()
+    return latencies, failures, batch_result.get("seconds", 0.0)
+
+
+class _Rerun(BaseException):
+    """대기 순서를 보여주다 화면이 다시 실행될 때 Streamlit이 던지는 예외 흉내"""
+
+
+def check_interrupted_wait():
+    """on_wait에서 예외가 나 빠져나간 요청이 대기열에 남지 않고 다음 요청이 진행되는지"""
+    request_scheduler = scheduler.RequestScheduler(rate_limits={MODEL: (1, None)}, period=0.5, max_wait=2.0)
+    request_scheduler.acquire("first", MODEL, 0)
+
+    def rerun(position):
+        raise _Rerun()
+
+    try:
+        request_scheduler.acquire("interrupted", MODEL, 0, on_wait=rerun)
+    except _Rerun:
+        pass
+    waiting = request_scheduler.stats()["waiting_interactive"]
+    try:
+        request_scheduler.acquire("next", MODEL, 0)
+        passed = waiting == 0
+    except scheduler.SchedulerTimeout:
+        passed = False
+    print(f"대기 중 화면 재실행 후 다음 요청: {'통과' if passed else '실패'} (남은 대기 {waiting}건)")
+    return passed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="스케줄러 유무에 따른 429 응답·대기 시간 비교")
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--questions", type=int, default=2, help="학생당 질문 수")
+    parser.add_argument("--batch-students", type=int, default=10, help="일괄 분석할 학생 수")
+    parser.add_argument("--limit", type=int, default=40, help="목 서버 한도 (window초당 요청 수)")
+    parser.add_argument("--window", type=float, default=6.0, help="한도 기준 시간(초)")
+    parser.add_argument("--latency", type=float, default=0.05, help="목 서버 응답 지연(초)")
+    args = parser.parse_args(argv)
+    analysis.RETRY_BASE_DELAY = 0.2
+
+    print(f"{'방식':<10}{'429 응답':>9}{'실패 질문':>10}{'질문 p50(초)':>13}{'질문 p95(초)':>13}{'일괄 분석(초)':>14}")
+    for label, use_scheduler in (("바로 전송", False), ("스케줄러", True)):
+        with MockOpenAIServer(latency=args.latency, rate_limit=args.limit, rate_window=args.window) as server:
+            latencies, failures, batch_seconds = run(server.base_url, args, use_scheduler)
+            print(f"{label:<10}{server.stats['rate_limited']:>9}{len(failures):>10}"
+                  f"{_percentile(latencies, 0.5):>13.2f}{_percentile(latencies, 0.95):>13.2f}{batch_seconds:>14.1f}")
+    return 0 if check_interrupted_wait() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
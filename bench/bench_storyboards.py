@@ -0,0 +1,98 @@
+"""스토리보드 일괄 추출 벤치마크 - 학생마다 차례로 추출하는 방식과 작업 풀 + 해시 캐시 비교
+
+HTTP 없이 동작하는 대역 클라이언트(지연 시간만 흉내)로 다음을 측정·확인한다.
+- 이전 방식(학생마다 버튼을 눌러 한 명씩 추출)과 백그라운드 작업(동시 요청 수 제한)의 소요 시간
+- 대화가 바뀌지 않은 채 다시 실행하면 요청이 0건인지
+- 일부 학생만 대화를 더 한 뒤 다시 실행하면 그 학생만 추출하는지
+
+실행: python -m bench.bench_storyboards --students 30 --latency 0.2 --workers 4
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import jobs
+import storage
+import storyboards
+from bench.stub_client import StubOpenAI
+from bench.synthetic import make_conversations
+
+
+def add_message(backend, conversation, role, content, timestamp):
+    backend.save_data({"type": f"{role}_message", "session_id": conversation["session_id"],
+                       "student_id": conversation["student_id"], "student_name": conversation["student_name"],
+                       "content": content, "timestamp": timestamp})
+
+
+def run_job(runner, max_workers):
+    started = time.perf_counter()
+    job_id = runner.submit(storyboards.STORYBOARD_JOB_KIND, {"max_workers": max_workers})
+    while runner.store.get(job_id)["status"] in jobs.ACTIVE_STATUSES:
+        time.sleep(0.01)
+    statuses = [row["status"] for row in runner.store.results(job_id)]
+    return time.perf_counter() - started, runner.store.get(job_id)["status"], statuses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="스토리보드 일괄 추출 방식 비교")
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--messages", type=int, default=20, help="학생당 메시지 수")
+    parser.add_argument("--latency", type=float, default=0.2, help="요청 한 번의 지연(초)")
+    parser.add_argument("--workers", type=int, default=storyboards.DEFAULT_MAX_WORKERS, help="동시 추출 요청 수")
+    parser.add_argument("--changed", type=float, default=0.1, help="다시 실행하기 전에 대화를 더 하는 학생 비율")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bench-storyboards-")
+    try:
+        backend = storage.get_backend(os.path.join(workdir, "data"), "json")
+        conversations = make_conversations(args.students, args.messages)
+        for conversation in conversations:
+            for message in conversation["messages"]:
+                add_message(backend, conversation, message["role"], message["content"], message["timestamp"])
+
+        client = StubOpenAI(base_latency=args.latency)
+        store = storyboards.StoryboardStore(os.path.join(workdir, "storyboards.db"))
+        runner = jobs.JobRunner(jobs.JobStore(os.path.join(workdir, "jobs.db")))
+        runner.register(storyboards.STORYBOARD_JOB_KIND,
+                        lambda job: storyboards.run_storyboard_job(job, client, backend, store))
+
+        print(f"학생 {args.students}명 × 메시지 {args.messages}개, 요청 지연 {args.latency}초, "
+              f"동시 요청 {args.workers}개")
+        print(f"{'방식':<26}{'시간(초)':>10}{'요청 수':>10}{'새로 추출':>10}{'저장된 결과':>12}")
+
+        started = time.perf_counter()
+        for conversation in backend.load_all_conversations():
+            storyboards.extract_storyboard(client, conversation["messages"])
+        print(f"{'이전 방식 (한 명씩)':<26}{time.perf_counter() - started:>10.2f}{client.stats['calls']:>10}"
+              f"{args.students:>10}{0:>12}")
+
+        # (설명, 실행 전에 대화를 더 할 학생, 기대하는 요청 수 - None이면 확인하지 않음)
+        changed = random.Random(1).sample(conversations, max(1, int(len(conversations) * args.changed)))
+        runs = [("일괄 추출 (처음)", [], None),
+                ("다시 실행 (변경 없음)", [], 0),
+                (f"다시 실행 ({len(changed)}명 대화 추가)", changed, len(changed))]
+        failures = 0
+        for label, to_change, expected in runs:
+            for conversation in to_change:
+                add_message(backend, conversation, "user", "마지막 장면을 바꿔 보고 싶어요", "2024-05-13 12:00:00")
+            client.reset_stats()
+            elapsed, status, statuses = run_job(runner, args.workers)
+            print(f"{label:<26}{elapsed:>10.2f}{client.stats['calls']:>10}"
+                  f"{statuses.count(storyboards.EXTRACTED):>10}{statuses.count(storyboards.CACHED):>12}")
+            if status != jobs.COMPLETED or (expected is not None and client.stats["calls"] != expected):
+                failures += 1
+
+        missing = [conversation["student_id"] for conversation in conversations
+                   if store.latest(conversation["student_id"], conversation["student_name"]) is None]
+        print(f"저장된 결과가 없는 학생 {len(missing)}명, 기대와 다른 실행 {failures}번")
+        return 0 if not missing and not failures else 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""오프라인 성능 회귀 점검 - 목 서버로 학급 규모별 대화·분석·저장 성능 측정
+
+비용 없이 로컬 목 서버를 상대로 학급 규모(기본 30, 300, 3000명)마다 세 단계를 돌린다.
+- 저장: 학생마다 로그인·대화·피드백 기록을 save_data로 동시에 저장 (지연 = 저장 한 건)
+- 대화: 학생마다 로그인 후 질문을 보내고 답을 스트리밍으로 받아 저장 (지연 = 질문 한 턴)
+  요청은 앱의 get_gpt_response와 같은 경로(호출 한도 → 스케줄러 → 문맥 요약 →
+  chat.build_api_params → 응답 캐시 → 스트리밍)로 만든다.
+- 분석: 대화 단계에서 저장된 전체 대화를 analyze_conversations_with_gpt로 분석 (지연 = API 호출 한 건)
+단계마다 처리량, 지연 p50/p95, API 호출 수, 디스크에 쓴 바이트 수를 보여준다.
+
+--output으로 결과를 저장해 두고 다음에 --baseline으로 비교하면, 기준보다 --tolerance 이상
+나빠진 항목을 표시하고 종료 코드 1을 돌려준다.
+
+실행: python -m bench.bench_suite --sizes 30,300,3000 --turns 3 --latency 0.02
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import analysis
+import chat
+import context_window
+import images
+import openai_client
+import prompts
+import response_cache
+import scheduler
+import storage
+from bench.bench_context import QUESTIONS
+from bench.mock_openai import MockOpenAIServer
+from bench.synthetic import USER_MESSAGES
+
+# 앱과 같은 학생별 API 호출 한도
+MAX_API_CALLS_PER_STUDENT = 50
+# 벤치마크에서는 스케줄러가 순서만 정하고 한도 때문에 기다리지 않도록 충분히 큰 한도 사용
+UNLIMITED_RATE = (10 ** 9, None)
+
+# 값이 클수록 나쁜 항목 / 작을수록 나쁜 항목 (기준 결과와 비교할 때 사용)
+HIGHER_IS_WORSE = ("p50_ms", "p95_ms", "api_calls", "disk_bytes")
+LOWER_IS_WORSE = ("throughput",)
+# 이보다 작은 차이는 측정 오차로 보고 비교하지 않음 (디스크는 4KB 페이지 단위로 기록됨)
+NOISE_FLOOR = {"p50_ms": 2.0, "p95_ms": 2.0, "api_calls": 2, "disk_bytes": 64 * 1024}
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def _disk_bytes_written():
+    """이 프로세스가 지금까지 저장 장치에 쓴 바이트 수 (리눅스 /proc/self/io, 없으면 None)"""
+    try:
+        with open("/proc/self/io", 'r') as f:
+            for line in f:
+                if line.startswith("write_bytes:"):
+                    return int(line.split(":")[1])
+    except OSError:
+        return None
+    return None
+
+
+def _dir_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class Stage:
+    """한 단계의 처리 건수·지연·API 호출·디스크 기록량 측정"""
+
+    def __init__(self, server, data_dir):
+        self.server = server
+        self.data_dir = data_dir
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def __enter__(self):
+        self.server.reset_stats()
+        openai_client.get_latency_stats().reset()
+        self._disk_before = _disk_bytes_written()
+        self._dir_before = _dir_bytes(self.data_dir)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._started
+        disk_after = _disk_bytes_written()
+        if self._disk_before is None or disk_after is None:
+            # /proc/self/io가 없으면 데이터 폴더가 늘어난 크기로 대신함 (덮어쓴 양은 빠짐)
+            self.disk_bytes = _dir_bytes(self.data_dir) - self._dir_before
+        else:
+            self.disk_bytes = disk_after - self._disk_before
+
+    def result(self, operations):
+        return {
+            "operations": operations,
+            "seconds": round(self.seconds, 3),
+            "throughput": round(operations / self.seconds, 2) if self.seconds else 0.0,
+            "p50_ms": round(_percentile(self.latencies, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(self.latencies, 0.95) * 1000, 2),
+            "api_calls": self.server.stats["requests"],
+            "rate_limited": self.server.stats["rate_limited"],
+            "disk_bytes": self.disk_bytes,
+        }
+
+
+def _student(index):
+    return {"session_id": f"bench-{index}", "student_id": f"3{index:04d}", "student_name": f"학생{index:04d}"}
+
+
+def run_storage(backend, students, messages, concurrency, stage):
+    """학생마다 로그인 → 학생/AI 메시지 → 피드백을 save_data로 저장"""
+    def student_run(index):
+        base = _student(index)
+        records = [dict(base, type="student_info", timestamp=_now())]
+        for i in range(messages):
+            kind = "user_message" if i % 2 == 0 else "assistant_message"
+            records.append(dict(base, type=kind, content=f"{USER_MESSAGES[i % len(USER_MESSAGES)]} ({i})",
+                                timestamp=_now()))
+        records.append(dict(base, type="feedback", content="장면 구성이 좋아요. 기후 위기 메시지를 더 분명히 해 보세요.",
+                            timestamp=_now()))
+        for record in records:
+            started = time.perf_counter()
+            backend.save_data(record)
+            stage.add(time.perf_counter() - started)
+        return len(records)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return sum(executor.map(student_run, range(students)))
+
+
+class ChatEnvironment:
+    """앱의 모듈 수준 객체(저장소, 클라이언트, 스케줄러, 호출 한도, 캐시)에 해당하는 묶음"""
+
+    def __init__(self, data_dir, base_url, backend_name):
+        self.backend = storage.get_backend(data_dir, backend_name)
+        self.image_store = images.get_image_store(os.path.join(data_dir, "images"))
+        self.client = openai_client.get_client("sk-mock", base_url)
+        self.scheduler = scheduler.RequestScheduler(rate_limits={}, default_limit=UNLIMITED_RATE)
+        self.budget = scheduler.StudentBudget(os.path.join(data_dir, "api_budget.db"), MAX_API_CALLS_PER_STUDENT)
+        self.cache = response_cache.ResponseCache(1024, 16 * 1024 * 1024, 30 * 60)
+        self.usage = prompts.UsageStats()
+
+
+def chat_turn(env, student, messages, context):
+    """get_gpt_response(stream=True)의 화면 출력을 뺀 요청 경로"""
+    student_id = student["student_id"]
+    if env.budget.remaining(student_id) <= 0:
+        return "limit"
+
+    scheduled_client = scheduler.ScheduledClient(env.client, env.scheduler, student_id)
+    request = context.build(scheduled_client, messages)
+    api_params = chat.build_api_params(request, env.image_store)
+    cache_key = response_cache.make_key(api_params)
+    cached = env.cache.get(cache_key)
+    if cached is not None:
+        return cached
+    if not env.budget.try_consume(student_id):
+        return "limit"
+
+    parts = []
+    state = {"finish_reason": None, "usage": None}
+    response_stream = scheduled_client.chat.completions.create(**api_params, stream=True,
+                                                               stream_options={"include_usage": True})
+    for _ in chat.stream_text(response_stream, parts, state):
+        pass
+    if state["finish_reason"] is None:
+        raise RuntimeError("응답 스트림이 완료되지 않았습니다.")
+    env.usage.record(state["usage"])
+    reply = "".join(parts)
+    env.cache.put(cache_key, reply)
+    return reply
+
+
+def run_chat(env, students, turns, concurrency, stage, seed=0):
+    """학생마다 로그인 후 turns번 질문 (질문·답변 모두 save_data로 저장)"""
+    failures = []
+
+    def student_run(index):
+        rng = random.Random(seed + index)
+        student = _student(index)
+        env.backend.save_data(dict(student, type="student_info", timestamp=_now()))
+        welcome = prompts.welcome_message(student["student_name"])
+        env.backend.save_data(dict(student, type="assistant_message", content=welcome, timestamp=_now()))
+        messages = [{"role": "system", "content": prompts.system_prompt()},
+                    {"role": "assistant", "content": welcome}]
+        context = context_window.ConversationContext()
+
+        for _ in range(turns):
+            question = rng.choice(QUESTIONS + USER_MESSAGES)
+            started = time.perf_counter()
+            messages.append({"role": "user", "content": question})
+            env.backend.save_data(dict(student, type="user_message", content=question, timestamp=_now()))
+            try:
+                reply = chat_turn(env, student, messages, context)
+            except Exception as e:
+                failures.append(repr(e))
+                reply = "오류"
+            messages.append({"role": "assistant", "content": reply})
+            env.backend.save_data(dict(student, type="assistant_message", content=reply, timestamp=_now()))
+            stage.add(time.perf_counter() - started)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(student_run, range(students)))
+    return students * turns, failures
+
+
+def run_size(students, args):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, \
+            MockOpenAIServer(latency=args.latency, error_rate=args.error_rate) as server:
+        storage_dir = os.path.join(tmp, "storage")
+        with Stage(server, tmp) as stage:
+            operations = run_storage(storage.get_backend(storage_dir, args.backend), students,
+                                     args.messages, args.concurrency, stage)
+        results["저장"] = stage.result(operations)
+
+        env = ChatEnvironment(os.path.join(tmp, "chat"), server.base_url, args.backend)
+        with Stage(server, tmp) as stage:
+            operations, failures = run_chat(env, students, args.turns, args.concurrency, stage)
+        results["대화"] = dict(stage.result(operations), failures=len(failures))
+
+        with Stage(server, tmp) as stage:
+            conversations = env.backend.load_all_conversations()
+            rows = analysis.analyze_conversations_with_gpt(env.client, conversations, max_workers=args.workers)
+        result = stage.result(sum(len(analysis._user_messages(conv)) for conv in conversations))
+        # 분석 단계의 지연은 API 호출 한 건 기준 (openai_client가 기록한 호출별 시간)
+        api_latency = openai_client.get_latency_stats().stats()
+        if api_latency:
+            result["p50_ms"] = round(api_latency[0]["total_p50"] * 1000, 2)
+            result["p95_ms"] = round(api_latency[0]["total_p95"] * 1000, 2)
+        results["분석"] = dict(result, students=len(rows))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """기준 결과보다 tolerance 비율 이상 나빠진 항목 목록"""
+    regressions = []
+    for size, stages in results.items():
+        for stage_name, values in stages.items():
+            before = baseline.get(size, {}).get(stage_name)
+            if not before:
+                continue
+            for name in HIGHER_IS_WORSE + LOWER_IS_WORSE:
+                old, new = before.get(name), values.get(name)
+                if not old or new is None or abs(new - old) < NOISE_FLOOR.get(name, 0):
+                    continue
+                change = (new - old) / old
+                worse = change > tolerance if name in HIGHER_IS_WORSE else change < -tolerance
+                if worse:
+                    regressions.append(f"{size}명 {stage_name} {name}: {old} → {new} ({change:+.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="학급 규모별 대화·분석·저장 성능 측정 (목 서버 사용)")
+    parser.add_argument("--sizes", default="30,300,3000", help="학급 규모 목록 (쉼표로 구분)")
+    parser.add_argument("--turns", type=int, default=3, help="대화 단계의 학생당 질문 수")
+    parser.add_argument("--messages", type=int, default=10, help="저장 단계의 학생당 메시지 수")
+    parser.add_argument("--concurrency", type=int, default=32, help="동시에 활동하는 학생 수")
+    parser.add_argument("--workers", type=int, default=analysis.DEFAULT_MAX_WORKERS, help="분석 동시 요청 수")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--latency", type=float, default=0.02, help="목 서버 응답 지연(초)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="목 서버 429 비율")
+    parser.add_argument("--output", default=None, help="결과를 저장할 JSON 경로")
+    parser.add_argument("--baseline", default=None, help="비교할 이전 결과 JSON 경로")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="허용하는 악화 비율")
+    args = parser.parse_args(argv)
+    analysis.RETRY_BASE_DELAY = 0.01
+
+    results = {}
+    print(f"{'규모':>6} {'단계':<4}{'건수':>8}{'처리량(건/초)':>14}{'p50(ms)':>10}{'p95(ms)':>10}"
+          f"{'API 호출':>10}{'429':>6}{'디스크 기록':>14}")
+    for size in [int(value) for value in args.sizes.split(",") if value.strip()]:
+        results[str(size)] = run_size(size, args)
+        for stage_name, values in results[str(size)].items():
+            print(f"{size:>6} {stage_name:<4}{values['operations']:>8}{values['throughput']:>14.1f}"
+                  f"{values['p50_ms']:>10.1f}{values['p95_ms']:>10.1f}{values['api_calls']:>10}"
+                  f"{values['rate_limited']:>6}{values['disk_bytes']:>14,}")
+        if results[str(size)]["대화"]["failures"]:
+            print(f"       대화 실패 {results[str(size)]['대화']['failures']}건")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"기준보다 {args.tolerance:.0%} 이상 나빠진 항목:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("기준 결과 대비 회귀 없음")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
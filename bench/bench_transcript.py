@@ -0,0 +1,101 @@
+"""관리자 대화 보기 벤치마크 - 대화 전체를 읽는 이전 방식과 기록 색인으로 한 쪽만 읽는 방식 비교
+
+긴 대화 한 개에서 다음을 측정·확인한다.
+- 화면을 다시 그릴 때마다 드는 시간: 이전 방식(대화 전체 읽기 + 다운로드용 JSON 문자열 만들기)과
+  색인 방식(바뀐 부분만 색인에 반영 + 한 쪽 읽기), 그리고 그려야 하는 메시지 요소 수
+- 학생이 대화를 이어가는 동안(로그에 기록이 추가되고 압축도 일어남) 색인으로 읽은 쪽이
+  대화 전체에서 같은 범위를 자른 것과 같은지
+- 내용 검색 시간 (처음 검색, 같은 검색 재사용)
+
+실행: python -m bench.bench_transcript --messages 5000 --page-size 50
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+
+import storage
+from bench.synthetic import make_conversations
+
+
+def add_message(backend, conversation, message):
+    backend.save_data({"type": f"{message['role']}_message", "session_id": conversation["session_id"],
+                       "student_id": conversation["student_id"], "student_name": conversation["student_name"],
+                       "content": message["content"], "timestamp": message["timestamp"]})
+
+
+def legacy_rerun(backend, student_id, student_name):
+    """이전 관리자 화면 (대화 전체를 읽고 다운로드 버튼용 JSON을 매번 만듦)"""
+    conversation = backend.load_conversation(student_id, student_name)
+    json.dumps(conversation, ensure_ascii=False, indent=2)
+    return len(conversation["messages"])
+
+
+def indexed_rerun(transcript, page, page_size):
+    positions = transcript.select()
+    return transcript.read(positions[(page - 1) * page_size:page * page_size])
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - started) / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="관리자 대화 보기 방식 비교")
+    parser.add_argument("--messages", type=int, default=5000, help="처음 대화의 메시지 수")
+    parser.add_argument("--appends", type=int, default=20, help="이어서 추가하며 확인하는 횟수")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5, help="시간 측정 반복 횟수")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bench-transcript-")
+    try:
+        backend = storage.get_backend(workdir, args.backend)
+        conversation = make_conversations(1, args.messages + args.appends * 2)[0]
+        messages = conversation["messages"]
+        for message in messages[:args.messages]:
+            add_message(backend, conversation, message)
+        student_id, student_name = conversation["student_id"], conversation["student_name"]
+
+        transcript = backend.transcript_index(student_id, student_name)
+        _, build_seconds = timed(transcript.count, 1)
+        page_count = (args.messages + args.page_size - 1) // args.page_size
+        rendered, legacy_seconds = timed(lambda: legacy_rerun(backend, student_id, student_name), args.repeat)
+        page, indexed_seconds = timed(lambda: indexed_rerun(transcript, page_count, args.page_size), args.repeat)
+
+        print(f"메시지 {args.messages}개, 쪽당 {args.page_size}개, 저장소 {args.backend}")
+        print(f"{'방식':<24}{'다시 그리기(ms)':>16}{'그리는 메시지':>14}")
+        print(f"{'이전 방식 (전체 + JSON)':<24}{legacy_seconds * 1000:>16.1f}{rendered:>14}")
+        print(f"{'색인 방식 (마지막 쪽)':<24}{indexed_seconds * 1000:>16.1f}{len(page):>14}")
+        print(f"처음 색인 만들기: {build_seconds * 1000:.1f}ms")
+
+        # 대화를 이어가며 (로그 추가, 압축) 색인으로 읽은 쪽이 전체 대화와 맞는지 확인
+        mismatched = 0
+        for index in range(args.appends):
+            for message in messages[args.messages + index * 2:args.messages + index * 2 + 2]:
+                add_message(backend, conversation, message)
+            full = backend.load_conversation(student_id, student_name)["messages"]
+            last_page = (len(full) + args.page_size - 1) // args.page_size
+            for page_number in (1, last_page):
+                expected = full[(page_number - 1) * args.page_size:page_number * args.page_size]
+                if indexed_rerun(transcript, page_number, args.page_size) != expected:
+                    mismatched += 1
+        print(f"추가 {args.appends}번 후 쪽 내용 확인: 불일치 {mismatched}개")
+
+        positions = transcript.select()
+        hits, first_search = timed(lambda: transcript.search(positions, "맹그로브"), 1)
+        _, cached_search = timed(lambda: transcript.search(positions, "맹그로브"), args.repeat)
+        print(f"검색 '맹그로브' {len(hits)}개: 처음 {first_search * 1000:.1f}ms, 같은 검색 {cached_search * 1000:.2f}ms")
+        return 0 if mismatched == 0 else 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""로컬 사전 분류 평가 - GPT 판정이 붙은 메시지 표본과의 일치율
+
+표본(JSONL, 한 줄에 {"message": 내용, "relevant": GPT 판정})에 대해 prefilter가
+로컬에서 판정한 비율(GPT 호출 절감)과, 로컬 판정이 GPT 판정과 어긋난 건수를 보여준다.
+관련 메시지를 관련없음으로 잘못 거르면 학생 점수가 깎이므로 "관련→관련없음" 건수가 0인지 먼저 볼 것.
+--sweep을 주면 주제 점수 기준값별 결과를 함께 보여준다.
+
+기준값을 고른 표본으로 일치율을 재면 독립적인 확인이 되지 않으므로, 표본을 고정된 순서로 섞어
+조정용과 확인용(--holdout 비율)으로 나눈다. 기준값 비교(--sweep)는 조정용 표본에서만 하고,
+보고할 일치율과 어긋난 메시지는 기준값을 정할 때 보지 않은 확인용 표본에서 잰다.
+
+기본 표본(bench/prefilter_sample.jsonl)은 평가 기준에 맞춰 손으로 붙인 작은 예시로, GPT 판정이 아니다.
+기준값을 바꿀 때는 저장된 대화에서 표본을 뽑아 GPT로 판정을 붙인 표본으로 확인한다:
+  python -m bench.eval_prefilter --from-data data --limit 300 --label --output data/prefilter_sample.jsonl
+  python -m bench.eval_prefilter --sample data/prefilter_sample.jsonl --sweep
+
+실행: python -m bench.eval_prefilter
+"""
+import argparse
+import json
+import os
+import random
+
+import analysis
+import openai_client
+import prefilter
+import storage
+
+DEFAULT_SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prefilter_sample.jsonl")
+SWEEP_THRESHOLDS = (0.15, 0.2, 0.25, 0.3, 0.35, 0.4)
+
+
+def load_sample(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def sample_from_data(data_dir, limit, seed=0):
+    """저장된 대화에서 분석 대상 학생 메시지를 중복 없이 무작위로 뽑음"""
+    messages = set()
+    for conversation in storage.get_backend(data_dir).load_all_conversations():
+        messages.update(analysis._user_messages(conversation))
+    messages = sorted(messages)
+    random.Random(seed).shuffle(messages)
+    return [{"message": message} for message in messages[:limit]]
+
+
+def label_with_gpt(rows, base_url=None):
+    """사전 분류 없이 GPT로만 판정해 relevant 값을 채움 (OPENAI_API_KEY 필요)"""
+    client = openai_client.get_client(os.environ.get("OPENAI_API_KEY", ""), base_url)
+    verdicts = analysis.classify_messages(client, [row["message"] for row in rows], use_prefilter=False)
+    for row, verdict in zip(rows, verdicts):
+        row["relevant"] = verdict
+    return rows
+
+
+def evaluate(rows, local_filter):
+    result = {"total": len(rows), "local": 0, "agree": 0, "false_irrelevant": [], "false_relevant": []}
+    for row in rows:
+        verdict = local_filter.classify(row["message"])
+        if verdict is None:
+            continue
+        result["local"] += 1
+        if verdict == row["relevant"]:
+            result["agree"] += 1
+        elif row["relevant"]:
+            result["false_irrelevant"].append(row["message"])
+        else:
+            result["false_relevant"].append(row["message"])
+    return result
+
+
+def split_sample(rows, holdout, seed=0):
+    """(조정용, 확인용) - 같은 표본이면 항상 같게 나뉨"""
+    rows = list(rows)
+    random.Random(seed).shuffle(rows)
+    test_size = int(round(len(rows) * holdout))
+    return rows[test_size:], rows[:test_size]
+
+
+def _report_line(label, result):
+    total = result["total"] or 1
+    local = result["local"] or 1
+    return (f"{label:<12}{result['local']:>6}/{result['total']:<6}{result['local'] / total:>9.0%}"
+            f"{result['agree'] / local:>10.1%}{len(result['false_irrelevant']):>12}{len(result['false_relevant']):>12}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="로컬 사전 분류와 GPT 판정의 일치율 평가")
+    parser.add_argument("--sample", default=DEFAULT_SAMPLE, help="판정이 붙은 표본 JSONL")
+    parser.add_argument("--from-data", default=None, help="이 데이터 폴더의 대화에서 표본을 뽑음")
+    parser.add_argument("--limit", type=int, default=300, help="--from-data로 뽑을 메시지 수")
+    parser.add_argument("--label", action="store_true", help="표본에 GPT 판정을 새로 붙임")
+    parser.add_argument("--base-url", default=None, help="--label에 쓸 API 주소 (기본: OPENAI_BASE_URL 또는 OpenAI)")
+    parser.add_argument("--output", default=None, help="판정을 붙인 표본을 저장할 경로")
+    parser.add_argument("--sweep", action="store_true", help="주제 점수 기준값별 결과도 출력 (조정용 표본)")
+    parser.add_argument("--holdout", type=float, default=0.3, help="기준값 조정에 쓰지 않고 일치율 확인에만 쓰는 표본 비율")
+    parser.add_argument("--seed", type=int, default=0, help="조정용·확인용 표본을 나누는 순서")
+    args = parser.parse_args(argv)
+
+    rows = sample_from_data(args.from_data, args.limit) if args.from_data else load_sample(args.sample)
+    if args.label:
+        rows = label_with_gpt(rows, args.base_url)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    rows = [row for row in rows if row.get("relevant") is not None]
+    if not rows:
+        print("GPT 판정이 붙은 메시지가 없습니다. --label을 함께 주세요.")
+        return
+
+    tune_rows, test_rows = split_sample(rows, args.holdout, args.seed)
+    print(f"표본 {len(rows)}건 (GPT 관련됨 {sum(1 for row in rows if row['relevant'])}건) - "
+          f"조정용 {len(tune_rows)}건, 확인용 {len(test_rows)}건")
+    header = f"{'기준':<12}{'로컬 판정':>13}{'절감률':>9}{'일치율':>10}{'관련→관련없음':>12}{'관련없음→관련':>12}"
+    shared = prefilter.get_prefilter()
+
+    print("[조정용 표본] 기준값을 고를 때 보는 결과")
+    print(header)
+    print(_report_line(f"현재 {shared.theme_threshold:.2f}", evaluate(tune_rows, shared)))
+    if args.sweep:
+        for threshold in SWEEP_THRESHOLDS:
+            candidate = prefilter.LexicalPrefilter(dict(zip(shared.themes, shared.documents)),
+                                                   theme_threshold=threshold)
+            print(_report_line(f"주제 {threshold:.2f}", evaluate(tune_rows, candidate)))
+
+    if not test_rows:
+        print("확인용 표본이 없어 독립적인 일치율을 잴 수 없습니다. (--holdout을 0보다 크게)")
+        return
+    result = evaluate(test_rows, shared)
+    print("[확인용 표본] 보고할 일치율 (기준값을 정할 때 쓰지 않은 메시지)")
+    print(header)
+    print(_report_line(f"현재 {shared.theme_threshold:.2f}", result))
+    for label, messages in (("관련→관련없음", result["false_irrelevant"]), ("관련없음→관련", result["false_relevant"])):
+        for message in messages:
+            print(f"  [{label}] {message}")
+
+
+if __name__ == "__main__":
+    main()
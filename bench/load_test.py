@@ -0,0 +1,292 @@
+"""Streamlit 동시 접속 부하 테스트 - 학생 여러 명이 동시에 접속해 로그인·질문·사진 업로드
+
+streamlit.testing.v1.AppTest로 학생 세션을 동시에 돌린다. 각 학생은 로그인 → 질문 몇 번 →
+스토리보드 사진 업로드 후 질문을 하고, 요청은 로컬 목 서버로 간다. 세션마다 실제 서버처럼
+재실행할 때마다 앱 스크립트 전체가 처음부터 실행된다.
+
+AppTest는 실행할 때마다 프로세스 전역 런타임을 바꿔 끼우므로 한 프로세스에서 세션 여러 개를
+동시에 돌릴 수 없다. 그래서 세션을 작업 프로세스 --processes개에 나눠 동시에 실행한다
+(한 프로세스 안의 세션은 차례로 실행). 데이터 폴더(파일 잠금, SQLite)는 모든 프로세스가 함께
+쓰므로 저장 경합은 실제와 같게 드러나지만, 메모리 캐시·스케줄러는 프로세스마다 따로 있다.
+
+측정 항목
+- 재실행 시간: 동작(첫 화면, 로그인, 질문, 사진 업로드, 사진 질문, 입력 없는 재실행)별 p50/p95/최대
+- 세션당 메모리: 세션 하나를 돌리는 동안 늘어난 RSS, 세션 상태(대화·캐시·요약)를 직렬화한 크기
+- 저장 경합: 파일 잠금 대기(storage.get_lock_stats), 디스크에 쓴 바이트 수
+--output으로 보고서를 JSON으로 저장하고, --history를 주면 한 줄씩 추가해 변화를 추적할 수 있다.
+
+실행: python -m bench.load_test --students 20 --processes 10 --turns 3 --latency 0.05
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import storage
+from bench.bench_suite import _disk_bytes_written, _percentile
+from bench.mock_openai import MockOpenAIServer
+from bench.synthetic import USER_MESSAGES
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_DIR, "test_0513.py")
+ACTIONS = ("첫 화면", "로그인", "질문", "사진 업로드", "사진 질문", "재실행")
+
+# 세션 상태 중 세션마다 커지는 항목 (메모리 추정에 사용)
+SESSION_KEYS = ("messages", "response_cache", "conversation_context")
+
+
+def _rss_bytes():
+    """현재 프로세스의 상주 메모리 (리눅스 /proc, 없으면 최대 사용량으로 대신함)"""
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _session_bytes(at):
+    total = 0
+    for key in SESSION_KEYS:
+        try:
+            total += len(pickle.dumps(at.session_state[key]))
+        except Exception:
+            pass
+    return total
+
+
+def make_storyboard_image(index, size=(1600, 1200)):
+    """업로드용 가짜 스토리보드 사진 (학생마다 다른 내용)"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", size, (245, 245, 235))
+    draw = ImageDraw.Draw(image)
+    for cut in range(4):
+        left = 40 + cut * (size[0] - 80) // 4
+        draw.rectangle([left, 200, left + (size[0] - 80) // 4 - 20, 900], outline=(30, 30, 30), width=6)
+        draw.ellipse([left + 60, 400 + (index * 37 + cut * 53) % 300, left + 200, 540 + (index * 37 + cut * 53) % 300],
+                     fill=((index * 50) % 255, 120, 80))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+class SessionRecorder:
+    """작업 프로세스 하나의 측정값"""
+
+    def __init__(self):
+        self.durations = {action: [] for action in ACTIONS}
+        self.errors = []
+        self.session_bytes = []
+        self.rss_deltas = []
+
+    def run(self, at, action):
+        started = time.perf_counter()
+        at.run()
+        self.durations[action].append(time.perf_counter() - started)
+        if at.exception:
+            self.errors.append(f"{action}: {at.exception[0].value}")
+        self.errors.extend(f"{action}: {error.value}" for error in at.error)
+
+
+def student_session(index, settings, recorder):
+    from streamlit.testing.v1 import AppTest
+
+    rss_before = _rss_bytes()
+    at = AppTest.from_file(APP_PATH, default_timeout=settings["timeout"])
+    recorder.run(at, "첫 화면")
+
+    at.text_input[0].input(f"학생{index:03d}")
+    at.text_input[1].input(f"3{index:04d}")
+    at.button[0].click()
+    recorder.run(at, "로그인")
+
+    for turn in range(settings["turns"]):
+        at.chat_input[0].set_value(f"{USER_MESSAGES[(index + turn) % len(USER_MESSAGES)]} ({index}-{turn})")
+        recorder.run(at, "질문")
+
+    if settings["images"]:
+        at.file_uploader[0].set_value((f"storyboard_{index}.jpg", make_storyboard_image(index), "image/jpeg"))
+        recorder.run(at, "사진 업로드")
+        at.chat_input[0].set_value("이 스케치 어때요?")
+        recorder.run(at, "사진 질문")
+
+    recorder.run(at, "재실행")
+    recorder.session_bytes.append(_session_bytes(at))
+    recorder.rss_deltas.append(_rss_bytes() - rss_before)
+
+
+def worker(student_indexes, settings, workdir, start_gate, results):
+    """작업 프로세스: 첫 실행 비용을 치른 뒤 다른 프로세스와 동시에 맡은 세션을 차례로 실행
+
+    중간에 예외가 나도 시작 신호를 기다리고 결과(오류 포함)를 항상 보내, 부모 프로세스가 멈추지 않게 한다.
+    """
+    recorder = SessionRecorder()
+    disk_before = disk_after = None
+    try:
+        try:
+            sys.path.insert(0, REPO_DIR)
+            os.chdir(workdir)  # 앱은 실행 위치의 data/ 폴더에 저장
+            from streamlit.testing.v1 import AppTest
+
+            # 모듈 import·템플릿 로딩 같은 첫 실행 비용은 측정에서 뺌
+            AppTest.from_file(APP_PATH, default_timeout=settings["timeout"]).run()
+        finally:
+            start_gate.wait()
+
+        storage.get_lock_stats().reset()
+        disk_before = _disk_bytes_written()
+        for index in student_indexes:
+            try:
+                student_session(index, settings, recorder)
+            except Exception as e:
+                recorder.errors.append(f"학생 {index}: {e!r}")
+        disk_after = _disk_bytes_written()
+    except Exception as e:
+        recorder.errors.append(f"작업 프로세스 {os.getpid()}: {e!r}")
+    finally:
+        results.put({
+            "durations": recorder.durations,
+            "errors": recorder.errors,
+            "session_bytes": recorder.session_bytes,
+            "rss_deltas": recorder.rss_deltas,
+            "lock": storage.get_lock_stats().stats(),
+            "disk_bytes": None if disk_before is None or disk_after is None else disk_after - disk_before,
+        })
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(APP_PATH),
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _merge_lock_stats(parts):
+    acquisitions = sum(part["acquisitions"] for part in parts)
+    return {
+        "acquisitions": acquisitions,
+        "contended": sum(part["contended"] for part in parts),
+        "avg_wait": (sum(part["avg_wait"] * part["acquisitions"] for part in parts) / acquisitions
+                     if acquisitions else 0.0),
+        "max_wait": max((part["max_wait"] for part in parts), default=0.0),
+    }
+
+
+def run_load_test(args):
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    processes = max(1, min(args.processes, args.students))
+    settings = {"turns": args.turns, "images": args.images, "timeout": args.timeout}
+    context = multiprocessing.get_context("spawn")
+
+    with MockOpenAIServer(latency=args.latency, chunk_delay=args.chunk_delay,
+                          error_rate=args.error_rate) as server:
+        os.environ["OPENAI_API_KEY"] = "sk-mock"
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+
+        start_gate = context.Barrier(processes + 1)
+        results = context.Queue()
+        workers = [context.Process(target=worker, args=(list(range(number, args.students, processes)), settings,
+                                                        workdir, start_gate, results))
+                   for number in range(processes)]
+        for process in workers:
+            process.start()
+        start_gate.wait()
+        server.reset_stats()
+        started = time.perf_counter()
+        parts = [results.get() for _ in workers]
+        elapsed = time.perf_counter() - started
+        for process in workers:
+            process.join()
+
+    durations = {action: [value for part in parts for value in part["durations"][action]] for action in ACTIONS}
+    session_bytes = [value for part in parts for value in part["session_bytes"]]
+    rss_deltas = [value for part in parts for value in part["rss_deltas"]]
+    disk = [part["disk_bytes"] for part in parts]
+    return {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": _git_commit(),
+        "settings": dict(settings, students=args.students, processes=processes, latency=args.latency,
+                         chunk_delay=args.chunk_delay, error_rate=args.error_rate),
+        "seconds": round(elapsed, 2),
+        "reruns": {
+            action: {
+                "count": len(values),
+                "p50_ms": round(_percentile(values, 0.50) * 1000, 1),
+                "p95_ms": round(_percentile(values, 0.95) * 1000, 1),
+                "max_ms": round(max(values) * 1000, 1),
+            }
+            for action, values in durations.items() if values
+        },
+        "memory": {
+            "rss_per_session": sum(rss_deltas) // max(1, len(rss_deltas)),
+            "session_state_avg": sum(session_bytes) // max(1, len(session_bytes)),
+        },
+        "storage": dict(_merge_lock_stats([part["lock"] for part in parts]),
+                        disk_bytes=None if None in disk else sum(disk)),
+        "api": {"requests": server.stats["requests"], "rate_limited": server.stats["rate_limited"]},
+        "errors": [error for part in parts for error in part["errors"]],
+    }
+
+
+def print_report(report):
+    settings = report["settings"]
+    print(f"학생 {settings['students']}명 (프로세스 {settings['processes']}개) · 질문 {settings['turns']}번 · "
+          f"사진 {'있음' if settings['images'] else '없음'} · 목 서버 지연 {settings['latency']}초 → 전체 {report['seconds']}초")
+    print(f"{'동작':<10}{'횟수':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'최대(ms)':>10}")
+    for action, values in report["reruns"].items():
+        print(f"{action:<10}{values['count']:>6}{values['p50_ms']:>10.1f}{values['p95_ms']:>10.1f}{values['max_ms']:>10.1f}")
+    memory = report["memory"]
+    print(f"세션당 메모리: 세션 실행 중 RSS 증가 {memory['rss_per_session'] / 1024:,.0f}KB, "
+          f"세션 상태 {memory['session_state_avg'] / 1024:,.1f}KB")
+    lock = report["storage"]
+    disk = "알 수 없음" if lock["disk_bytes"] is None else f"{lock['disk_bytes']:,}바이트"
+    print(f"파일 잠금: {lock['acquisitions']}회 중 경합 {lock['contended']}회, "
+          f"평균 대기 {lock['avg_wait'] * 1000:.2f}ms, 최대 {lock['max_wait'] * 1000:.1f}ms · 디스크 기록 {disk}")
+    print(f"API 요청 {report['api']['requests']}건 (429 {report['api']['rate_limited']}건) · 오류 {len(report['errors'])}건")
+    for error in report["errors"][:10]:
+        print(f"  {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AppTest로 여러 학생 세션을 동시에 실행하는 부하 테스트")
+    parser.add_argument("--students", type=int, default=20)
+    parser.add_argument("--processes", type=int, default=min(8, os.cpu_count() or 1),
+                        help="세션을 나눠 실행할 작업 프로세스 수 (동시에 활동하는 학생 수)")
+    parser.add_argument("--turns", type=int, default=3, help="학생당 질문 수")
+    parser.add_argument("--no-images", dest="images", action="store_false", help="사진 업로드 생략")
+    parser.add_argument("--latency", type=float, default=0.05, help="목 서버 응답 지연(초)")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="스트리밍 조각 사이 지연(초)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="목 서버 429 비율")
+    parser.add_argument("--timeout", type=float, default=120.0, help="재실행 한 번의 제한 시간(초)")
+    parser.add_argument("--output", default=None, help="보고서를 저장할 JSON 경로")
+    parser.add_argument("--history", default=None, help="보고서를 한 줄씩 추가할 JSONL 경로")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output) if args.output else None
+    history = os.path.abspath(args.history) if args.history else None
+    report = run_load_test(args)
+    print_report(report)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if history:
+        with open(history, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(report, ensure_ascii=False) + "\n")
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
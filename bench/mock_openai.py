@@ -0,0 +1,364 @@
+"""로컬 OpenAI 호환 목(mock) 서버
+
+비용 없이 앱의 GPT 호출 경로를 실행하기 위한 서버. 응답 지연과 요청 한도(429)
+오류 비율을 조절할 수 있으며, 같은 입력에는 항상 같은 응답을 돌려준다.
+제공자의 프롬프트 캐시도 흉내 내어 usage에 캐시 처리된 입력 토큰 수를 넣는다.
+이미지 생성 요청에는 프롬프트로 색이 정해지는 작은 PNG를 Base64 또는 내려받을 수 있는 URL로 돌려준다.
+
+단독 실행: python -m bench.mock_openai --port 8765 --latency 0.2
+앱 연결:   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 streamlit run test_0513.py
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+RELEVANCE_PATTERN = re.compile(r'학생 메시지: "(.*)"\s*다음 기준으로', re.S)
+BATCH_MARKER = "메시지 목록:\n"
+
+
+def relevance_verdict(message):
+    """메시지 내용으로 정해지는 결정적 판정 (약 2/3가 관련됨)"""
+    digest = hashlib.sha256(message.encode("utf-8")).digest()
+    return digest[0] % 3 != 0
+
+
+def _message_text(message):
+    content = message.get("content")
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+    return content or ""
+
+
+def estimate_tokens(text):
+    """대략적인 토큰 수 (영문·기호는 4글자, 한글은 1.5글자당 1토큰)"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return max(1, int(ascii_chars / 4 + (len(text) - ascii_chars) / 1.5))
+
+
+# 제공자의 프롬프트 캐시 규칙 흉내: 1024토큰 이상 같은 앞부분이 있으면 128토큰 단위로 캐시 처리
+PREFIX_CACHE_MIN_TOKENS = 1024
+PREFIX_CACHE_INCREMENT = 128
+
+
+class PrefixCache:
+    """이전 요청과 메시지 단위로 똑같은 앞부분을 캐시 적중 토큰으로 계산"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = set()
+
+    def cached_tokens(self, model, messages):
+        digest = hashlib.sha256(str(model).encode("utf-8"))
+        prefixes = []
+        tokens = 0
+        for message in messages:
+            digest.update(json.dumps(message, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+            tokens += estimate_tokens(_message_text(message))
+            prefixes.append((digest.hexdigest(), tokens))
+
+        cached = 0
+        with self._lock:
+            for key, prefix_tokens in prefixes:
+                if key not in self._seen:
+                    break
+                cached = prefix_tokens
+            self._seen.update(key for key, _ in prefixes)
+        if cached < PREFIX_CACHE_MIN_TOKENS:
+            return 0
+        return cached - (cached - PREFIX_CACHE_MIN_TOKENS) % PREFIX_CACHE_INCREMENT
+
+
+def batch_relevance_reply(text):
+    """배치 관련성 판정 요청("메시지 목록:" + JSON 배열)에 대한 응답 (해당 요청이 아니면 None)"""
+    if not text.startswith(BATCH_MARKER):
+        return None
+    items = json.loads(text[len(BATCH_MARKER):])
+    return json.dumps({"verdicts": {str(item["index"]): relevance_verdict(item["message"]) for item in items}})
+
+
+def default_chat_reply(body):
+    """요청 종류(관련성 판정 / JSON 구조 추출 / 일반 대화)에 맞는 응답 내용"""
+    last = _message_text(body["messages"][-1])
+
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        batch_reply = batch_relevance_reply(last)
+        if batch_reply is not None:
+            return batch_reply
+        return json.dumps({
+            "title": "사라지는 맹그로브 숲",
+            "theme": "새우 양식과 맹그로브 숲의 파괴",
+            "scenes": [
+                {"scene_num": 1, "visual": "피자 가게에서 새우 피자를 먹는 학생들", "audio": "맛있다!", "time": "5초"},
+                {"scene_num": 2, "visual": "베어지는 맹그로브 숲", "audio": "내레이션", "time": "7초"}
+            ],
+            "overall_summary": "새우 소비가 맹그로브 숲 파괴로 이어지는 과정을 보여준다."
+        }, ensure_ascii=False)
+
+    match = RELEVANCE_PATTERN.search(last)
+    if match:
+        return "관련됨" if relevance_verdict(match.group(1)) else "관련없음"
+
+    return f"좋은 질문이에요! '{last[:40]}'에 대해 함께 스토리보드를 구상해봐요."
+
+
+MOCK_IMAGE_EDGE = 64
+
+
+def mock_image_png(prompt):
+    """프롬프트로 색이 정해지는 정사각형 PNG (같은 프롬프트면 같은 이미지)"""
+    digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+    buffer = io.BytesIO()
+    Image.new("RGB", (MOCK_IMAGE_EDGE, MOCK_IMAGE_EDGE), tuple(digest[:3])).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # 학급 전체가 한꺼번에 접속해도 연결이 거절되지 않도록 대기열을 넉넉하게
+    request_queue_size = 256
+
+
+class MockOpenAIServer:
+    """백그라운드 스레드에서 도는 OpenAI 호환 HTTP 서버
+
+    latency             : 요청마다 기다리는 시간(초) - 스트리밍이면 첫 글자까지의 시간
+    error_rate          : 429 응답을 돌려줄 확률
+    retry_after         : 429 응답의 Retry-After 헤더 값(초)
+    chunk_delay         : 스트리밍 응답의 조각 사이 지연(초)
+    stream_failure_rate : 스트리밍 도중 연결을 끊을 확률
+    rate_limit          : rate_window초 동안 받을 수 있는 요청 수 (넘으면 429, None이면 제한 없음)
+                          실제 서비스처럼 한도가 시간에 따라 조금씩 다시 채워지는 방식
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0, retry_after=0.05,
+                 chunk_delay=0.0, stream_failure_rate=0.0, seed=0, chat_reply=default_chat_reply,
+                 rate_limit=None, rate_window=60.0):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self._allowance = float(rate_limit or 0)
+        self._allowance_updated = time.monotonic()
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.chunk_delay = chunk_delay
+        self.stream_failure_rate = stream_failure_rate
+        self.chat_reply = chat_reply
+        self.prefix_cache = PrefixCache()
+        # URL로 돌려준 이미지 (파일 이름 → PNG)
+        self._images = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {}
+        self.reset_stats()
+        self._httpd = _HTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"requests": 0, "rate_limited": 0, "prompt_tokens": 0, "cached_tokens": 0,
+                          "completion_tokens": 0, "by_model": {}}
+
+    def _record(self, model, prompt_tokens, completion_tokens, cached_tokens=0):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["cached_tokens"] += cached_tokens
+            self.stats["completion_tokens"] += completion_tokens
+            self.stats["by_model"][model] = self.stats["by_model"].get(model, 0) + 1
+
+    def _should_fail(self):
+        """429로 거절할지 정하고 Retry-After 값(초)을 반환 (거절하지 않으면 None)"""
+        with self._lock:
+            now = time.monotonic()
+            if self.rate_limit:
+                refill_rate = self.rate_limit / self.rate_window
+                self._allowance = min(self.rate_limit,
+                                      self._allowance + (now - self._allowance_updated) * refill_rate)
+                self._allowance_updated = now
+                if self._allowance < 1:
+                    self.stats["rate_limited"] += 1
+                    return round((1 - self._allowance) / refill_rate, 3)
+                self._allowance -= 1
+            if self._random.random() < self.error_rate:
+                self.stats["rate_limited"] += 1
+                return self.retry_after
+            return None
+
+    def _should_break_stream(self):
+        with self._lock:
+            if self._random.random() < self.stream_failure_rate:
+                self.stats["broken_streams"] = self.stats.get("broken_streams", 0) + 1
+                return True
+            return False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # keep-alive 연결에서 헤더와 본문을 따로 보낼 때 생기는 지연(Nagle + delayed ACK) 방지
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=None):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                name = self.path.rsplit("/", 1)[-1]
+                with server._lock:
+                    data = server._images.get(name) if self.path.startswith("/mock-images/") else None
+                if data is None:
+                    self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+
+                if server.latency:
+                    time.sleep(server.latency)
+
+                retry_after = server._should_fail()
+                if retry_after is not None:
+                    self._send_json(429, {"error": {"message": "Rate limit reached (mock)",
+                                                    "type": "requests", "code": "rate_limit_exceeded"}},
+                                    headers={"Retry-After": str(retry_after)})
+                    return
+
+                if self.path.endswith("/chat/completions"):
+                    self._chat_completion(body)
+                elif self.path.endswith("/images/generations"):
+                    self._image_generation(body)
+                else:
+                    self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+            def _chat_completion(self, body):
+                text = server.chat_reply(body)
+                prompt_tokens = sum(estimate_tokens(_message_text(m)) for m in body.get("messages", []))
+                completion_tokens = estimate_tokens(text)
+                cached_tokens = server.prefix_cache.cached_tokens(body.get("model"), body.get("messages", []))
+                server._record(body.get("model"), prompt_tokens, completion_tokens, cached_tokens)
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                         "total_tokens": prompt_tokens + completion_tokens,
+                         "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+                if body.get("stream"):
+                    self._stream_chat_completion(body, text, usage)
+                    return
+                self._send_json(200, {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                                 "finish_reason": "stop"}],
+                    "usage": usage
+                })
+
+            def _stream_chat_completion(self, body, text, usage):
+                """Server-Sent Events 형식으로 몇 글자씩 나눠 보냄"""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                def send(payload):
+                    self.wfile.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+
+                base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk",
+                        "created": int(time.time()), "model": body.get("model")}
+                pieces = [text[i:i + 4] for i in range(0, len(text), 4)]
+                break_at = len(pieces) // 2 if server._should_break_stream() else None
+                for index, piece in enumerate(pieces):
+                    if index == break_at:
+                        return
+                    delta = {"content": piece} if index else {"role": "assistant", "content": piece}
+                    send(dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}]))
+                    if server.chunk_delay:
+                        time.sleep(server.chunk_delay)
+                send(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    send(dict(base, choices=[], usage=usage))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def _image_generation(self, body):
+                prompt = body.get("prompt", "")
+                server._record(body.get("model"), estimate_tokens(prompt), 0)
+                data = mock_image_png(prompt)
+                if body.get("response_format") == "b64_json":
+                    item = {"b64_json": base64.b64encode(data).decode("ascii")}
+                else:
+                    name = hashlib.sha256(data).hexdigest()[:16] + ".png"
+                    with server._lock:
+                        server._images[name] = data
+                    host, port = server._httpd.server_address[:2]
+                    item = {"url": f"http://{host}:{port}/mock-images/{name}"}
+                self._send_json(200, {"created": int(time.time()), "data": [item]})
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="로컬 OpenAI 호환 목 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="요청당 지연(초)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="429 응답 비율 (0~1)")
+    args = parser.parse_args(argv)
+
+    server = MockOpenAIServer(args.host, args.port, latency=args.latency, error_rate=args.error_rate)
+    print(f"목 서버 실행 중: {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""저장소 동시성 스트레스 테스트
+
+여러 프로세스 x 여러 스레드가 같은 학생들의 대화/피드백/로그인 기록을 동시에
+저장한 뒤, 기록이 하나도 빠지거나 중복되지 않았는지 확인한다.
+
+실행: python -m bench.stress_storage --processes 8 --threads 4 --messages 100 [--backend sqlite]
+"""
+import argparse
+import multiprocessing
+import sys
+import tempfile
+import threading
+import time
+
+import storage
+
+STUDENTS = [("30101", "김하늘"), ("30102", "이바다"), ("30103", "박숲")]
+
+
+def _worker(args):
+    worker_id, data_dir, backend_name, threads, messages, compact_threshold = args
+    # 압축이 자주 일어나도록 임계값을 낮춰 압축 경로까지 함께 검증
+    storage.COMPACT_THRESHOLD_BYTES = compact_threshold
+    backend = storage.get_backend(data_dir, backend_name)
+    errors = []
+
+    def run(thread_id):
+        for i in range(messages):
+            student_id, student_name = STUDENTS[i % len(STUDENTS)]
+            base = {
+                "session_id": f"{worker_id}-{thread_id}",
+                "student_name": student_name,
+                "student_id": student_id,
+                "timestamp": "2024-05-13 10:00:00",
+            }
+            try:
+                if i % 25 == 0:
+                    backend.save_data(dict(base, type="student_info"))
+                kind = "feedback" if i % 10 == 9 else ("user_message" if i % 2 == 0 else "assistant_message")
+                backend.save_data(dict(base, type=kind, content=f"{worker_id}:{thread_id}:{i}"))
+            except Exception as e:
+                errors.append(repr(e))
+
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="save_data 동시성 스트레스 테스트")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=100, help="스레드당 저장 횟수")
+    parser.add_argument("--compact-threshold", type=int, default=4096, help="로그 압축 임계값(바이트)")
+    args = parser.parse_args(argv)
+
+    data_dir = tempfile.mkdtemp(prefix="storage-stress-")
+    backend = storage.get_backend(data_dir, args.backend)
+
+    started = time.perf_counter()
+    jobs = [(p, data_dir, args.backend, args.threads, args.messages, args.compact_threshold) for p in range(args.processes)]
+    with multiprocessing.Pool(args.processes) as pool:
+        errors = [e for result in pool.map(_worker, jobs) for e in result]
+    elapsed = time.perf_counter() - started
+
+    expected = set()
+    expected_logins = 0
+    for p in range(args.processes):
+        for t in range(args.threads):
+            for i in range(args.messages):
+                expected.add(f"{p}:{t}:{i}")
+                if i % 25 == 0:
+                    expected_logins += 1
+
+    found = []
+    for conversation in backend.load_all_conversations():
+        found.extend(msg["content"] for msg in conversation["messages"])
+        found.extend(fb["content"] for fb in conversation.get("feedback", []))
+    students = backend.load_students()
+
+    missing = expected - set(found)
+    duplicated = len(found) - len(set(found))
+    total = len(expected) + expected_logins
+    print(f"저장 {total}건 / {elapsed:.2f}초 ({total / elapsed:.0f}건/초), 데이터 폴더: {data_dir}")
+    print(f"대화 기록: 기대 {len(expected)}, 발견 {len(found)}, 누락 {len(missing)}, 중복 {duplicated}")
+    print(f"로그인 기록: 기대 {expected_logins}, 발견 {len(students)}")
+    if errors:
+        print(f"저장 오류 {len(errors)}건, 예: {errors[0]}")
+
+    ok = not missing and not duplicated and len(students) == expected_logins and not errors
+    print("통과" if ok else "실패")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
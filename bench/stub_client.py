@@ -0,0 +1,62 @@
+"""HTTP 없이 동작하는 OpenAI 클라이언트 대역(stub)
+
+client.chat.completions.create(...) 호출을 목 서버와 같은 규칙으로 처리하고,
+호출 수와 토큰 수를 센다. 지연 시간은 "기본 지연 + 토큰당 지연"으로 흉내 낸다.
+"""
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from bench.mock_openai import PrefixCache, _message_text, default_chat_reply, estimate_tokens
+
+
+class StubOpenAI:
+    def __init__(self, base_latency=0.0, prompt_token_latency=0.0, completion_token_latency=0.0,
+                 malformed_rate=0.0, seed=0, chat_reply=default_chat_reply):
+        self.base_latency = base_latency
+        self.prompt_token_latency = prompt_token_latency
+        self.completion_token_latency = completion_token_latency
+        self.malformed_rate = malformed_rate
+        self.chat_reply = chat_reply
+        self.prefix_cache = PrefixCache()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {}
+        self.reset_stats()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "malformed": 0}
+
+    def _create(self, **kwargs):
+        text = self.chat_reply(kwargs)
+        json_mode = (kwargs.get("response_format") or {}).get("type") == "json_object"
+        with self._lock:
+            if json_mode and self._random.random() < self.malformed_rate:
+                text = text[:len(text) // 2]
+                self.stats["malformed"] += 1
+
+        prompt_tokens = sum(estimate_tokens(_message_text(m)) for m in kwargs.get("messages", []))
+        completion_tokens = estimate_tokens(text)
+        cached_tokens = self.prefix_cache.cached_tokens(kwargs.get("model"), kwargs.get("messages", []))
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["cached_tokens"] += cached_tokens
+            self.stats["completion_tokens"] += completion_tokens
+
+        delay = (self.base_latency + prompt_tokens * self.prompt_token_latency
+                 + completion_tokens * self.completion_token_latency)
+        if delay:
+            time.sleep(delay)
+
+        return SimpleNamespace(
+            model=kwargs.get("model"),
+            choices=[SimpleNamespace(index=0, finish_reason="stop",
+                                     message=SimpleNamespace(role="assistant", content=text))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                  total_tokens=prompt_tokens + completion_tokens,
+                                  prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens))
+        )
@@ -0,0 +1,46 @@
+"""벤치마크용 가상 학급 데이터 생성"""
+import random
+from datetime import datetime, timedelta
+
+USER_MESSAGES = [
+    "맹그로브 숲을 주제로 스토리보드를 만들고 싶어요",
+    "데이터 센터의 위치가 환경에 어떤 영향을 주나요?",
+    "첫 번째 장면에 어떤 인물을 넣으면 좋을까요?",
+    "패스트 패션 때문에 버려지는 옷을 어떻게 표현할까요",
+    "발표할 때 어떤 메시지를 강조해야 할까요?",
+    "펭귄이 사는 남극이 따뜻해지는 장면을 그리고 싶어요",
+    "네",
+    "감사합니다",
+    "알겠습니다",
+    "오늘 점심 뭐 먹지",
+    "4컷 만화로 하면 몇 초 정도가 적당할까요?",
+    "초콜릿 때문에 숲이 사라진다는 게 무슨 뜻이에요?",
+]
+
+
+def make_conversations(students=30, messages_per_student=20, seed=0):
+    """학생마다 학생/AI 메시지가 번갈아 나오는 기존 대화 구조 목록"""
+    rng = random.Random(seed)
+    start = datetime(2024, 5, 13, 9, 0, 0)
+    conversations = []
+    for s in range(students):
+        student_id = f"3{s:04d}"
+        student_name = f"학생{s}"
+        messages = []
+        t = start
+        for i in range(messages_per_student):
+            t += timedelta(seconds=rng.randint(20, 120))
+            if i % 2 == 0:
+                content = f"{rng.choice(USER_MESSAGES)} ({s}-{i})"
+                role = "user"
+            else:
+                content = "좋은 생각이에요! 조금 더 구체적으로 장면을 떠올려 볼까요?"
+                role = "assistant"
+            messages.append({"role": role, "content": content, "timestamp": t.strftime("%Y-%m-%d %H:%M:%S")})
+        conversations.append({
+            "session_id": f"session-{s}",
+            "student_name": student_name,
+            "student_id": student_id,
+            "messages": messages
+        })
+    return conversations
@@ -0,0 +1,82 @@
+# 학생 대화 요청 구성 (화면과 무관한 부분)
+# 앱의 get_gpt_response와 벤치마크(bench/bench_suite.py)가 같은 요청을 만들도록 여기 둔다.
+
+# 모델 설정
+DEFAULT_MODEL = "gpt-4o-mini"
+FEEDBACK_MODEL = "gpt-4o"
+
+# 지난 이미지를 요청에 다시 넣는 방식
+# - "current": 이번 질문에 첨부한 이미지만 보냄 (이후 대화는 AI의 이미지 분석 답변으로 이어감)
+# - "latest" : 가장 최근에 첨부한 이미지 하나만 보냄 (최종 피드백 등 그림을 다시 봐야 할 때)
+# - "all"    : 첨부한 모든 이미지를 보냄 (같은 이미지는 마지막 한 번만)
+IMAGE_HISTORY_POLICY = "current"
+PAST_IMAGE_NOTE = "[이전에 첨부한 스토리보드 이미지 - 이 이미지에 대한 분석은 이어지는 AI 답변 참고]"
+
+
+def images_to_send(messages, policy=IMAGE_HISTORY_POLICY):
+    """원본 이미지를 함께 보낼 메시지의 위치 목록"""
+    image_indexes = [i for i, msg in enumerate(messages) if msg.get("image_id")]
+    if not image_indexes:
+        return set()
+    if policy == "current":
+        last_user = max(i for i, msg in enumerate(messages) if msg["role"] == "user")
+        return {last_user} if messages[last_user].get("image_id") else set()
+    if policy == "latest":
+        return {image_indexes[-1]}
+    # 같은 이미지가 여러 번 첨부됐으면 마지막 것만
+    last_by_id = {messages[i]["image_id"]: i for i in image_indexes}
+    return set(last_by_id.values())
+
+
+# API로 보낼 요청 구성 (원본 이미지를 보내는 경우 gpt-4o 사용)
+def build_api_params(messages, image_store, use_gpt4=False, image_policy=IMAGE_HISTORY_POLICY):
+    send_indexes = {i for i in images_to_send(messages, image_policy) if image_store.exists(messages[i]["image_id"])}
+    if send_indexes:
+        use_gpt4 = True  # ✅ 이미지를 보내면 반드시 gpt-4o
+
+    model = FEEDBACK_MODEL if use_gpt4 else DEFAULT_MODEL
+
+    # API로 보낼 메시지 포맷 재구성 (이미지는 저장소에서 꺼내고, 지난 이미지는 안내 문구로 대체)
+    # 순서는 항상 고정 시스템 프롬프트 → 대화 요약 → 대화 순이라 앞부분이 모든 요청에서 같음
+    # (제공자의 프롬프트 캐시 적용 대상, 요청마다 바뀌는 내용은 뒤쪽에만 둠)
+    api_messages = []
+    for index, msg in enumerate(messages):
+        if index in send_indexes:
+            content_payload = [
+                {"type": "text", "text": msg["content"]},
+                {
+                    "type": "image_url",
+                    "image_url": {"url": image_store.data_url(msg["image_id"])}
+                }
+            ]
+            api_messages.append({"role": msg["role"], "content": content_payload})
+        elif msg.get("image_id"):
+            api_messages.append({"role": msg["role"], "content": f"{PAST_IMAGE_NOTE}\n{msg['content']}"})
+        else:
+            api_messages.append({"role": msg["role"], "content": msg["content"]})
+
+    api_params = {
+        "model": model,
+        "messages": api_messages
+    }
+
+    if not model.startswith("o1"):
+        api_params["temperature"] = 0.7
+
+    return api_params
+
+
+def stream_text(stream, parts, state):
+    """스트리밍 응답에서 글자 조각만 꺼내면서 전체 응답 조립용으로 모아둠"""
+    for chunk in stream:
+        # 마지막 조각에만 usage가 들어 있음 (stream_options의 include_usage)
+        if getattr(chunk, "usage", None) is not None:
+            state["usage"] = chunk.usage
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        if choice.finish_reason:
+            state["finish_reason"] = choice.finish_reason
+        if choice.delta.content:
+            parts.append(choice.delta.content)
+            yield choice.delta.content
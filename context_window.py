@@ -0,0 +1,159 @@
+import analysis
+
+# 대화 문맥 관리 설정
+CONTEXT_TOKEN_BUDGET = 6000     # 시스템 프롬프트를 뺀 대화 부분의 요청당 최대 토큰
+KEEP_RECENT_TURNS = 6           # 요약하지 않고 그대로 보내는 최근 턴 수 (학생 질문 + AI 답변 = 1턴)
+SUMMARY_REFRESH_TURNS = 3       # 요약을 갱신할 때 한 번에 접는 최소 턴 수 (매 턴마다 요약하지 않도록)
+SUMMARY_MODEL = "gpt-4o-mini"
+SUMMARY_MAX_TOKENS = 500
+MESSAGE_OVERHEAD_TOKENS = 4     # 메시지마다 붙는 역할·구분자 토큰
+IMAGE_TOKENS = 800              # 원본 이미지 한 장의 대략적인 토큰
+
+SUMMARY_PROMPT = """다음은 중학생과 기후 위기 스토리보드 작성 도우미의 이전 대화입니다.
+이후 대화를 이어갈 수 있도록 핵심만 한국어로 요약해주세요.
+
+반드시 남길 내용:
+- 학생이 정한 모둠 주제, 맡은 장면, 등장인물, 배경, 분위기
+- 지금까지 나온 장면·컷 구성과 아이디어
+- 스토리보드 이미지에 대해 받은 피드백과 개선 제안
+- 학생이 아직 해결하지 못한 질문이나 다음에 할 일
+- 수행평가와 관련없는 대화가 이어졌다면 그 사실
+
+기존 요약:
+{previous_summary}
+
+새로 요약에 더할 대화:
+{transcript}
+
+위 두 내용을 합친 요약만 작성하세요."""
+
+SUMMARY_MESSAGE_PREFIX = "이전 대화 요약 (오래된 대화는 이 요약으로 대신합니다):\n"
+
+
+def estimate_tokens(text):
+    """대략적인 토큰 수 (영문·기호는 4글자, 한글은 1.5글자당 1토큰)"""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return int(ascii_chars / 4 + (len(text) - ascii_chars) / 1.5)
+
+
+def message_tokens(msg):
+    """메시지 하나가 요청에서 차지하는 대략적인 토큰 수"""
+    tokens = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(msg["content"])
+    if msg.get("image_id"):
+        tokens += IMAGE_TOKENS
+    return tokens
+
+
+def split_turns(messages):
+    """앞쪽 시스템 메시지와 턴 목록으로 나눔 (턴은 학생 메시지부터 다음 학생 메시지 전까지)"""
+    leading = 0
+    while leading < len(messages) and messages[leading]["role"] == "system":
+        leading += 1
+
+    turns = []
+    for msg in messages[leading:]:
+        if msg["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append(msg)
+    return messages[:leading], turns
+
+
+def _turn_tokens(turns):
+    return sum(message_tokens(msg) for turn in turns for msg in turn)
+
+
+def _transcript(turns):
+    lines = []
+    for turn in turns:
+        for msg in turn:
+            speaker = "학생" if msg["role"] == "user" else "AI"
+            content = msg["content"]
+            if msg.get("image_id"):
+                content = f"[스토리보드 이미지 첨부] {content}"
+            lines.append(f"{speaker}: {content}")
+    return "\n".join(lines)
+
+
+def summarize_turns(client, previous_summary, turns, model=SUMMARY_MODEL):
+    """기존 요약에 새로 밀려난 턴들을 더한 누적 요약 생성"""
+    prompt = SUMMARY_PROMPT.format(previous_summary=previous_summary or "(없음)",
+                                   transcript=_transcript(turns))
+    response = analysis.call_with_retry(
+        client.chat.completions.create,
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.2,
+        max_tokens=SUMMARY_MAX_TOKENS,
+    )
+    return response.choices[0].message.content.strip()
+
+
+class ConversationContext:
+    """긴 대화를 토큰 예산 안에 맞춰 보내는 문맥 관리자 (세션마다 하나)
+
+    최근 턴은 그대로 두고, 예산을 넘으면 오래된 턴을 누적 요약 하나로 접는다.
+    요약은 새로 밀려난 턴만 기존 요약에 더해 갱신하므로 대화가 길어져도 비용이 일정하다.
+    """
+
+    def __init__(self, token_budget=CONTEXT_TOKEN_BUDGET, keep_recent_turns=KEEP_RECENT_TURNS,
+                 refresh_turns=SUMMARY_REFRESH_TURNS):
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.refresh_turns = refresh_turns
+        self.summary = ""
+        self.summarized_turns = 0   # 앞에서부터 요약에 반영된 턴 수
+        self.summary_updates = 0
+        self.last_tokens = 0        # 마지막으로 만든 요청의 대화 부분 토큰 수
+
+    def reset(self):
+        self.summary = ""
+        self.summarized_turns = 0
+
+    def _summary_messages(self):
+        if not self.summary:
+            return []
+        return [{"role": "system", "content": SUMMARY_MESSAGE_PREFIX + self.summary}]
+
+    def _fits(self, turns):
+        return _turn_tokens(turns) + estimate_tokens(self.summary) <= self.token_budget
+
+    def _without_folded(self, system_messages, turns, fold_until):
+        """요약을 갱신하지 못했을 때 이번 요청만 접을 턴을 빼고 보냄 (다음 요청에서 다시 요약 시도)"""
+        recent = [msg for turn in turns[fold_until:] for msg in turn]
+        self.last_tokens = _turn_tokens(turns[fold_until:]) + estimate_tokens(self.summary)
+        return system_messages + self._summary_messages() + recent
+
+    def build(self, client, messages, charge=None, refund=None):
+        """API로 보낼 메시지 목록 (시스템 프롬프트 + 요약 + 최근 턴)
+
+        charge를 주면 요약 요청을 보내기 전에 부르고, False를 돌려주면(호출 한도 소진 등)
+        요약하지 않고 오래된 턴을 뺀 채로 보낸다. 차감한 뒤 요약이 실패하면 refund를 불러 되돌린다.
+        """
+        system_messages, turns = split_turns(messages)
+        if self.summarized_turns >= len(turns):
+            # 대화가 새로 시작됐거나 요약 이후 기록이 지워진 경우
+            self.reset()
+
+        if not self._fits(turns[self.summarized_turns:]):
+            # 최근 턴만 남기고, 그래도 넘치면 한 턴씩 더 접음 (마지막 턴은 항상 그대로)
+            fold_until = max(len(turns) - self.keep_recent_turns, self.summarized_turns + self.refresh_turns)
+            fold_until = min(fold_until, len(turns) - 1)
+            while fold_until < len(turns) - 1 and not self._fits(turns[fold_until:]):
+                fold_until += 1
+
+            if fold_until > self.summarized_turns:
+                if charge is not None and not charge():
+                    return self._without_folded(system_messages, turns, fold_until)
+                try:
+                    self.summary = summarize_turns(client, self.summary, turns[self.summarized_turns:fold_until])
+                    self.summarized_turns = fold_until
+                    self.summary_updates += 1
+                except Exception as e:
+                    print(f"대화 요약 중 오류: {str(e)}")
+                    if charge is not None and refund is not None:
+                        refund()
+                    return self._without_folded(system_messages, turns, fold_until)
+
+        recent = [msg for turn in turns[self.summarized_turns:] for msg in turn]
+        self.last_tokens = _turn_tokens(turns[self.summarized_turns:]) + estimate_tokens(self.summary)
+        return system_messages + self._summary_messages() + recent
@@ -0,0 +1,171 @@
+import base64
+import hashlib
+import io
+import mimetypes
+import os
+import tempfile
+import threading
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# 업로드 이미지 전처리 설정
+# - 긴 변을 IMAGE_MAX_EDGE 이하로 줄이고 JPEG(또는 WEBP)로 다시 압축
+# - 손그림 스케치는 이 정도 해상도로도 GPT가 충분히 알아볼 수 있음
+IMAGE_MAX_EDGE = 1536
+IMAGE_FORMAT = "JPEG"
+IMAGE_QUALITY = 85
+
+FORMAT_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+class ImageRejected(ValueError):
+    """저장하거나 API로 보낼 수 없는 이미지 (픽셀 수가 너무 많거나 지원하지 않는 형식)"""
+
+
+def _flatten_alpha(image):
+    """투명 배경을 흰색으로 채움 (JPEG는 투명도를 지원하지 않음)"""
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def preprocess_image(data, max_edge=IMAGE_MAX_EDGE, image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY):
+    """EXIF 회전 반영 → 축소 → 재압축한 (이미지 바이트, MIME 타입) 반환"""
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        if image_format == "JPEG":
+            image = _flatten_alpha(image)
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+
+        output = io.BytesIO()
+        image.save(output, format=image_format, quality=quality, optimize=True)
+    return output.getvalue(), FORMAT_MIME_TYPES[image_format]
+
+
+def prepare_upload(image_file, max_edge=IMAGE_MAX_EDGE, image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY):
+    """업로드 파일을 전처리해 (이미지 바이트, MIME 타입) 반환
+
+    이미지로 읽을 수 없는 파일은 원본 그대로, 파일 종류에 맞는 MIME 타입으로 보낸다.
+    픽셀 수가 너무 많은 이미지(압축 폭탄)는 원본도 보내지 않고 ImageRejected를 던진다.
+    """
+    data = image_file.read()
+    try:
+        return preprocess_image(data, max_edge, image_format, quality)
+    except Image.DecompressionBombError as e:
+        raise ImageRejected(f"이미지가 너무 큽니다: {str(e)}") from e
+    except (UnidentifiedImageError, OSError):
+        mime_type = getattr(image_file, "type", None) or mimetypes.guess_type(image_file.name)[0] or "image/jpeg"
+        return data, mime_type
+
+
+# 이미지 저장소 설정
+THUMBNAIL_MAX_EDGE = 350
+MIME_EXTENSIONS = {"image/jpeg": ".jpg", "image/webp": ".webp", "image/png": ".png", "image/gif": ".gif"}
+EXTENSION_MIME_TYPES = {ext: mime for mime, ext in MIME_EXTENSIONS.items()}
+
+
+def image_id_for(data):
+    """이미지 바이트의 SHA-256 해시 (같은 사진은 몇 번 올려도 같은 ID)"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_bytes_atomic(path, data):
+    """임시 파일에 쓴 뒤 이름을 바꿔, 읽는 쪽이 잘린 파일을 보지 않도록 함"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ImageStore:
+    """내용 해시로 찾는 이미지 저장소 (원본 + 화면 표시용 썸네일)
+
+    대화 기록에는 Base64 대신 이미지 ID만 남기고, 필요할 때 여기서 꺼내 쓴다.
+    파일 이름이 내용의 해시이므로 같은 이미지는 한 번만 저장된다.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.thumbnail_dir = os.path.join(root, "thumbnails")
+        os.makedirs(self.thumbnail_dir, exist_ok=True)
+
+    def _path(self, image_id):
+        for ext in EXTENSION_MIME_TYPES:
+            path = os.path.join(self.root, image_id[:2], image_id + ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def put(self, data, mime_type):
+        """이미지를 저장하고 ID 반환 (이미 있으면 다시 쓰지 않음)
+
+        확장자로 MIME 타입을 되찾으므로 MIME_EXTENSIONS에 없는 형식은 ImageRejected를 던진다.
+        """
+        extension = MIME_EXTENSIONS.get(mime_type)
+        if extension is None:
+            raise ImageRejected(f"지원하지 않는 이미지 형식입니다: {mime_type}")
+        image_id = image_id_for(data)
+        if self._path(image_id) is None:
+            directory = os.path.join(self.root, image_id[:2])
+            os.makedirs(directory, exist_ok=True)
+            _write_bytes_atomic(os.path.join(directory, image_id + extension), data)
+        return image_id
+
+    def put_upload(self, image_file):
+        """업로드 파일을 전처리해 저장하고 ID 반환"""
+        return self.put(*prepare_upload(image_file))
+
+    def exists(self, image_id):
+        return self._path(image_id) is not None
+
+    def get(self, image_id):
+        """(이미지 바이트, MIME 타입) 반환 (없으면 None)"""
+        path = self._path(image_id)
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            return f.read(), EXTENSION_MIME_TYPES[os.path.splitext(path)[1]]
+
+    def data_url(self, image_id):
+        """API 요청에 넣을 data URL"""
+        data, mime_type = self.get(image_id)
+        return f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}"
+
+    def thumbnail(self, image_id, max_edge=THUMBNAIL_MAX_EDGE):
+        """화면 표시용 썸네일 바이트 (처음 만들 때 디스크에 저장해 재사용)"""
+        path = os.path.join(self.thumbnail_dir, f"{image_id}-{max_edge}.jpg")
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+        stored = self.get(image_id)
+        if stored is None:
+            return None
+        try:
+            data, _ = preprocess_image(stored[0], max_edge=max_edge, quality=80)
+        except (UnidentifiedImageError, OSError):
+            return stored[0]
+        _write_bytes_atomic(path, data)
+        return data
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_image_store(root):
+    """저장 위치별로 하나의 ImageStore를 공유"""
+    root = os.path.abspath(root)
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = ImageStore(root)
+        return _stores[root]
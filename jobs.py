@@ -0,0 +1,268 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from storage import closing_connection
+
+# 작업 상태
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+INTERRUPTED = "interrupted"   # 서버가 재시작되는 등 실행 중에 멈춘 작업 (이어서 실행 가능)
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+RESUMABLE_STATUSES = (FAILED, CANCELLED, INTERRUPTED)
+
+# 실행 중인데 이 시간 동안 진행 기록이 없으면 멈춘 작업으로 봄
+STALE_AFTER_SECONDS = 300
+# 실행기는 맡은 작업(대기 중 포함)의 진행 시각을 이 간격으로 갱신 (묶음 하나가 오래 걸려도 멈춘 것으로 보지 않음)
+HEARTBEAT_SECONDS = 60
+
+DEFAULT_JOB_WORKERS = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    summary TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_kind ON jobs (kind, created_at);
+
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (job_id, item_key)
+);
+"""
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class JobStore:
+    """백그라운드 작업 목록과 항목별 중간 결과(체크포인트)를 SQLite에 기록
+
+    브라우저 탭이나 Streamlit 재실행과 무관하게 남으므로, 중간에 멈춘 작업도
+    이미 끝낸 항목은 건너뛰고 이어서 실행할 수 있다.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "summary" not in columns:
+                # 이전 버전에서 만든 작업 목록에는 요약 열이 없음
+                conn.execute("ALTER TABLE jobs ADD COLUMN summary TEXT")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return closing_connection(conn)
+
+    def create(self, kind, params):
+        job_id = uuid.uuid4().hex[:12]
+        now = _now()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(params, ensure_ascii=False), now, now)
+            )
+        return job_id
+
+    def _row_to_job(self, row):
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        job["summary"] = json.loads(job["summary"]) if job["summary"] else {}
+        # 진행 기록이 오래 없는 실행 중 작업은 멈춘 것으로 표시 (프로세스 종료 등)
+        if job["status"] in ACTIVE_STATUSES:
+            updated_at = datetime.strptime(job["updated_at"], "%Y-%m-%d %H:%M:%S")
+            if datetime.now() - updated_at > timedelta(seconds=STALE_AFTER_SECONDS):
+                job["status"] = INTERRUPTED
+        return job
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def latest(self, kind):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE kind = ? ORDER BY created_at DESC, rowid DESC LIMIT 1",
+                               (kind,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def update(self, job_id, **fields):
+        fields["updated_at"] = _now()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", list(fields.values()) + [job_id])
+
+    def touch(self, job_ids):
+        """진행 중인 작업의 진행 시각만 갱신"""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return
+        placeholders = ",".join("?" * len(job_ids))
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET updated_at = ? WHERE id IN ({placeholders}) AND status IN (?, ?)",
+                         [_now()] + job_ids + list(ACTIVE_STATUSES))
+
+    def request_cancel(self, job_id):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+
+    def cancel_requested(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def save_results(self, job_id, results):
+        """항목별 결과를 저장하고 진행 시각을 갱신 (한 트랜잭션)"""
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO job_results (job_id, item_key, result) VALUES (?, ?, ?)",
+                [(job_id, key, json.dumps(result, ensure_ascii=False)) for key, result in results.items()]
+            )
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (_now(), job_id))
+
+    def result_keys(self, job_id):
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute("SELECT item_key FROM job_results WHERE job_id = ?", (job_id,))}
+
+    def results(self, job_id):
+        """저장된 순서대로 결과 목록"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT result FROM job_results WHERE job_id = ? ORDER BY rowid", (job_id,))
+            return [json.loads(row[0]) for row in rows]
+
+
+class JobContext:
+    """작업 함수가 진행 상황을 기록하고 취소 여부를 확인하는 통로"""
+
+    def __init__(self, store, job):
+        self.store = store
+        self.job_id = job["id"]
+        self.params = job["params"]
+        # 작업 전체의 집계 (이어서 실행하면 이전 실행까지의 값에서 시작)
+        self.summary = dict(job["summary"])
+
+    def done_keys(self):
+        """이전 실행까지 결과가 저장된 항목 (이어서 실행할 때 건너뜀)"""
+        return self.store.result_keys(self.job_id)
+
+    def checkpoint(self, results):
+        self.store.save_results(self.job_id, results)
+
+    def progress(self, done, total):
+        self.store.update(self.job_id, done=done, total=total)
+
+    def cancelled(self):
+        return self.store.cancel_requested(self.job_id)
+
+    def save_summary(self, summary):
+        self.summary = dict(summary)
+        self.store.update(self.job_id, summary=json.dumps(summary, ensure_ascii=False))
+
+
+class JobRunner:
+    """등록된 종류의 작업을 백그라운드 스레드에서 실행 (화면을 새로 그리거나 탭을 닫아도 계속됨)"""
+
+    def __init__(self, store, max_workers=DEFAULT_JOB_WORKERS):
+        self.store = store
+        self._handlers = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._running = set()
+        threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True).start()
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            with self._lock:
+                running = list(self._running)
+            try:
+                self.store.touch(running)
+            except sqlite3.Error as e:
+                print(f"작업 진행 시각 갱신 실패: {str(e)}")
+
+    def register(self, kind, handler):
+        """handler(context)는 context.cancelled()를 수시로 확인하고 항목마다 checkpoint를 남겨야 함"""
+        self._handlers[kind] = handler
+
+    def submit(self, kind, params=None):
+        job_id = self.store.create(kind, params or {})
+        self._start(job_id)
+        return job_id
+
+    def resume(self, job_id):
+        """멈추거나 취소된 작업을 저장된 결과 다음부터 다시 실행"""
+        if self.is_running(job_id):
+            # 이 프로세스에서 아직 실행(또는 대기) 중인 작업은 그대로 둠
+            return
+        self.store.update(job_id, status=QUEUED, cancel_requested=0, error=None)
+        self._start(job_id)
+
+    def cancel(self, job_id):
+        self.store.request_cancel(job_id)
+
+    def is_running(self, job_id):
+        with self._lock:
+            return job_id in self._running
+
+    def _start(self, job_id):
+        with self._lock:
+            if job_id in self._running:
+                return
+            self._running.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        try:
+            job = self.store.get(job_id)
+            if job["cancel_requested"]:
+                self.store.update(job_id, status=CANCELLED)
+                return
+            self.store.update(job_id, status=RUNNING)
+            context = JobContext(self.store, job)
+            self._handlers[job["kind"]](context)
+            self.store.update(job_id, status=CANCELLED if context.cancelled() else COMPLETED)
+        except Exception as e:
+            print(f"백그라운드 작업 {job_id} 실패: {str(e)}")
+            self.store.update(job_id, status=FAILED, error=str(e))
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+
+
+_runners = {}
+_runners_lock = threading.Lock()
+
+
+def get_job_runner(db_path, max_workers=DEFAULT_JOB_WORKERS):
+    """파일 경로별로 하나의 JobRunner를 공유 (프로세스가 살아 있는 동안 유지)"""
+    key = os.path.abspath(db_path)
+    with _runners_lock:
+        if key not in _runners:
+            _runners[key] = JobRunner(JobStore(db_path), max_workers)
+        return _runners[key]
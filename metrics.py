@@ -0,0 +1,298 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 프로세스 전체 지표 (모든 학생 세션과 관리자 화면이 같은 값을 봄)
+# - 카운터(누적 횟수·토큰 수)와 히스토그램(지연 시간 분포)을 이름·라벨별로 집계
+# - Prometheus 텍스트 형식으로 내보내고, 관리자 화면 차트용으로 최근 시간대별 값도 보관
+
+# 히스토그램 구간 상한(초) - API 응답(수 초)부터 파일 저장(수 ms)까지 한 구간표로 봄
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 차트용 시간대별 기록 (10초 단위, 최근 1시간)
+TIMELINE_INTERVAL = 10.0
+TIMELINE_LENGTH = 360
+
+# 모델별 100만 토큰당 가격(달러) - 입력, 캐시 처리된 입력, 출력 (가격이 바뀌면 함께 수정)
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+# 이미지 한 장 가격(달러)
+IMAGE_PRICES = {
+    "dall-e-3": 0.04,
+}
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"라벨이 맞지 않습니다: {sorted(labels)} (필요: {list(labelnames)})")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """라벨별 누적값 (호출 수, 토큰 수 등)"""
+
+    kind = "counter"
+
+    def __init__(self, registry, name, help_text, labelnames=(), timeline=False):
+        self._registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.timeline = timeline
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        if self.timeline:
+            self._registry._add_to_timeline(self.name, key, amount)
+
+    def values(self):
+        """{라벨 값 튜플: 누적값}"""
+        with self._lock:
+            return dict(self._values)
+
+    def total(self, **labels):
+        """주어진 라벨이 일치하는 값의 합 (라벨을 주지 않으면 전체 합)"""
+        positions = [(self.labelnames.index(name), str(value)) for name, value in labels.items()]
+        return sum(value for key, value in self.values().items()
+                   if all(key[index] == expected for index, expected in positions))
+
+    def samples(self):
+        for key, value in sorted(self.values().items()):
+            yield self.name, list(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """라벨별 값 분포 (지연 시간 등) - 구간별 개수와 합계·개수"""
+
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS, timeline=False):
+        self._registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.timeline = timeline
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            counts, total = self._values.get(key, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+        if self.timeline:
+            self._registry._add_to_timeline(self.name + "_sum", key, value)
+            self._registry._add_to_timeline(self.name + "_count", key, 1)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def summary(self):
+        """라벨별 개수·평균·p50·p95 (백분위수는 구간 상한으로 어림)"""
+        with self._lock:
+            snapshot = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        rows = []
+        for key, (counts, total) in sorted(snapshot.items()):
+            count = sum(counts)
+            row = dict(zip(self.labelnames, key))
+            row.update({
+                "count": count,
+                "avg": total / count if count else 0.0,
+                "p50": self._quantile(counts, 0.50),
+                "p95": self._quantile(counts, 0.95),
+            })
+            rows.append(row)
+        return rows
+
+    def _quantile(self, counts, fraction):
+        target = sum(counts) * fraction
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if count and seen >= target:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return 0.0
+
+    def samples(self):
+        with self._lock:
+            snapshot = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(snapshot.items()):
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield self.name + "_bucket", pairs + [("le", _format_value(bound))], cumulative
+            yield self.name + "_sum", pairs, total
+            yield self.name + "_count", pairs, sum(counts)
+
+
+class MetricsRegistry:
+    """이름별 지표 모음 + 다른 모듈의 현재 상태(대기열 길이 등)를 읽어오는 수집 함수"""
+
+    def __init__(self, timeline_interval=TIMELINE_INTERVAL, timeline_length=TIMELINE_LENGTH):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = []
+        self.timeline_interval = timeline_interval
+        self._timeline = deque(maxlen=timeline_length)
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name}은(는) 이미 다른 종류의 지표로 등록되어 있습니다.")
+            return metric
+
+    def counter(self, name, help_text, labelnames=(), timeline=False):
+        return self._get_or_create(Counter, name, help_text, labelnames, timeline=timeline)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS, timeline=False):
+        return self._get_or_create(Histogram, name, help_text, labelnames, buckets=buckets, timeline=timeline)
+
+    def get(self, name):
+        with self._lock:
+            return self._metrics.get(name)
+
+    def register_collector(self, collect):
+        """collect()는 (이름, 종류, 설명, [(라벨 dict, 값), ...]) 목록을 돌려주는 함수"""
+        with self._lock:
+            if collect not in self._collectors:
+                self._collectors.append(collect)
+
+    def _add_to_timeline(self, name, key, amount):
+        start = time.time() // self.timeline_interval * self.timeline_interval
+        with self._lock:
+            if not self._timeline or self._timeline[-1][0] != start:
+                self._timeline.append((start, {}))
+            bucket = self._timeline[-1][1]
+            bucket[(name, key)] = bucket.get((name, key), 0) + amount
+
+    def timeline(self, name, label=None):
+        """시간대별 값 [{"time": 시각, 라벨 값: 합계, ...}] (label을 주지 않으면 "전체"로 합침)"""
+        metric = self.get(name) or self.get(name.rsplit("_", 1)[0])
+        index = metric.labelnames.index(label) if metric is not None and label else None
+        with self._lock:
+            buckets = [(start, dict(values)) for start, values in self._timeline]
+        rows = []
+        for start, values in buckets:
+            row = {"time": datetime.fromtimestamp(start)}
+            for (metric_name, key), amount in values.items():
+                if metric_name == name:
+                    column = key[index] if index is not None else "전체"
+                    row[column] = row.get(column, 0) + amount
+            rows.append(row)
+        return rows
+
+    def collect(self):
+        """(이름, 종류, 설명, 샘플 목록) - 샘플은 (이름, [(라벨, 값)], 값)"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+            collectors = list(self._collectors)
+        families = [(metric.name, metric.kind, metric.help_text, list(metric.samples())) for metric in metrics]
+        for collect in collectors:
+            try:
+                for name, kind, help_text, values in collect():
+                    families.append((name, kind, help_text,
+                                     [(name, sorted(labels.items()), value) for labels, value in values]))
+            except Exception as e:
+                print(f"지표 수집 중 오류: {str(e)}")
+        return families
+
+    def render(self):
+        """Prometheus 텍스트 형식"""
+        lines = []
+        for name, kind, help_text, samples in self.collect():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, pairs, value in samples:
+                lines.append(f"{sample_name}{_format_labels(pairs)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def estimate_cost(model, prompt_tokens=0, cached_tokens=0, completion_tokens=0, images=0):
+    """사용량으로 어림한 비용(달러), 가격표에 없는 모델은 None"""
+    if model in IMAGE_PRICES:
+        return images * IMAGE_PRICES[model]
+    if model not in MODEL_PRICES:
+        return None
+    prompt_price, cached_price, completion_price = MODEL_PRICES[model]
+    return ((prompt_tokens - cached_tokens) * prompt_price + cached_tokens * cached_price
+            + completion_tokens * completion_price) / 1_000_000
+
+
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    """프로세스 전체가 공유하는 지표 모음"""
+    return _registry
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = _registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port, address="127.0.0.1"):
+    """Prometheus가 수집할 수 있도록 /metrics 주소를 여는 백그라운드 서버 (프로세스당 한 번)"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((address, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
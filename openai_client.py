@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from collections import deque
+
+import httpx
+from openai import OpenAI
+
+import metrics
+
+# 연결 설정 (환경변수로 조정 가능)
+# - 연결은 빨리 포기하고, 응답(특히 이미지 분석·스트리밍)은 충분히 기다림
+OPENAI_CONNECT_TIMEOUT = float(os.environ.get("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_READ_TIMEOUT = float(os.environ.get("OPENAI_READ_TIMEOUT", "90"))
+OPENAI_WRITE_TIMEOUT = float(os.environ.get("OPENAI_WRITE_TIMEOUT", "30"))
+OPENAI_POOL_TIMEOUT = float(os.environ.get("OPENAI_POOL_TIMEOUT", "10"))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "2"))
+
+# 연결 풀 (모든 세션이 같은 TLS 연결을 재사용)
+OPENAI_MAX_CONNECTIONS = 64
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = 32
+OPENAI_KEEPALIVE_EXPIRY = 60.0
+
+LATENCY_SAMPLE_SIZE = 500
+
+_metrics = metrics.get_registry()
+HTTP_RESPONSES = _metrics.counter("openai_http_responses_total", "OpenAI 서버의 HTTP 응답 수 (SDK 자동 재시도 포함)",
+                                  ("endpoint", "status"))
+RETRIES = _metrics.counter("openai_retries_total", "일시적 오류로 다시 보낸 API 호출 수", ("source", "error"))
+
+
+class LatencyStats:
+    """API 호출별 지연 시간 (새 연결 수립 시간과 전체 시간을 나눠 기록)"""
+
+    def __init__(self, sample_size=LATENCY_SAMPLE_SIZE):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._totals = {}
+        self.sample_size = sample_size
+
+    def record(self, endpoint, connect_seconds, total_seconds):
+        with self._lock:
+            if endpoint not in self._samples:
+                self._samples[endpoint] = deque(maxlen=self.sample_size)
+                self._totals[endpoint] = {"calls": 0, "new_connections": 0}
+            self._samples[endpoint].append((connect_seconds, total_seconds))
+            self._totals[endpoint]["calls"] += 1
+            if connect_seconds:
+                self._totals[endpoint]["new_connections"] += 1
+
+    def reset(self):
+        with self._lock:
+            self._samples = {}
+            self._totals = {}
+
+    def stats(self):
+        """엔드포인트별 요약 (최근 sample_size개 호출 기준 평균·백분위수)"""
+        with self._lock:
+            snapshot = {endpoint: (list(samples), dict(self._totals[endpoint]))
+                        for endpoint, samples in self._samples.items()}
+
+        rows = []
+        for endpoint, (samples, totals) in sorted(snapshot.items()):
+            connects = [connect for connect, _ in samples if connect]
+            durations = sorted(total for _, total in samples)
+            rows.append({
+                "endpoint": endpoint,
+                "calls": totals["calls"],
+                "new_connections": totals["new_connections"],
+                "connect_avg": sum(connects) / len(connects) if connects else 0.0,
+                "total_p50": _percentile(durations, 0.50),
+                "total_p95": _percentile(durations, 0.95),
+            })
+        return rows
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+_latency_stats = LatencyStats()
+
+
+def get_latency_stats():
+    return _latency_stats
+
+
+class _TimedStream(httpx.SyncByteStream):
+    """응답 본문을 다 읽고 닫힐 때 전체 시간을 기록 (스트리밍 응답도 끝까지 포함)"""
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+def _on_request(request):
+    timing = {"started": time.perf_counter(), "connect_started": None, "connect": 0.0}
+
+    def trace(event_name, info):
+        # 연결 풀에서 재사용한 경우에는 connect 이벤트가 오지 않음
+        if event_name == "connection.connect_tcp.started":
+            timing["connect_started"] = time.perf_counter()
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            if timing["connect_started"] is not None:
+                timing["connect"] = time.perf_counter() - timing["connect_started"]
+
+    trace.timing = timing
+    request.extensions["trace"] = trace
+    # SDK가 자동 재시도할 때 붙이는 헤더 (첫 시도는 0)
+    if request.headers.get("x-stainless-retry-count", "0") not in ("", "0"):
+        RETRIES.inc(source="sdk", error="http")
+
+
+def _on_response(response):
+    trace = response.request.extensions.get("trace")
+    timing = getattr(trace, "timing", None)
+    if timing is None:
+        return
+    endpoint = response.request.url.path.rsplit("/v1", 1)[-1]
+    HTTP_RESPONSES.inc(endpoint=endpoint, status=response.status_code)
+
+    def finished():
+        _latency_stats.record(endpoint, timing["connect"], time.perf_counter() - timing["started"])
+
+    response.stream = _TimedStream(response.stream, finished)
+
+
+def build_timeout():
+    return httpx.Timeout(connect=OPENAI_CONNECT_TIMEOUT, read=OPENAI_READ_TIMEOUT,
+                         write=OPENAI_WRITE_TIMEOUT, pool=OPENAI_POOL_TIMEOUT)
+
+
+def build_http_client():
+    """연결 풀·keep-alive·시간 제한을 맞춘 HTTP 클라이언트"""
+    return httpx.Client(
+        timeout=build_timeout(),
+        limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY),
+        event_hooks={"request": [_on_request], "response": [_on_response]},
+    )
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key, base_url=None):
+    """프로세스 전체가 공유하는 OpenAI 클라이언트 (API 키·주소별로 하나)
+
+    Streamlit은 화면을 다시 그릴 때마다 스크립트를 처음부터 실행하므로, 클라이언트를
+    여기서 한 번만 만들어 두어야 연결 풀의 TLS 연결이 세션과 재실행을 넘어 재사용된다.
+    """
+    base_url = base_url or os.environ.get("OPENAI_BASE_URL") or None
+    key = (api_key, base_url)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = OpenAI(api_key=api_key, base_url=base_url, timeout=build_timeout(),
+                                   max_retries=OPENAI_MAX_RETRIES, http_client=build_http_client())
+        return _clients[key]
@@ -0,0 +1,173 @@
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+import metrics
+import prompts
+
+# 관련성 판정 전 로컬 사전 분류
+# - 인사·단순 확인 응답은 GPT에 보내지 않고 관련없음으로 처리
+# - 수행평가 용어가 있거나 네 가지 기후 위기 주제와 많이 겹치면 관련됨으로 처리
+# - 나머지(애매한 메시지)만 GPT로 판단
+# 기준을 바꾼 뒤에는 python -m bench.eval_prefilter 로 GPT 판정과의 일치율을 확인할 것
+# (기준값은 표본의 조정용 부분으로만 고르고, 일치율은 확인용 부분으로 잼)
+
+# 이 낱말들로만 이루어진 메시지는 관련없음 (공백·문장부호를 뺀 형태)
+ACKNOWLEDGEMENTS = {
+    "네", "넵", "넹", "녜", "예", "응", "웅", "어", "음", "아", "오", "와", "헐", "ㅇ", "ㅇㅇ", "ㅇㅋ", "ㅇㅇㅇ",
+    "오케이", "ok", "okay", "yes", "굿", "좋아", "좋아요", "좋습니다", "좋네요", "좋은데요",
+    "감사", "감사합니다", "감사해요", "감사요", "고마워", "고마워요", "고맙습니다", "땡큐", "thanks", "thank", "you",
+    "알겠습니다", "알겠어요", "알겠어", "알았어", "알았어요", "알겠음", "넵알겠습니다",
+    "맞아요", "맞아", "맞습니다", "그래요", "그래", "그렇구나", "그렇군요", "아하", "아항", "오호",
+    "안녕", "안녕하세요", "반가워요", "반갑습니다", "수고하세요", "수고하셨습니다",
+    "몰라", "몰라요", "모르겠어요", "모르겠다", "글쎄요", "글쎄", "괜찮아요", "괜찮아", "대박", "최고",
+    "진짜요", "정말요",
+}
+
+# 웃음·울음 표시와 감탄 (단어에서 지운 뒤 판단)
+FILLER_PATTERN = re.compile(r"[ㅋㅎㅠㅜㄷ~^]+")
+# 같은 응답을 되풀이한 단어 ("네네", "넵넵넵") - 응답 낱말인지 확인할 때만 사용
+REPEAT_PATTERN = re.compile(r"^(.+?)\1+$")
+
+# 수행평가 활동 용어 (하나라도 있으면 관련 근거)
+TASK_KEYWORDS = (
+    "스토리보드", "장면", "컷", "캐릭터", "등장인물", "인물", "주인공", "배경", "줄거리", "시나리오",
+    "주제", "발표", "피드백", "수행평가", "모둠", "분위기", "소요시간", "몇초", "대사", "연출", "결말",
+    "기후", "환경", "탄소", "온실가스", "온난화", "지구", "배출", "생태", "멸종",
+)
+
+# 네 가지 핵심 주제별로 원문에 없는 표현을 보충하는 키워드
+THEME_KEYWORDS = {
+    "소비는 탄소 발자국을 남긴다": "탄소발자국 스마트폰 휴대폰 광물 전자기기 데이터센터 서버 전기 플라스틱 쓰레기 "
+                                 "빨대 일회용 패스트패션 옷 의류 소비",
+    "우리가 먹는 것 하나하나가": "고기 소고기 축산 육식 채식 초콜릿 카카오 새우 양식 맹그로브 숲 열대우림 "
+                              "음식물 음식 급식 식량",
+    "남극이 펭귄을 잃게 될 때": "남극 북극 빙하 해빙 얼음 녹는 펭귄 북극곰 영구동토층 메탄 기온 "
+                            "가뭄 폭우 홍수 폭염 해수면",
+    "기후위기에 대응하는 우리의 실천": "화석연료 석유 석탄 기업 자전거 대중교통 전기차 공유 재생에너지 태양광 "
+                                   "풍력 텀블러 라벨 분리수거 재활용 실천 캠페인",
+}
+
+# 판단 기준 (점수는 주제 문서와의 TF-IDF 코사인 유사도, 0~1)
+# 손으로 붙인 기본 표본에서 고른 값이므로, 학급 대화에 GPT 판정을 붙인 표본의 확인용 부분으로 다시 확인할 것
+THEME_RELEVANT_THRESHOLD = 0.25       # 이 이상이면 용어가 없어도 관련됨
+KEYWORD_THEME_THRESHOLD = 0.08        # 용어가 하나뿐일 때 함께 필요한 주제 점수
+RELEVANT_MIN_LENGTH = 6               # 이보다 짧으면(공백 제외) 용어가 있어도 GPT로 판단
+
+VERDICTS = metrics.get_registry().counter("prefilter_verdicts_total", "로컬 사전 분류 결과 수", ("verdict",))
+
+
+def normalize(content):
+    """유니코드 표기·대소문자·문장부호 차이를 없앤 단어 목록"""
+    text = unicodedata.normalize("NFC", content).lower()
+    words = (FILLER_PATTERN.sub("", word) for word in re.findall(r"\w+", text))
+    return [word for word in words if word]
+
+
+def is_acknowledgement(word):
+    """인사·단순 응답 낱말인지 (같은 응답을 되풀이한 형태 포함)"""
+    return word in ACKNOWLEDGEMENTS or REPEAT_PATTERN.sub(r"\1", word) in ACKNOWLEDGEMENTS
+
+
+def _bigrams(text):
+    """띄어쓰기에 영향받지 않도록 공백을 뺀 글자 2-gram (한국어는 조사가 붙어 단어 단위가 잘 맞지 않음)"""
+    compact = "".join(text.split())
+    return Counter(compact[i:i + 2] for i in range(len(compact) - 1))
+
+
+def _split_themes(reading_summary):
+    """필독서 요약을 '### 제목' 단위의 주제 문서로 나눔"""
+    themes = {}
+    title = None
+    for line in reading_summary.splitlines():
+        if line.startswith("### "):
+            title = line[4:].strip()
+            themes[title] = []
+        elif title is not None:
+            themes[title].append(re.sub(r"[*\-:]", " ", line))
+    return {title: " ".join([title] + lines) for title, lines in themes.items()}
+
+
+class LexicalPrefilter:
+    """GPT 관련성 판정 전에 확실한 메시지만 로컬에서 판정
+
+    classify()는 관련됨이면 True, 관련없음이면 False, 애매하면 None(GPT로 판단)을 돌려준다.
+    """
+
+    def __init__(self, theme_documents, theme_threshold=THEME_RELEVANT_THRESHOLD,
+                 keyword_theme_threshold=KEYWORD_THEME_THRESHOLD, min_length=RELEVANT_MIN_LENGTH):
+        self.theme_threshold = theme_threshold
+        self.keyword_theme_threshold = keyword_theme_threshold
+        self.min_length = min_length
+        self.themes = list(theme_documents)
+        self.documents = list(theme_documents.values())
+
+        counts = [_bigrams(text) for text in self.documents]
+        document_frequency = Counter(gram for count in counts for gram in count)
+        total = len(counts)
+        self._idf = {gram: math.log((1 + total) / (1 + df)) + 1 for gram, df in document_frequency.items()}
+        self._vectors = [self._weigh(count) for count in counts]
+
+        self._lock = threading.Lock()
+        self.totals = {"relevant": 0, "irrelevant": 0, "ambiguous": 0}
+
+    def _weigh(self, count):
+        vector = {gram: freq * self._idf[gram] for gram, freq in count.items() if gram in self._idf}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {gram: weight / norm for gram, weight in vector.items()} if norm else {}
+
+    def theme_scores(self, content):
+        """주제별 TF-IDF 코사인 유사도"""
+        vector = self._weigh(_bigrams(" ".join(normalize(content))))
+        return {theme: sum(weight * theme_vector.get(gram, 0.0) for gram, weight in vector.items())
+                for theme, theme_vector in zip(self.themes, self._vectors)}
+
+    def classify(self, content):
+        words = normalize(content)
+        if not words or all(is_acknowledgement(word) for word in words):
+            return False
+
+        compact = "".join(words)
+        if len(compact) < self.min_length:
+            return None
+        theme_score = max(self.theme_scores(content).values(), default=0.0)
+        if theme_score >= self.theme_threshold:
+            return True
+
+        keyword_hits = sum(1 for keyword in TASK_KEYWORDS if keyword in compact)
+        if keyword_hits >= 2 or (keyword_hits == 1 and theme_score >= self.keyword_theme_threshold):
+            return True
+        return None
+
+    def classify_many(self, contents):
+        """여러 메시지를 판정하고 누적 통계를 갱신"""
+        verdicts = [self.classify(content) for content in contents]
+        run = {
+            "relevant": sum(1 for verdict in verdicts if verdict is True),
+            "irrelevant": sum(1 for verdict in verdicts if verdict is False),
+            "ambiguous": sum(1 for verdict in verdicts if verdict is None),
+        }
+        with self._lock:
+            for name, value in run.items():
+                self.totals[name] += value
+        for name, value in run.items():
+            VERDICTS.inc(value, verdict=name)
+        return verdicts
+
+
+_prefilter = None
+_prefilter_lock = threading.Lock()
+
+
+def get_prefilter():
+    """필독서 요약의 네 가지 주제로 만든 공유 사전 분류기"""
+    global _prefilter
+    with _prefilter_lock:
+        if _prefilter is None:
+            themes = _split_themes(prompts.reading_summary())
+            for title, keywords in THEME_KEYWORDS.items():
+                themes[title] = f"{themes.get(title, title)} {keywords}"
+            _prefilter = LexicalPrefilter(themes)
+        return _prefilter
@@ -0,0 +1,91 @@
+import os
+import threading
+from string import Template
+
+# 프롬프트 원문은 templates/ 폴더의 마크다운 파일 하나씩에만 둔다
+# (시스템 프롬프트, 사이드바 평가 기준, 필독서 요약이 같은 원문을 공유)
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def load_template(name):
+    """templates/<name>.md 원문 (프로세스마다 한 번만 읽음)"""
+    with _templates_lock:
+        if name not in _templates:
+            with open(os.path.join(TEMPLATES_DIR, f"{name}.md"), 'r', encoding='utf-8') as f:
+                _templates[name] = f.read()
+        return _templates[name]
+
+
+def reading_summary():
+    """필독서 내용 요약"""
+    return load_template("reading_summary")
+
+
+def rubric():
+    """수행평가 평가 기준"""
+    return load_template("rubric")
+
+
+def system_prompt():
+    """모든 학생·모든 요청에 똑같이 들어가는 시스템 프롬프트
+
+    요청의 맨 앞에 글자 하나 다르지 않게 들어가야 제공자의 프롬프트 캐시가 적용되므로,
+    학생 이름·시각처럼 요청마다 바뀌는 내용은 넣지 않는다.
+    """
+    with _templates_lock:
+        cached = _templates.get("system_prompt:rendered")
+    if cached is None:
+        cached = Template(load_template("system_prompt")).substitute(
+            reading_summary=reading_summary().strip(), rubric=rubric().strip())
+        with _templates_lock:
+            _templates["system_prompt:rendered"] = cached
+    return cached
+
+
+def welcome_message(student_name):
+    """로그인 직후 보여주는 인사말"""
+    return Template(load_template("welcome")).substitute(student_name=student_name)
+
+
+class UsageStats:
+    """API 응답의 usage에서 입력 토큰 중 프롬프트 캐시로 처리된 양을 집계"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.cache_hit_requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def record(self, usage):
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", 0) if details is not None else 0) or 0
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.cached_tokens += cached
+            if cached:
+                self.cache_hit_requests += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "cache_hit_requests": self.cache_hit_requests,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cached_rate": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+            }
+
+
+_usage_stats = UsageStats()
+
+
+def get_usage_stats():
+    """프로세스 전체 프롬프트 캐시 사용량"""
+    return _usage_stats
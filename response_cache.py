@@ -0,0 +1,120 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+# 기본 캐시 크기 설정
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_BYTES = 512 * 1024
+DEFAULT_TTL_SECONDS = 30 * 60
+
+LOOKUPS = metrics.get_registry().counter("response_cache_lookups_total", "응답 캐시 조회 수 (세션별·공유 캐시)",
+                                         ("cache", "result"))
+
+
+def make_key(payload):
+    """API 요청 전체(모델, 모든 역할의 메시지, 이미지, 온도 등)를 해시한 캐시 키
+
+    대화가 길어져도 키 길이는 일정하고, 요청이 조금이라도 다르면 키도 달라진다.
+    """
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """크기 제한(항목 수·바이트)과 만료 시간(TTL)이 있는 LRU 응답 캐시
+
+    세션별 캐시와 프로세스 전체 공유 캐시 모두 이 클래스를 사용한다 (name은 지표 라벨).
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+                 ttl_seconds=DEFAULT_TTL_SECONDS, name="session"):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                LOOKUPS.inc(cache=self.name, result="miss")
+                return None
+            value, size, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                LOOKUPS.inc(cache=self.name, result="miss")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            LOOKUPS.inc(cache=self.name, result="hit")
+            return value
+
+    def put(self, key, value):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl_seconds)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def _collect_shared_cache_metrics():
+    stats = _shared_cache.stats()
+    return [
+        ("response_cache_entries", "gauge", "공유 응답 캐시 항목 수", [({}, stats["entries"])]),
+        ("response_cache_bytes", "gauge", "공유 응답 캐시 크기(바이트)", [({}, stats["bytes"])]),
+    ]
+
+
+def get_shared_cache(max_entries=1024, max_bytes=16 * 1024 * 1024, ttl_seconds=DEFAULT_TTL_SECONDS):
+    """모든 세션이 함께 쓰는 프로세스 전체 캐시 (처음 호출할 때의 설정으로 생성)"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache(max_entries, max_bytes, ttl_seconds, name="shared")
+            metrics.get_registry().register_collector(_collect_shared_cache_metrics)
+        return _shared_cache
@@ -0,0 +1,351 @@
+import base64
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import httpx
+
+import metrics
+import openai_client
+from analysis import call_with_retry, normalize_message
+from storage import LOCKS_DIRNAME, class_of, closing_connection, file_lock
+
+# 스토리보드 장면 이미지 (DALL-E 3)
+# - 장면마다 프롬프트로 만든 키로 이미지를 찾아, 한 번 만든 이미지는 다시 요청하지 않음
+#   (이미지 파일은 업로드 이미지와 같은 저장소에 내용 해시 이름으로 저장되어 백업에도 포함됨)
+# - 반별 이미지 예산 안에서만 새로 만들고, 한 스토리보드의 장면은 제한된 스레드 풀에서 동시에 만듦
+
+SCENE_IMAGE_MODEL = "dall-e-3"
+SCENE_IMAGE_SIZE = "1024x1024"
+SCENE_IMAGE_QUALITY = "standard"
+SCENE_IMAGE_STYLE = "A storyboard sketch style illustration. "
+# 이미지를 응답 본문(Base64)으로 받음 (URL은 시간이 지나면 만료되므로 받은 즉시 내려받아야 함)
+IMAGE_RESPONSE_FORMAT = "b64_json"
+DEFAULT_MAX_WORKERS = 3
+
+# 결과 상태
+GENERATED = "generated"
+CACHED = "cached"
+OVER_BUDGET = "over_budget"
+FAILED = "failed"
+
+_metrics = metrics.get_registry()
+SCENE_IMAGES = _metrics.counter("scene_images_total", "장면 이미지 요청 결과 수", ("result",))
+
+
+def scene_prompt(theme, scene):
+    """장면 설명으로 만든 이미지 프롬프트 (장면 설명이 없으면 None)"""
+    visual = (scene.get("visual") or "").strip()
+    if not visual:
+        return None
+    return f"{theme}. {visual}" if theme else visual
+
+
+def image_key(prompt):
+    """같은 프롬프트·모델·크기면 같은 키 (공백·유니코드 표기 차이는 무시)"""
+    raw = f"{SCENE_IMAGE_MODEL}\0{SCENE_IMAGE_SIZE}\0{SCENE_IMAGE_QUALITY}\0{normalize_message(prompt)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _sniff_mime_type(data):
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/png"
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def _download(url):
+    """이미지 URL 내려받기 (연결 풀을 공유하는 클라이언트 사용)"""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.Client(timeout=openai_client.build_timeout(), follow_redirects=True)
+    response = _http_client.get(url)
+    response.raise_for_status()
+    return response.content
+
+
+def _request_image(client, prompt):
+    return call_with_retry(
+        client.images.generate,
+        model=SCENE_IMAGE_MODEL,
+        prompt=SCENE_IMAGE_STYLE + prompt,
+        size=SCENE_IMAGE_SIZE,
+        quality=SCENE_IMAGE_QUALITY,
+        n=1,
+        response_format=IMAGE_RESPONSE_FORMAT,
+    )
+
+
+def _image_bytes(response):
+    item = response.data[0]
+    if getattr(item, "b64_json", None):
+        return base64.b64decode(item.b64_json)
+    return _download(item.url)
+
+
+class SceneImageCache:
+    """프롬프트 키별로 만든 이미지 ID (SQLite, 서버를 다시 시작해도 남음)"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS scene_images ("
+                "key TEXT PRIMARY KEY, image_id TEXT NOT NULL, prompt TEXT NOT NULL, created_at TEXT NOT NULL)"
+            )
+
+    def _connect(self):
+        return closing_connection(sqlite3.connect(self.db_path, timeout=30))
+
+    def get_many(self, keys):
+        """{키: 이미지 ID} (없는 키는 빠짐)"""
+        keys = list(keys)
+        found = {}
+        with self._connect() as conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(conn.execute(
+                    f"SELECT key, image_id FROM scene_images WHERE key IN ({placeholders})", chunk))
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def generating(self, key):
+        """키별 잠금 - 같은 이미지를 여러 작업(스레드·프로세스)이 동시에 만들지 않도록 생성하는 동안 잡음"""
+        return file_lock(os.path.join(os.path.dirname(self.db_path), LOCKS_DIRNAME, f"scene-image-{key}.lock"))
+
+    def put(self, key, image_id, prompt):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO scene_images (key, image_id, prompt, created_at) VALUES (?, ?, ?, ?)",
+                (key, image_id, prompt, now)
+            )
+
+
+class ClassImageBudget:
+    """반별로 새로 만든 이미지 수를 서버(SQLite)에 기록하는 한도 (scheduler.StudentBudget과 같은 방식)"""
+
+    def __init__(self, db_path, limit):
+        self.db_path = db_path
+        self.limit = limit
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS image_budget ("
+                "class_name TEXT PRIMARY KEY, images INTEGER NOT NULL, updated_at TEXT NOT NULL)"
+            )
+
+    def _connect(self):
+        return closing_connection(sqlite3.connect(self.db_path, timeout=30))
+
+    def used(self, class_name):
+        with self._connect() as conn:
+            row = conn.execute("SELECT images FROM image_budget WHERE class_name = ?", (class_name,)).fetchone()
+        return row[0] if row else 0
+
+    def remaining(self, class_name):
+        return max(0, self.limit - self.used(class_name))
+
+    def try_consume(self, class_name):
+        """한도 안이면 1장 차감하고 True (여러 스레드에서 동시에 불러도 한도를 넘지 않음)"""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO image_budget (class_name, images, updated_at) VALUES (?, 0, ?)",
+                (class_name, now)
+            )
+            cursor = conn.execute(
+                "UPDATE image_budget SET images = images + 1, updated_at = ? WHERE class_name = ? AND images < ?",
+                (now, class_name, self.limit)
+            )
+            return cursor.rowcount == 1
+
+    def release(self, class_name):
+        """요청이 실패해 만들지 못한 이미지 1장을 되돌림"""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE image_budget SET images = images - 1, updated_at = ? WHERE class_name = ? AND images > 0",
+                (now, class_name)
+            )
+
+
+_caches = {}
+_budgets = {}
+_registry_lock = threading.Lock()
+
+
+def get_scene_image_cache(db_path):
+    """경로별로 프로세스 전체에서 공유하는 이미지 캐시"""
+    key = os.path.abspath(db_path)
+    with _registry_lock:
+        if key not in _caches:
+            _caches[key] = SceneImageCache(db_path)
+        return _caches[key]
+
+
+def get_image_budget(db_path, limit):
+    """경로별로 하나의 ClassImageBudget을 공유"""
+    key = os.path.abspath(db_path)
+    with _registry_lock:
+        if key not in _budgets:
+            _budgets[key] = ClassImageBudget(db_path, limit)
+        return _budgets[key]
+
+
+def _cached_image(cache, image_store, key):
+    image_id = cache.get(key)
+    if image_id is not None and image_store.exists(image_id):
+        return image_id
+    return None
+
+
+def generate_scene_image(client, cache, budget, image_store, class_name, prompt):
+    """(상태, 이미지 ID) - 만든 적 있는 프롬프트는 저장된 이미지를, 아니면 예산 안에서 새로 만듦"""
+    key = image_key(prompt)
+    image_id = _cached_image(cache, image_store, key)
+    if image_id is not None:
+        SCENE_IMAGES.inc(result=CACHED)
+        return CACHED, image_id
+
+    # 같은 프롬프트를 다른 작업이 만드는 중이면 끝날 때까지 기다렸다가 그 이미지를 씀
+    # (캐시 확인 → 예산 차감 → 요청을 키별로 한 번에 하나씩만 해서 예산과 요청이 두 번 나가지 않음)
+    with cache.generating(key):
+        image_id = _cached_image(cache, image_store, key)
+        if image_id is not None:
+            SCENE_IMAGES.inc(result=CACHED)
+            return CACHED, image_id
+
+        if not budget.try_consume(class_name):
+            SCENE_IMAGES.inc(result=OVER_BUDGET)
+            return OVER_BUDGET, None
+        try:
+            response = _request_image(client, prompt)
+        except Exception as e:
+            # 요청이 실패하면 비용이 들지 않으므로 예산을 되돌림
+            budget.release(class_name)
+            print(f"장면 이미지 생성 실패: {str(e)}")
+            SCENE_IMAGES.inc(result=FAILED)
+            return FAILED, None
+        try:
+            data = _image_bytes(response)
+        except Exception as e:
+            print(f"장면 이미지 내려받기 실패: {str(e)}")
+            SCENE_IMAGES.inc(result=FAILED)
+            return FAILED, None
+
+        image_id = image_store.put(data, _sniff_mime_type(data))
+        cache.put(key, image_id, prompt)
+    SCENE_IMAGES.inc(result=GENERATED)
+    return GENERATED, image_id
+
+
+def scene_images(cache, image_store, storyboard):
+    """장면 순서대로 (장면, 이미지 ID 또는 None) - 저장된 이미지만 찾고 새로 만들지 않음"""
+    theme = storyboard.get("theme", "")
+    scenes = storyboard.get("scenes", [])
+    prompts = [scene_prompt(theme, scene) for scene in scenes]
+    found = cache.get_many(image_key(prompt) for prompt in prompts if prompt)
+    results = []
+    for scene, prompt in zip(scenes, prompts):
+        image_id = found.get(image_key(prompt)) if prompt else None
+        results.append((scene, image_id if image_id and image_store.exists(image_id) else None))
+    return results
+
+
+# 스토리보드 한 개의 모든 장면 이미지 만들기 (jobs.JobRunner에 등록해서 사용)
+SCENE_IMAGE_JOB_KIND = "scene_images"
+
+
+def _unfinished_message(unfinished):
+    parts = []
+    if unfinished[OVER_BUDGET]:
+        parts.append(f"반 이미지 예산이 부족해 {unfinished[OVER_BUDGET]}장면을 생성하지 못했습니다")
+    if unfinished[FAILED]:
+        parts.append(f"{unfinished[FAILED]}장면의 이미지 요청이 실패했습니다")
+    return " / ".join(parts)
+
+
+def run_scene_image_job(job, client, storyboard_store, cache, budget, image_store):
+    """학생의 스토리보드에서 장면마다 이미지를 동시에 만들고 장면별 결과를 남김
+
+    job.params: student_id, student_name, content_hash (작업을 만들 때의 스토리보드), max_workers (선택)
+    같은 프롬프트의 장면은 이미지를 한 번만 만들고(예산도 한 번만 차감), 이미지를 얻은 장면만 결과로 남긴다.
+    예산이 부족하거나 요청이 실패한 장면이 있으면 작업을 실패로 끝내, 이어서 실행할 때 그 장면만 다시 시도한다.
+    """
+    student_id, student_name = job.params["student_id"], job.params["student_name"]
+    content_hash = job.params.get("content_hash") or job.summary.get("content_hash")
+    if content_hash:
+        entry = storyboard_store.get(content_hash, student_id, student_name)
+    else:
+        # 스토리보드를 정하지 않고 만든 작업은 처음 실행할 때의 최근 스토리보드로 고정
+        entry = storyboard_store.latest(student_id, student_name)
+        if entry is not None:
+            job.save_summary(dict(job.summary, content_hash=entry["content_hash"]))
+    if entry is None:
+        raise ValueError(f"추출한 스토리보드가 없습니다: {student_id}_{student_name}")
+    storyboard = entry["result"]
+    theme = storyboard.get("theme", "")
+    class_name = class_of(student_id)
+
+    # 장면 설명이 있는 장면만, 이미지 키(프롬프트)가 같은 장면끼리 묶음
+    groups = {}
+    for index, scene in enumerate(storyboard.get("scenes", [])):
+        prompt = scene_prompt(theme, scene)
+        if prompt is not None:
+            groups.setdefault(image_key(prompt), (prompt, []))[1].append((index, scene))
+
+    done_keys = job.done_keys()
+    total = sum(len(scenes) for _, scenes in groups.values())
+    pending = []
+    for prompt, scenes in groups.values():
+        scenes = [(index, scene) for index, scene in scenes if f"scene_{index}" not in done_keys]
+        if scenes:
+            pending.append((prompt, scenes))
+    done = total - sum(len(scenes) for _, scenes in pending)
+    job.progress(done, total)
+
+    def generate(prompt):
+        if job.cancelled():
+            return None
+        return generate_scene_image(client, cache, budget, image_store, class_name, prompt)
+
+    unfinished = {OVER_BUDGET: 0, FAILED: 0}
+    max_workers = max(1, job.params.get("max_workers", DEFAULT_MAX_WORKERS))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scene-image") as executor:
+        futures = {executor.submit(generate, prompt): (prompt, scenes) for prompt, scenes in pending}
+        for future in as_completed(futures):
+            result = future.result()
+            if result is None:
+                continue
+            prompt, scenes = futures[future]
+            status, image_id = result
+            if status in unfinished:
+                unfinished[status] += len(scenes)
+                continue
+            job.checkpoint({f"scene_{index}": {"scene_num": scene.get("scene_num", index + 1), "prompt": prompt,
+                                               "status": status, "image_id": image_id}
+                            for index, scene in scenes})
+            done += len(scenes)
+            job.progress(done, total)
+
+    job.save_summary(dict(job.summary, over_budget=unfinished[OVER_BUDGET], failed=unfinished[FAILED]))
+    if any(unfinished.values()) and not job.cancelled():
+        raise RuntimeError(_unfinished_message(unfinished))
@@ -0,0 +1,448 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from types import SimpleNamespace
+
+import openai
+
+import metrics
+from context_window import IMAGE_TOKENS, estimate_tokens
+from storage import closing_connection
+
+# 요청 우선순위 (숫자가 작을수록 먼저 처리)
+LANE_INTERACTIVE = 0   # 학생 대화, 관리자 단건 요청
+LANE_BATCH = 1         # 관리자 일괄 분석
+LANE_NAMES = {LANE_INTERACTIVE: "interactive", LANE_BATCH: "batch"}
+
+# 모델별 분당 요청 수(RPM)·분당 토큰 수(TPM) 한도 (조직 한도보다 약간 낮게 설정)
+# 토큰 한도가 None이면 요청 수만 제한
+MODEL_RATE_LIMITS = {
+    "gpt-4o-mini": (450, 180000),
+    "gpt-4o": (450, 27000),
+    "dall-e-3": (5, None),
+}
+DEFAULT_RATE_LIMIT = (450, 27000)
+
+# 응답 길이를 모를 때 미리 잡아두는 출력 토큰 수 (응답 후 실제 사용량으로 정산)
+DEFAULT_COMPLETION_TOKENS = 500
+
+# 순서를 기다릴 수 있는 최대 시간(초)과 대기 중 상태 확인 간격(초)
+MAX_QUEUE_WAIT = 120.0
+POLL_INTERVAL = 0.2
+
+
+# 호출 지표 (프로세스 전체, 관리자 화면의 실시간 지표 탭과 /metrics에 표시)
+_metrics = metrics.get_registry()
+API_REQUESTS = _metrics.counter("openai_requests_total", "API 호출 수 (모델·대기열·결과별)",
+                                ("model", "lane", "outcome"), timeline=True)
+API_ERRORS = _metrics.counter("openai_errors_total", "실패한 API 호출 수 (오류 종류별)", ("model", "error"))
+API_SECONDS = _metrics.histogram("openai_request_seconds", "순서가 온 뒤 응답을 끝까지 받기까지 걸린 시간",
+                                 ("model",), timeline=True)
+API_TOKENS = _metrics.counter("openai_tokens_total", "응답 usage의 토큰 수 (prompt 중 cached는 프롬프트 캐시 처리분)",
+                              ("model", "kind"), timeline=True)
+QUEUE_SECONDS = _metrics.histogram("scheduler_wait_seconds", "스케줄러에서 순서를 기다린 시간", ("lane",))
+
+
+def record_call(model, lane, outcome, seconds, usage=None, error=None):
+    """API 호출 한 건의 결과·시간·토큰 사용량을 지표에 기록"""
+    model = model or "unknown"
+    API_REQUESTS.inc(model=model, lane=LANE_NAMES.get(lane, str(lane)), outcome=outcome)
+    API_SECONDS.observe(seconds, model=model)
+    if error is not None:
+        API_ERRORS.inc(model=model, error=type(error).__name__)
+    if usage is not None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        API_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, model=model, kind="prompt")
+        API_TOKENS.inc((getattr(details, "cached_tokens", 0) if details is not None else 0) or 0,
+                       model=model, kind="cached")
+        API_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, model=model, kind="completion")
+
+
+class SchedulerTimeout(Exception):
+    """대기열에서 너무 오래 기다린 요청"""
+
+
+class TokenBucket:
+    """분당 한도를 조금씩 채우는 토큰 버킷 (한도만큼 한꺼번에 쓰는 것도 허용)
+
+    period는 한도의 기준 시간(초)으로, 벤치마크에서 시간을 줄여 돌릴 때만 바꾼다.
+    """
+
+    def __init__(self, per_minute, period=60.0):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """amount만큼 꺼내려면 기다려야 하는 시간 (0이면 바로 가능)"""
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _Ticket:
+    def __init__(self, key, lane, model, tokens):
+        self.key = key
+        self.lane = lane
+        self.model = model
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+
+
+class RequestScheduler:
+    """프로세스 전체의 API 요청 순서를 정하는 스케줄러
+
+    - 모델별 RPM·TPM 토큰 버킷으로 조직 한도를 넘지 않게 요청을 내보냄
+    - 우선순위가 높은 대기열(학생 대화)을 먼저 처리하고, 같은 대기열 안에서는
+      학생(키)별로 한 건씩 돌아가며 처리해 한 사람이 대기열을 독차지하지 못하게 함
+    - 순서가 온 요청이라도 해당 모델의 버킷이 비어 있으면 다른 모델 요청이 먼저 나갈 수 있음
+    """
+
+    def __init__(self, rate_limits=None, default_limit=DEFAULT_RATE_LIMIT, max_wait=MAX_QUEUE_WAIT, period=60.0):
+        self.rate_limits = dict(MODEL_RATE_LIMITS if rate_limits is None else rate_limits)
+        self.default_limit = default_limit
+        self.period = period
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._lanes = {}
+        self._buckets = {}
+        self.dispatched = 0
+        self.rate_limited = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_observed_wait = 0.0
+
+    def _model_buckets(self, model):
+        if model not in self._buckets:
+            rpm, tpm = self.rate_limits.get(model, self.default_limit)
+            self._buckets[model] = (TokenBucket(rpm, self.period),
+                                    TokenBucket(tpm, self.period) if tpm else None)
+        return self._buckets[model]
+
+    def _bucket_wait(self, ticket, now):
+        requests, tokens = self._model_buckets(ticket.model)
+        wait = requests.wait_time(1, now)
+        if tokens is not None:
+            wait = max(wait, tokens.wait_time(ticket.tokens, now))
+        return wait
+
+    def _order(self):
+        """지금 대기열의 처리 순서 (우선순위 → 키별 돌아가며 한 건씩)"""
+        order = []
+        for lane in sorted(self._lanes):
+            queues = list(self._lanes[lane].values())
+            depth = max(len(queue) for queue in queues)
+            for round_index in range(depth):
+                order.extend(queue[round_index] for queue in queues if round_index < len(queue))
+        return order
+
+    def _remove(self, ticket):
+        queues = self._lanes[ticket.lane]
+        queues[ticket.key].remove(ticket)
+        if queues[ticket.key]:
+            # 방금 처리한 키는 같은 대기열의 맨 뒤로 (다음 차례는 다른 학생)
+            queues.move_to_end(ticket.key)
+        else:
+            del queues[ticket.key]
+        if not queues:
+            del self._lanes[ticket.lane]
+
+    def _try_dispatch(self, ticket):
+        """ticket을 지금 내보낼 수 있으면 버킷에서 꺼내고 (True, 0), 아니면 (False, 다시 확인할 때까지의 시간)"""
+        now = time.monotonic()
+        blocked_models = set()
+        for candidate in self._order():
+            if candidate.model in blocked_models:
+                continue
+            wait = self._bucket_wait(candidate, now)
+            if wait == 0 and candidate is ticket:
+                requests, tokens = self._model_buckets(ticket.model)
+                requests.take(1)
+                if tokens is not None:
+                    tokens.take(ticket.tokens)
+                self._remove(ticket)
+                self._cond.notify_all()
+                return True, 0.0
+            if wait == 0:
+                # 앞선 요청이 먼저 나갈 차례 → 그 요청을 기다리는 스레드가 처리
+                return False, POLL_INTERVAL
+            # 한도에 걸린 모델의 뒤쪽 요청은 건너뛰지 않음 (같은 모델 안에서는 순서 유지)
+            blocked_models.add(candidate.model)
+            if candidate is ticket:
+                return False, wait
+        return False, POLL_INTERVAL
+
+    def acquire(self, key, model, tokens, lane=LANE_INTERACTIVE, on_wait=None):
+        """순서와 한도가 허락할 때까지 기다림 (on_wait(앞선 요청 수)로 대기 순서를 알려줌)"""
+        ticket = _Ticket(key, lane, model, tokens)
+        with self._cond:
+            self._lanes.setdefault(lane, OrderedDict()).setdefault(key, deque()).append(ticket)
+
+        dispatched = False
+        try:
+            last_position = None
+            while True:
+                with self._cond:
+                    dispatched, wait = self._try_dispatch(ticket)
+                    waited = time.monotonic() - ticket.enqueued
+                    if dispatched:
+                        self.dispatched += 1
+                        self.total_wait += waited
+                        self.max_observed_wait = max(self.max_observed_wait, waited)
+                        QUEUE_SECONDS.observe(waited, lane=LANE_NAMES.get(lane, str(lane)))
+                        return ticket
+                    if waited > self.max_wait:
+                        self.timeouts += 1
+                        raise SchedulerTimeout(f"대기 시간이 {self.max_wait:.0f}초를 넘었습니다.")
+                    position = self._order().index(ticket)
+
+                if on_wait is not None and position != last_position:
+                    on_wait(position)
+                    last_position = position
+
+                with self._cond:
+                    self._cond.wait(min(max(wait, 0.01), POLL_INTERVAL))
+        except BaseException:
+            # 시간 초과나 on_wait 안에서 일어난 예외(화면 재실행 등)로 나가면 대기열에서 빼야
+            # 뒤에 선 요청이 계속 진행됨
+            if not dispatched:
+                with self._cond:
+                    self._remove(ticket)
+                    self._cond.notify_all()
+            raise
+
+    def settle(self, ticket, actual_tokens):
+        """미리 잡아둔 토큰과 실제 사용량의 차이를 정산"""
+        if actual_tokens is None:
+            return
+        with self._cond:
+            _, tokens = self._model_buckets(ticket.model)
+            if tokens is None:
+                return
+            difference = ticket.tokens - actual_tokens
+            if difference > 0:
+                tokens.give_back(difference)
+            else:
+                tokens.take(-difference)
+
+    def penalize(self, model, seconds):
+        """요청 한도(429) 응답을 받으면 해당 모델의 요청을 잠시 멈춤"""
+        with self._cond:
+            requests, _ = self._model_buckets(model)
+            requests.blocked_until = max(requests.blocked_until, time.monotonic() + seconds)
+            self.rate_limited += 1
+
+    def stats(self):
+        with self._cond:
+            waiting = {lane: sum(len(queue) for queue in queues.values()) for lane, queues in self._lanes.items()}
+            return {
+                "waiting_interactive": waiting.get(LANE_INTERACTIVE, 0),
+                "waiting_batch": waiting.get(LANE_BATCH, 0),
+                "dispatched": self.dispatched,
+                "rate_limited": self.rate_limited,
+                "timeouts": self.timeouts,
+                "avg_wait": self.total_wait / self.dispatched if self.dispatched else 0.0,
+                "max_wait": self.max_observed_wait
+            }
+
+    def collect_metrics(self):
+        """지표 모음에 넘길 현재 대기열 길이"""
+        stats = self.stats()
+        return [("scheduler_waiting_requests", "gauge", "스케줄러에서 순서를 기다리는 요청 수",
+                 [({"lane": "interactive"}, stats["waiting_interactive"]),
+                  ({"lane": "batch"}, stats["waiting_batch"])])]
+
+
+def _message_tokens(messages):
+    total = 0
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            for part in content:
+                total += estimate_tokens(part.get("text", "")) if part.get("type") == "text" else IMAGE_TOKENS
+        else:
+            total += estimate_tokens(content)
+    return total
+
+
+def estimate_request_tokens(kwargs):
+    """요청 전에 잡아두는 토큰 수 (입력 추정치 + 출력 상한)"""
+    completion = kwargs.get("max_tokens") or kwargs.get("max_completion_tokens") or DEFAULT_COMPLETION_TOKENS
+    return _message_tokens(kwargs.get("messages", [])) + completion
+
+
+def _retry_after(error, default=1.0):
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return float(response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+    return default
+
+
+class ScheduledClient:
+    """OpenAI 클라이언트와 같은 모양으로 쓰되, 모든 요청이 스케줄러를 거치게 하는 래퍼
+
+    analysis 모듈 등 client를 받는 함수에 그대로 넘길 수 있다.
+    """
+
+    def __init__(self, client, scheduler, key, lane=LANE_INTERACTIVE, on_wait=None):
+        # SDK 안의 재시도는 ticket 하나로 버킷(RPM·TPM)을 거치지 않고 다시 보내므로 끄고, 재시도는
+        # 스케줄러(penalize)와 호출하는 쪽(analysis.call_with_retry)에서만 함 (연결 풀은 그대로 공유)
+        self._client = client.with_options(max_retries=0)
+        self._scheduler = scheduler
+        self.key = key
+        self.lane = lane
+        self.on_wait = on_wait
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_chat_completion))
+        self.images = SimpleNamespace(generate=self._generate_image)
+
+    def _call(self, model, tokens, func, kwargs):
+        ticket = self._scheduler.acquire(self.key, model, tokens, self.lane, self.on_wait)
+        started = time.perf_counter()
+        try:
+            return ticket, started, func(**kwargs)
+        except openai.RateLimitError as e:
+            self._scheduler.penalize(model, _retry_after(e))
+            record_call(model, self.lane, "rate_limited", time.perf_counter() - started, error=e)
+            raise
+        except Exception as e:
+            record_call(model, self.lane, "error", time.perf_counter() - started, error=e)
+            raise
+
+    def _create_chat_completion(self, **kwargs):
+        ticket, started, response = self._call(kwargs.get("model"), estimate_request_tokens(kwargs),
+                                               self._client.chat.completions.create, kwargs)
+        if kwargs.get("stream"):
+            return self._settle_stream(ticket, started, response)
+        usage = getattr(response, "usage", None)
+        self._scheduler.settle(ticket, getattr(usage, "total_tokens", None))
+        record_call(ticket.model, self.lane, "ok", time.perf_counter() - started, usage)
+        return response
+
+    def _settle_stream(self, ticket, started, stream):
+        # 스트리밍 응답은 마지막 조각의 usage로 정산 (include_usage를 켠 경우)
+        # 끝까지 읽지 않고 닫힌 스트림은 incomplete로 기록
+        usage = None
+        outcome, error = "incomplete", None
+        try:
+            for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                    self._scheduler.settle(ticket, usage.total_tokens)
+                yield chunk
+            outcome = "ok"
+        except Exception as e:
+            outcome, error = "error", e
+            raise
+        finally:
+            record_call(ticket.model, self.lane, outcome, time.perf_counter() - started, usage, error)
+
+    def _generate_image(self, **kwargs):
+        ticket, started, response = self._call(kwargs.get("model"), 0, self._client.images.generate, kwargs)
+        record_call(ticket.model, self.lane, "ok", time.perf_counter() - started)
+        return response
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """프로세스 전체가 공유하는 스케줄러"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+            _metrics.register_collector(_scheduler.collect_metrics)
+        return _scheduler
+
+
+class StudentBudget:
+    """학생별 API 호출 횟수를 서버(SQLite)에 기록해 새로고침해도 초기화되지 않는 한도"""
+
+    def __init__(self, db_path, limit):
+        self.db_path = db_path
+        self.limit = limit
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS api_budget ("
+                "student_id TEXT PRIMARY KEY, calls INTEGER NOT NULL, updated_at TEXT NOT NULL)"
+            )
+
+    def _connect(self):
+        return closing_connection(sqlite3.connect(self.db_path, timeout=30))
+
+    def used(self, student_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT calls FROM api_budget WHERE student_id = ?", (student_id,)).fetchone()
+        return row[0] if row else 0
+
+    def remaining(self, student_id):
+        return max(0, self.limit - self.used(student_id))
+
+    def try_consume(self, student_id):
+        """한도 안이면 1회 차감하고 True (여러 세션·스레드에서 동시에 불러도 한도를 넘지 않음)"""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO api_budget (student_id, calls, updated_at) VALUES (?, 0, ?)",
+                (student_id, now)
+            )
+            cursor = conn.execute(
+                "UPDATE api_budget SET calls = calls + 1, updated_at = ? WHERE student_id = ? AND calls < ?",
+                (now, student_id, self.limit)
+            )
+            return cursor.rowcount == 1
+
+    def release(self, student_id):
+        """응답을 받지 못한 호출(대기 시간 초과, 요청 한도 초과 등) 1회를 되돌림"""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE api_budget SET calls = calls - 1, updated_at = ? WHERE student_id = ? AND calls > 0",
+                (now, student_id)
+            )
+
+    def totals(self):
+        """(기록된 학생 수, 전체 호출 수, 한도에 도달한 학생 수)"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(calls), 0), COALESCE(SUM(calls >= ?), 0) FROM api_budget",
+                (self.limit,)
+            ).fetchone()
+
+
+_budgets = {}
+_budgets_lock = threading.Lock()
+
+
+def get_student_budget(db_path, limit):
+    """파일 경로별로 하나의 StudentBudget을 공유"""
+    key = os.path.abspath(db_path)
+    with _budgets_lock:
+        if key not in _budgets:
+            _budgets[key] = StudentBudget(db_path, limit)
+        return _budgets[key]
@@ -0,0 +1,1245 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import metrics
+
+# 대화 로그 파일 설정
+# - {학번}_{이름}.json   : 압축(compaction)이 끝난 대화 (기존 형식 그대로)
+# - {학번}_{이름}.jsonl  : 아직 압축되지 않은 추가 전용(append-only) 로그
+CONVERSATION_SUFFIX = ".json"
+LOG_SUFFIX = ".jsonl"
+COMPACTING_SUFFIX = ".jsonl.compacting"
+
+# 잠금 파일은 대화 목록에 섞이지 않도록 별도 폴더에 보관
+LOCKS_DIRNAME = ".locks"
+
+# 로그가 이 크기를 넘으면 .json 파일로 압축
+COMPACT_THRESHOLD_BYTES = 256 * 1024
+
+# 저장소 종류 선택 (환경변수 STORAGE_BACKEND = "json" 또는 "sqlite")
+STORAGE_BACKEND_ENV = "STORAGE_BACKEND"
+DEFAULT_BACKEND = "json"
+SQLITE_FILENAME = "storyboard.db"
+
+
+# 이보다 오래 기다려 얻은 잠금은 다른 쪽과 경합한 것으로 셈
+CONTENDED_WAIT_SECONDS = 0.001
+
+
+# ─────────────────────────────────────────────
+# 파일 잠금 / 원자적 쓰기
+# ─────────────────────────────────────────────
+class LockStats:
+    """파일 잠금을 얻기까지 기다린 시간 (동시 저장 경합 확인용, 이 프로세스 기준)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.acquisitions = 0
+            self.contended = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def record(self, wait_seconds):
+        with self._lock:
+            self.acquisitions += 1
+            self.total_wait += wait_seconds
+            self.max_wait = max(self.max_wait, wait_seconds)
+            if wait_seconds >= CONTENDED_WAIT_SECONDS:
+                self.contended += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "acquisitions": self.acquisitions,
+                "contended": self.contended,
+                "avg_wait": self.total_wait / self.acquisitions if self.acquisitions else 0.0,
+                "max_wait": self.max_wait,
+            }
+
+
+_lock_stats = LockStats()
+
+
+def get_lock_stats():
+    return _lock_stats
+
+
+# 저장 시간 지표 (잠금 대기 포함, 관리자 화면의 실시간 지표 탭과 /metrics에 표시)
+_metrics = metrics.get_registry()
+WRITE_SECONDS = _metrics.histogram("storage_write_seconds", "저장소 쓰기 한 번에 걸린 시간 (잠금 대기 포함)",
+                                   ("backend", "op"), timeline=True)
+
+
+def _collect_lock_metrics():
+    stats = _lock_stats.stats()
+    return [
+        ("storage_lock_acquisitions_total", "counter", "파일 잠금 획득 수", [({}, stats["acquisitions"])]),
+        ("storage_lock_contended_total", "counter", "다른 쪽을 기다려야 했던 파일 잠금 수", [({}, stats["contended"])]),
+        ("storage_lock_wait_max_seconds", "gauge", "파일 잠금 최대 대기 시간", [({}, stats["max_wait"])]),
+    ]
+
+
+_metrics.register_collector(_collect_lock_metrics)
+
+
+def timed_write(op):
+    """저장소 쓰기 메서드의 소요 시간을 storage_write_seconds에 기록"""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with WRITE_SECONDS.time(backend=self.name, op=op):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def file_lock(lock_path, shared=False):
+    """권고(advisory) 파일 잠금 - 프로세스와 스레드 모두에서 동작
+
+    Windows(msvcrt)에는 공유 잠금이 없으므로 항상 배타 잠금을 사용한다.
+    """
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    with open(lock_path, 'a+b') as f:
+        started = time.perf_counter()
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        _lock_stats.record(time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write_json(path, data):
+    """임시 파일에 쓴 뒤 이름을 바꿔, 읽는 쪽이 잘린 파일을 보지 않도록 함"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class closing_connection:
+    """with 블록이 끝나면 커밋(또는 롤백) 후 연결까지 닫음"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
+        return False
+
+
+def _lock_path(directory, name):
+    return os.path.join(directory, LOCKS_DIRNAME, name + ".lock")
+
+
+# ─────────────────────────────────────────────
+# 학생 정보 (students.json)
+# ─────────────────────────────────────────────
+def init_students_file(students_file):
+    directory = os.path.dirname(students_file) or "."
+    with file_lock(_lock_path(directory, os.path.basename(students_file))):
+        if not os.path.exists(students_file):
+            atomic_write_json(students_file, [])
+
+
+def load_students(students_file):
+    with open(students_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def append_student(students_file, data):
+    """잠금 안에서 읽기-추가-원자적 교체를 수행해 동시 로그인 시 기록 유실을 막음"""
+    directory = os.path.dirname(students_file) or "."
+    with file_lock(_lock_path(directory, os.path.basename(students_file))):
+        students = load_students(students_file) if os.path.exists(students_file) else []
+        students.append(data)
+        atomic_write_json(students_file, students)
+
+
+# ─────────────────────────────────────────────
+# 학생 목록 (학번별로 합친 색인)
+# ─────────────────────────────────────────────
+OTHER_CLASS = "기타"
+
+
+def class_of(student_id):
+    """학번(학년 1자리 + 반 2자리 + 번호 2자리)의 반 이름, 형식이 다르면 "기타" """
+    if len(student_id) == 5 and student_id.isdigit():
+        return f"{student_id[0]}학년 {int(student_id[1:3])}반"
+    return OTHER_CLASS
+
+
+class StudentDirectory:
+    """학번별 학생 색인
+
+    학생이 다시 로그인할 때마다 학생 기록이 하나씩 쌓이므로 학번 하나에 학생 한 명만 두고,
+    로그인 기록은 학생별 sessions에 따로 모은다. 학생 기록은 추가만 되므로 저장소가
+    바뀌었을 때 새 기록만 extend()로 반영한다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._students = {}
+        self._search_keys = {}
+        self._classes = {}
+        self.record_count = 0
+        # 저장소가 정하는 버전 (같으면 다시 읽지 않음)
+        self.version = None
+
+    def extend(self, records):
+        with self._lock:
+            for record in records:
+                student_id, student_name = record["student_id"], record["student_name"]
+                student = self._students.get(student_id)
+                if student is None:
+                    student = self._students[student_id] = {
+                        "student_id": student_id,
+                        "student_name": student_name,
+                        "names": [],
+                        "class_name": class_of(student_id),
+                        "sessions": [],
+                        "first_login": record["timestamp"],
+                        "last_login": record["timestamp"],
+                    }
+                    self._classes.setdefault(student["class_name"], []).append(student_id)
+                if student_name not in student["names"]:
+                    student["names"].append(student_name)
+                    self._search_keys[student_id] = " ".join([student_id] + student["names"]).casefold()
+                # 이름은 가장 최근 로그인 기준
+                student["student_name"] = student_name
+                student["sessions"].append({"session_id": record.get("session_id"),
+                                            "student_name": student_name,
+                                            "timestamp": record["timestamp"]})
+                student["first_login"] = min(student["first_login"], record["timestamp"])
+                student["last_login"] = max(student["last_login"], record["timestamp"])
+                self.record_count += 1
+
+    def __len__(self):
+        with self._lock:
+            return len(self._students)
+
+    def get(self, student_id):
+        """학번으로 학생 찾기 (없으면 None)"""
+        with self._lock:
+            return self._students.get(student_id)
+
+    def classes(self):
+        """반 이름 목록 (학번 순, "기타"는 마지막)"""
+        with self._lock:
+            return sorted(self._classes, key=lambda name: (name == OTHER_CLASS, min(self._classes[name])))
+
+    def search(self, query="", class_name=None, limit=None):
+        """학번이나 이름에 검색어가 들어 있는 학생을 학번 순으로 (limit명까지)"""
+        query = query.strip().casefold()
+        with self._lock:
+            student_ids = self._classes.get(class_name, []) if class_name else self._students
+            matched = sorted(student_id for student_id in student_ids
+                             if not query or query in self._search_keys[student_id])
+            return [self._students[student_id] for student_id in matched[:limit]]
+
+    def rows(self):
+        """학생 목록 표 (학번 순)"""
+        return [{
+            "학번": student["student_id"],
+            "이름": student["student_name"],
+            "반": student["class_name"],
+            "접속 횟수": len(student["sessions"]),
+            "처음 접속": student["first_login"],
+            "마지막 접속": student["last_login"],
+        } for student in self.search()]
+
+
+# ─────────────────────────────────────────────
+# 대화 로그
+# ─────────────────────────────────────────────
+def conversation_stem(student_id, student_name):
+    return f"{student_id}_{student_name}"
+
+
+def conversation_paths(conversations_dir, stem):
+    """(압축된 JSON, 추가 전용 로그, 압축 중 로그) 경로 반환"""
+    base = os.path.join(conversations_dir, stem)
+    return base + CONVERSATION_SUFFIX, base + LOG_SUFFIX, base + COMPACTING_SUFFIX
+
+
+def _read_log_records(log_path):
+    """JSONL 로그 읽기 (쓰는 중이라 잘린 마지막 줄만 조용히 무시하고, 중간의 깨진 줄은 알림)"""
+    records = []
+    if not os.path.exists(log_path):
+        return records
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                if not line.endswith("\n"):
+                    # 줄바꿈까지 쓰이지 않은 마지막 줄은 아직 쓰는 중
+                    break
+                print(f"대화 로그의 깨진 줄을 건너뜁니다: {log_path} {number}번째 줄 ({str(e)})")
+    return records
+
+
+def _apply_records(conversation, records):
+    """로그 레코드를 기존 대화 구조(messages / feedback)에 반영"""
+    for record in records:
+        if conversation is None:
+            conversation = {
+                "session_id": record.get("session_id"),
+                "student_name": record.get("student_name"),
+                "student_id": record.get("student_id"),
+                "messages": []
+            }
+        if record.get("kind") == "feedback":
+            conversation.setdefault("feedback", []).append({
+                "content": record["content"],
+                "timestamp": record["timestamp"]
+            })
+        else:
+            conversation["messages"].append({
+                "role": record["role"],
+                "content": record["content"],
+                "timestamp": record["timestamp"]
+            })
+    return conversation
+
+
+def _load_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_conversation(conversations_dir, stem):
+    """압축된 JSON + 남아있는 로그를 합쳐 기존과 같은 대화 구조로 반환 (없으면 None)
+
+    압축 잠금을 공유 모드로 잡아 압축 도중의 중복/누락된 상태를 읽지 않는다.
+    """
+    json_path, log_path, compacting_path = conversation_paths(conversations_dir, stem)
+    with file_lock(_lock_path(conversations_dir, stem + ".compact"), shared=True):
+        conversation = _load_json(json_path)
+        conversation = _apply_records(conversation, _read_log_records(compacting_path))
+        conversation = _apply_records(conversation, _read_log_records(log_path))
+    return conversation
+
+
+def conversation_exists(conversations_dir, stem):
+    return any(os.path.exists(p) for p in conversation_paths(conversations_dir, stem))
+
+
+def list_conversation_stems(conversations_dir):
+    """대화가 있는 학생 파일 이름(확장자 제외) 목록"""
+    stems = set()
+    for filename in os.listdir(conversations_dir):
+        if filename.startswith("."):
+            continue
+        for suffix in (COMPACTING_SUFFIX, LOG_SUFFIX, CONVERSATION_SUFFIX):
+            if filename.endswith(suffix):
+                stems.add(filename[:-len(suffix)])
+                break
+    return sorted(stems)
+
+
+def conversation_versions(conversations_dir):
+    """학생 파일 이름별 (파일 종류, 수정 시각, 크기) 목록 - 내용을 읽지 않고 변경 여부만 확인"""
+    versions = {}
+    with os.scandir(conversations_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            for suffix in (COMPACTING_SUFFIX, LOG_SUFFIX, CONVERSATION_SUFFIX):
+                if entry.name.endswith(suffix):
+                    stat = entry.stat()
+                    versions.setdefault(entry.name[:-len(suffix)], []).append(
+                        (suffix, stat.st_mtime_ns, stat.st_size))
+                    break
+    return {stem: tuple(sorted(parts)) for stem, parts in versions.items()}
+
+
+def load_all_conversations(conversations_dir):
+    conversations = []
+    for stem in list_conversation_stems(conversations_dir):
+        conversation = load_conversation(conversations_dir, stem)
+        if conversation is not None:
+            conversations.append(conversation)
+    return conversations
+
+
+def compact_conversation(conversations_dir, stem):
+    """로그를 .json 파일로 합치고 로그를 비움
+
+    로그 잠금은 로그 이름을 바꾸는 순간에만 잡으므로, 압축하는 동안에도
+    새 기록은 새 로그 파일에 바로 추가된다.
+    """
+    json_path, log_path, compacting_path = conversation_paths(conversations_dir, stem)
+
+    with WRITE_SECONDS.time(backend="json", op="compact"), \
+            file_lock(_lock_path(conversations_dir, stem + ".compact")):
+        # 이전 압축이 중간에 끊긴 경우 남은 파일부터 처리
+        if not os.path.exists(compacting_path):
+            with file_lock(_lock_path(conversations_dir, stem + ".log")):
+                if not os.path.exists(log_path):
+                    return
+                os.replace(log_path, compacting_path)
+
+        conversation = _apply_records(_load_json(json_path), _read_log_records(compacting_path))
+        if conversation is not None:
+            atomic_write_json(json_path, conversation)
+        os.remove(compacting_path)
+
+
+def _append_lines(conversations_dir, stem, lines):
+    """잠금 안에서 로그 끝에 여러 줄을 한 번에 추가하고, 추가 후 로그 크기를 반환"""
+    _, log_path, _ = conversation_paths(conversations_dir, stem)
+    with file_lock(_lock_path(conversations_dir, stem + ".log")):
+        with open(log_path, 'a+b') as f:
+            # 이전 쓰기가 중간에 끊겨 줄바꿈 없이 끝났으면 새 줄에서 시작 (잘린 줄에 붙어 함께 깨지지 않도록)
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write("".join(lines).encode('utf-8'))
+            f.flush()
+            return f.tell()
+
+
+class BatchedWriter:
+    """그룹 커밋 방식의 로그 작성기
+
+    동시에 들어온 기록을 모아 학생별로 한 번의 쓰기로 처리한다. 먼저 도착한
+    호출이 대기 중인 기록을 모두 쓰고, 나머지 호출은 자기 기록이 쓰일 때까지만
+    기다리므로 호출이 반환되면 기록은 항상 디스크에 있다.
+    """
+
+    def __init__(self, conversations_dir):
+        self.conversations_dir = conversations_dir
+        self._cond = threading.Condition()
+        self._pending = []
+        self._flushing = False
+
+    def append(self, stem, record):
+        entry = {
+            "stem": stem,
+            "line": json.dumps(record, ensure_ascii=False) + "\n",
+            "done": False,
+            "error": None
+        }
+        with self._cond:
+            self._pending.append(entry)
+            while self._flushing and not entry["done"]:
+                self._cond.wait()
+            if not entry["done"]:
+                self._flushing = True
+                batch, self._pending = self._pending, []
+            else:
+                batch = None
+
+        if batch is not None:
+            to_compact = []
+            try:
+                to_compact = self._write_batch(batch)
+            finally:
+                with self._cond:
+                    for item in batch:
+                        item["done"] = True
+                    self._flushing = False
+                    self._cond.notify_all()
+
+            # 압축은 다른 기록을 막지 않도록 대기 중인 호출을 깨운 뒤에 수행
+            for stem in to_compact:
+                try:
+                    compact_conversation(self.conversations_dir, stem)
+                except Exception as e:
+                    # 압축 실패는 기록 유실이 아니므로 다음 압축 때 다시 시도
+                    print(f"대화 로그 압축 중 오류: {str(e)}")
+
+        if entry["error"] is not None:
+            raise entry["error"]
+
+    def _write_batch(self, batch):
+        """학생별로 모아서 쓰고, 압축이 필요한 학생 목록을 반환"""
+        by_stem = {}
+        for item in batch:
+            by_stem.setdefault(item["stem"], []).append(item)
+
+        to_compact = []
+        for stem, items in by_stem.items():
+            try:
+                size = _append_lines(self.conversations_dir, stem, [item["line"] for item in items])
+            except Exception as e:
+                for item in items:
+                    item["error"] = e
+                continue
+            if size >= COMPACT_THRESHOLD_BYTES:
+                to_compact.append(stem)
+        return to_compact
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(conversations_dir):
+    """폴더별로 프로세스 전체에서 공유하는 작성기"""
+    key = os.path.abspath(conversations_dir)
+    with _writers_lock:
+        if key not in _writers:
+            _writers[key] = BatchedWriter(conversations_dir)
+        return _writers[key]
+
+
+def append_record(conversations_dir, stem, record):
+    """기록 한 줄을 로그 끝에 추가 (대화 길이와 무관하게 O(1)), 로그가 커지면 압축"""
+    get_writer(conversations_dir).append(stem, record)
+
+
+def append_message(conversations_dir, data):
+    """save_data 형식의 대화 데이터를 로그에 추가"""
+    stem = conversation_stem(data["student_id"], data["student_name"])
+    append_record(conversations_dir, stem, {
+        "kind": "message",
+        "session_id": data["session_id"],
+        "student_name": data["student_name"],
+        "student_id": data["student_id"],
+        "role": data["type"].split("_")[0],
+        "content": data["content"],
+        "timestamp": data["timestamp"]
+    })
+
+
+def append_feedback(conversations_dir, data):
+    """save_data 형식의 피드백 데이터를 로그에 추가"""
+    stem = conversation_stem(data["student_id"], data["student_name"])
+    append_record(conversations_dir, stem, {
+        "kind": "feedback",
+        "session_id": data["session_id"],
+        "student_name": data["student_name"],
+        "student_id": data["student_id"],
+        "content": data["content"],
+        "timestamp": data["timestamp"]
+    })
+
+
+# ─────────────────────────────────────────────
+# 대화 기록 색인 (관리자 화면에서 긴 대화를 쪽 단위로 보기)
+# ─────────────────────────────────────────────
+MESSAGE = "message"
+FEEDBACK = "feedback"
+
+# 저장소마다 최근에 본 학생의 색인을 이만큼 보관
+TRANSCRIPT_INDEX_CACHE_SIZE = 32
+# 검색할 때 한 번에 읽는 기록 수
+SEARCH_CHUNK_SIZE = 200
+# 같은 조건의 검색 결과 보관 개수
+SEARCH_CACHE_SIZE = 8
+
+
+class TranscriptIndex:
+    """학생 한 명의 대화 기록 색인
+
+    기록마다 (역할, 시각, 위치)만 들고 있어 역할·시간 거르기와 쪽 나누기는 내용을 읽지 않고 하며,
+    화면에 보일 기록의 내용만 위치로 찾아 읽는다. 기록 번호는 메시지·피드백 각각의 순서(0부터)이고
+    새 기록은 뒤에 붙기만 하므로, 색인을 새로 고쳐도 이미 받은 번호는 같은 기록을 가리킨다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {MESSAGE: [], FEEDBACK: []}
+        self._search_cache = OrderedDict()
+
+    def _consistent(self):
+        """색인과 파일이 어긋나지 않도록 새로 고침·읽기 동안 잡는 잠금"""
+        return nullcontext()
+
+    def _refresh(self):
+        """바뀐 부분만 색인에 반영"""
+        raise NotImplementedError
+
+    def _read(self, kind, entries):
+        """색인 항목의 기록 내용 목록 (항목 순서대로)"""
+        raise NotImplementedError
+
+    def count(self, kind=MESSAGE):
+        with self._lock, self._consistent():
+            self._refresh()
+            return len(self._entries[kind])
+
+    def time_range(self, kind=MESSAGE):
+        """(첫 기록 시각, 마지막 기록 시각), 기록이 없으면 (None, None)"""
+        with self._lock, self._consistent():
+            self._refresh()
+            timestamps = [timestamp for _, timestamp, _ in self._entries[kind]]
+        if not timestamps:
+            return None, None
+        return min(timestamps), max(timestamps)
+
+    def select(self, role=None, start=None, end=None, kind=MESSAGE):
+        """조건에 맞는 기록 번호 목록 (시각은 "YYYY-MM-DD HH:MM:SS" 문자열로 비교, 양 끝 포함)"""
+        with self._lock, self._consistent():
+            self._refresh()
+            return [
+                position for position, (entry_role, timestamp, _) in enumerate(self._entries[kind])
+                if (role is None or entry_role == role)
+                and (start is None or timestamp >= start)
+                and (end is None or timestamp <= end)
+            ]
+
+    def read(self, positions, kind=MESSAGE):
+        """기록 번호 순서대로 내용을 읽음 (메시지는 role/content/timestamp, 피드백은 content/timestamp)"""
+        with self._lock, self._consistent():
+            self._refresh()
+            entries = self._entries[kind]
+            return self._read(kind, [entries[position] for position in positions if position < len(entries)])
+
+    def search(self, positions, query, kind=MESSAGE):
+        """positions 중 내용에 query가 들어 있는 기록 번호 (대소문자 무시)
+
+        기록 번호가 가리키는 내용은 바뀌지 않으므로 같은 조건의 결과는 다시 읽지 않고 재사용한다.
+        """
+        query = query.strip().casefold()
+        if not query:
+            return list(positions)
+        key = (kind, query, tuple(positions))
+        with self._lock:
+            if key in self._search_cache:
+                self._search_cache.move_to_end(key)
+                return list(self._search_cache[key])
+
+        matched = []
+        for index in range(0, len(positions), SEARCH_CHUNK_SIZE):
+            chunk = positions[index:index + SEARCH_CHUNK_SIZE]
+            for position, record in zip(chunk, self.read(chunk, kind=kind)):
+                if query in record["content"].casefold():
+                    matched.append(position)
+
+        with self._lock:
+            self._search_cache[key] = matched
+            while len(self._search_cache) > SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+        return list(matched)
+
+
+def _file_version(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _content_record(kind, record):
+    if kind == FEEDBACK:
+        return {"content": record["content"], "timestamp": record["timestamp"]}
+    return {"role": record["role"], "content": record["content"], "timestamp": record["timestamp"]}
+
+
+class JsonTranscriptIndex(TranscriptIndex):
+    """JSON 저장소 대화의 기록 색인
+
+    압축된 .json의 기록은 목록 안 위치로, 로그(.jsonl)의 기록은 파일 안 바이트 위치로 가리킨다.
+    로그는 추가만 되므로 새로 고칠 때 지난번에 읽은 위치 뒤에 붙은 줄만 읽고,
+    압축으로 .json이 바뀐 경우에만 처음부터 다시 만든다.
+    """
+
+    def __init__(self, conversations_dir, stem):
+        super().__init__()
+        self.conversations_dir = conversations_dir
+        self.stem = stem
+        # 압축된 JSON과 압축 중 로그의 (수정 시각, 크기) - 바뀌면 색인을 다시 만듦
+        self._base_version = None
+        self._compacted = {}
+        self._log_offset = 0
+
+    def _consistent(self):
+        # 압축 도중에는 로그가 옮겨지므로 load_conversation과 같은 공유 잠금을 잡음
+        return file_lock(_lock_path(self.conversations_dir, self.stem + ".compact"), shared=True)
+
+    def _refresh(self):
+        json_path, log_path, compacting_path = conversation_paths(self.conversations_dir, self.stem)
+        base_version = (_file_version(json_path), _file_version(compacting_path))
+        log_version = _file_version(log_path)
+        log_size = log_version[1] if log_version is not None else 0
+        if base_version != self._base_version or log_size < self._log_offset:
+            self._entries = {MESSAGE: [], FEEDBACK: []}
+            self._compacted = _load_json(json_path) or {}
+            for kind, list_name in ((MESSAGE, "messages"), (FEEDBACK, "feedback")):
+                for position, record in enumerate(self._compacted.get(list_name, [])):
+                    self._entries[kind].append((record.get("role"), record["timestamp"], ("json", position, 0)))
+            self._index_log(compacting_path, 0)
+            self._base_version = base_version
+            self._log_offset = 0
+        if log_size > self._log_offset:
+            self._log_offset = self._index_log(log_path, self._log_offset)
+
+    def _index_log(self, path, offset):
+        """로그에서 offset 뒤의 온전한 줄만 색인하고 읽은 끝 위치를 돌려줌 (쓰는 중인 마지막 줄은 다음에)"""
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return offset
+        with f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                start = offset
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    print(f"대화 로그의 깨진 줄을 건너뜁니다: {path} {start}바이트 위치 ({str(e)})")
+                    continue
+                kind = FEEDBACK if record.get("kind") == "feedback" else MESSAGE
+                self._entries[kind].append((record.get("role"), record["timestamp"], (path, start, len(line))))
+        return offset
+
+    def _read(self, kind, entries):
+        records = []
+        files = {}
+        try:
+            for _, _, (source, offset, length) in entries:
+                if source == "json":
+                    record = self._compacted["messages" if kind == MESSAGE else "feedback"][offset]
+                else:
+                    if source not in files:
+                        files[source] = open(source, 'rb')
+                    files[source].seek(offset)
+                    record = json.loads(files[source].read(length))
+                records.append(_content_record(kind, record))
+        finally:
+            for f in files.values():
+                f.close()
+        return records
+
+
+class SqliteTranscriptIndex(TranscriptIndex):
+    """SQLite 저장소 대화의 기록 색인 - 기록을 행 id로 가리키고, 행 수나 마지막 id가 바뀌면 다시 만듦"""
+
+    def __init__(self, backend, student_id, student_name):
+        super().__init__()
+        self.backend = backend
+        self.student_id = student_id
+        self.student_name = student_name
+        self._versions = {}
+
+    def _refresh(self):
+        key = (self.student_id, self.student_name)
+        with self.backend._connect() as conn:
+            for kind, table in ((MESSAGE, "messages"), (FEEDBACK, "feedback")):
+                version = tuple(conn.execute(
+                    f"SELECT COUNT(*), MAX(id) FROM {table} WHERE student_id = ? AND student_name = ?", key
+                ).fetchone())
+                if version == self._versions.get(kind):
+                    continue
+                role = "role" if kind == MESSAGE else "NULL"
+                rows = conn.execute(
+                    f"SELECT {role}, timestamp, id FROM {table} WHERE student_id = ? AND student_name = ? "
+                    "ORDER BY timestamp, id", key
+                ).fetchall()
+                self._entries[kind] = [tuple(row) for row in rows]
+                self._versions[kind] = version
+
+    def _read(self, kind, entries):
+        table = "messages" if kind == MESSAGE else "feedback"
+        ids = [row_id for _, _, row_id in entries]
+        rows = {}
+        with self.backend._connect() as conn:
+            for index in range(0, len(ids), SEARCH_CHUNK_SIZE):
+                chunk = ids[index:index + SEARCH_CHUNK_SIZE]
+                role = "role" if kind == MESSAGE else "NULL AS role"
+                for row in conn.execute(
+                        f"SELECT id, {role}, content, timestamp FROM {table} "
+                        f"WHERE id IN ({', '.join('?' * len(chunk))})", chunk):
+                    rows[row["id"]] = row
+        return [_content_record(kind, rows[row_id]) for row_id in ids if row_id in rows]
+
+
+# ─────────────────────────────────────────────
+# 저장소 백엔드
+# ─────────────────────────────────────────────
+class StorageBackend:
+    """학생/대화/피드백 저장소 공통 인터페이스
+
+    대화는 기존 JSON 파일과 같은 구조
+    ({"session_id", "student_name", "student_id", "messages", "feedback"})로 돌려준다.
+    """
+
+    def __init__(self):
+        self._student_directory = None
+        self._student_directory_lock = threading.Lock()
+        self._transcript_indexes = OrderedDict()
+        self._transcript_indexes_lock = threading.Lock()
+
+    def add_student(self, data):
+        raise NotImplementedError
+
+    def append_message(self, data):
+        raise NotImplementedError
+
+    def append_feedback(self, data):
+        raise NotImplementedError
+
+    def load_students(self):
+        raise NotImplementedError
+
+    def conversation_exists(self, student_id, student_name):
+        raise NotImplementedError
+
+    def load_conversation(self, student_id, student_name):
+        raise NotImplementedError
+
+    def load_all_conversations(self):
+        raise NotImplementedError
+
+    def conversation_versions(self):
+        """{대화 키: 버전} - 버전이 같으면 대화 내용도 같음 (증분 집계용)"""
+        raise NotImplementedError
+
+    def load_conversation_by_key(self, key):
+        """conversation_versions()의 키로 대화 하나를 읽음"""
+        raise NotImplementedError
+
+    def backup_files(self):
+        """백업에 그대로 복사할 (압축 파일 내 경로, 실제 파일 경로) 목록
+
+        다음 항목을 요청할 때까지 해당 파일이 바뀌지 않도록 필요한 잠금을 잡고 있으므로,
+        받는 쪽은 받은 파일을 바로 복사해야 한다.
+        """
+        raise NotImplementedError
+
+    def _refresh_student_directory(self, directory):
+        """바뀐 학생 기록을 반영한 색인을 돌려줌 (directory가 None이거나 기록이 줄었으면 새로 만듦)"""
+        raise NotImplementedError
+
+    def student_directory(self):
+        """학번별로 합친 학생 목록 (화면을 다시 그려도 학생 기록이 바뀐 경우에만 새 기록을 읽음)"""
+        with self._student_directory_lock:
+            self._student_directory = self._refresh_student_directory(self._student_directory)
+            return self._student_directory
+
+    def _new_transcript_index(self, student_id, student_name):
+        raise NotImplementedError
+
+    def transcript_index(self, student_id, student_name):
+        """학생 대화의 기록 색인 (최근에 본 학생의 색인은 바뀐 부분만 반영해 재사용)"""
+        key = (student_id, student_name)
+        with self._transcript_indexes_lock:
+            index = self._transcript_indexes.get(key)
+            if index is None:
+                index = self._transcript_indexes[key] = self._new_transcript_index(student_id, student_name)
+            self._transcript_indexes.move_to_end(key)
+            while len(self._transcript_indexes) > TRANSCRIPT_INDEX_CACHE_SIZE:
+                self._transcript_indexes.popitem(last=False)
+            return index
+
+    def save_data(self, data):
+        """화면과 무관한 저장 진입점 (오류는 호출한 쪽에서 처리)"""
+        if data["type"] == "student_info":
+            self.add_student(data)
+        elif data["type"] == "feedback":
+            self.append_feedback(data)
+        else:
+            self.append_message(data)
+
+
+class JsonFileBackend(StorageBackend):
+    """students.json + 학생별 대화 파일(.json / .jsonl) 저장소"""
+
+    name = "json"
+
+    def __init__(self, data_dir):
+        super().__init__()
+        self.data_dir = data_dir
+        self.students_file = os.path.join(data_dir, "students.json")
+        self.conversations_dir = os.path.join(data_dir, "conversations")
+        os.makedirs(self.conversations_dir, exist_ok=True)
+        init_students_file(self.students_file)
+
+    @timed_write("add_student")
+    def add_student(self, data):
+        append_student(self.students_file, data)
+
+    @timed_write("append_message")
+    def append_message(self, data):
+        append_message(self.conversations_dir, data)
+
+    @timed_write("append_feedback")
+    def append_feedback(self, data):
+        append_feedback(self.conversations_dir, data)
+
+    def load_students(self):
+        return load_students(self.students_file)
+
+    def conversation_exists(self, student_id, student_name):
+        return conversation_exists(self.conversations_dir, conversation_stem(student_id, student_name))
+
+    def load_conversation(self, student_id, student_name):
+        return load_conversation(self.conversations_dir, conversation_stem(student_id, student_name))
+
+    def load_all_conversations(self):
+        return load_all_conversations(self.conversations_dir)
+
+    def conversation_versions(self):
+        return conversation_versions(self.conversations_dir)
+
+    def load_conversation_by_key(self, key):
+        return load_conversation(self.conversations_dir, key)
+
+    def _refresh_student_directory(self, directory):
+        # students.json은 통째로 교체되므로 (수정 시각, 크기)가 같으면 내용도 같음
+        version = _file_version(self.students_file)
+        if directory is not None and directory.version == version:
+            return directory
+        students = self.load_students()
+        if directory is None or len(students) < directory.record_count:
+            directory = StudentDirectory()
+        directory.extend(students[directory.record_count:])
+        directory.version = version
+        return directory
+
+    def _new_transcript_index(self, student_id, student_name):
+        return JsonTranscriptIndex(self.conversations_dir, conversation_stem(student_id, student_name))
+
+    def backup_files(self):
+        # students.json은 원자적으로 교체되므로 잠금 없이 복사해도 됨
+        yield "students.json", self.students_file
+        for stem in list_conversation_stems(self.conversations_dir):
+            # 압축 중에는 로그가 옮겨지므로 load_conversation과 같은 공유 잠금을 잡고 복사
+            with file_lock(_lock_path(self.conversations_dir, stem + ".compact"), shared=True):
+                for path in conversation_paths(self.conversations_dir, stem):
+                    if os.path.exists(path):
+                        yield f"conversations/{os.path.basename(path)}", path
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT,
+    student_id TEXT NOT NULL,
+    student_name TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_students_student ON students (student_id, timestamp);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT,
+    student_id TEXT NOT NULL,
+    student_name TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_student ON messages (student_id, student_name, timestamp);
+CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages (timestamp);
+
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT,
+    student_id TEXT NOT NULL,
+    student_name TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_feedback_student ON feedback (student_id, student_name, timestamp);
+"""
+
+
+class SqliteBackend(StorageBackend):
+    """WAL 모드 SQLite 저장소 - 관리자 화면은 폴더 탐색 대신 인덱스 조회를 사용"""
+
+    name = "sqlite"
+
+    def __init__(self, db_path):
+        super().__init__()
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SQLITE_SCHEMA)
+
+    def _connect(self):
+        """호출마다 새 연결 사용 (Streamlit 세션 스레드 간 연결 공유 방지)"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return closing_connection(conn)
+
+    @timed_write("add_student")
+    def add_student(self, data):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO students (session_id, student_id, student_name, timestamp) VALUES (?, ?, ?, ?)",
+                (data.get("session_id"), data["student_id"], data["student_name"], data["timestamp"])
+            )
+
+    @timed_write("append_message")
+    def append_message(self, data):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO messages (session_id, student_id, student_name, role, content, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (data.get("session_id"), data["student_id"], data["student_name"],
+                 data["type"].split("_")[0], data["content"], data["timestamp"])
+            )
+
+    @timed_write("append_feedback")
+    def append_feedback(self, data):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO feedback (session_id, student_id, student_name, content, timestamp) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (data.get("session_id"), data["student_id"], data["student_name"],
+                 data["content"], data["timestamp"])
+            )
+
+    def load_students(self):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT session_id, student_name, student_id, timestamp FROM students ORDER BY id"
+            ).fetchall()
+        return [dict(row, type="student_info") for row in rows]
+
+    def conversation_exists(self, student_id, student_name):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM messages WHERE student_id = ? AND student_name = ? LIMIT 1",
+                (student_id, student_name)
+            ).fetchone()
+        return row is not None
+
+    def load_conversation(self, student_id, student_name):
+        with self._connect() as conn:
+            messages = conn.execute(
+                "SELECT session_id, student_id, student_name, role, content, timestamp FROM messages "
+                "WHERE student_id = ? AND student_name = ? ORDER BY timestamp, id",
+                (student_id, student_name)
+            ).fetchall()
+            feedback = conn.execute(
+                "SELECT student_id, student_name, content, timestamp FROM feedback "
+                "WHERE student_id = ? AND student_name = ? ORDER BY timestamp, id",
+                (student_id, student_name)
+            ).fetchall()
+        conversations = self._build_conversations(messages, feedback)
+        return conversations[0] if conversations else None
+
+    def load_all_conversations(self):
+        with self._connect() as conn:
+            messages = conn.execute(
+                "SELECT session_id, student_id, student_name, role, content, timestamp FROM messages "
+                "ORDER BY student_id, student_name, timestamp, id"
+            ).fetchall()
+            feedback = conn.execute(
+                "SELECT student_id, student_name, content, timestamp FROM feedback "
+                "ORDER BY student_id, student_name, timestamp, id"
+            ).fetchall()
+        return self._build_conversations(messages, feedback)
+
+    def conversation_versions(self):
+        """학생별 (메시지 수, 마지막 메시지 id, 피드백 수, 마지막 피드백 id) - 인덱스만으로 집계"""
+        with self._connect() as conn:
+            messages = conn.execute(
+                "SELECT student_id, student_name, COUNT(*), MAX(id) FROM messages "
+                "GROUP BY student_id, student_name"
+            ).fetchall()
+            feedback = conn.execute(
+                "SELECT student_id, student_name, COUNT(*), MAX(id) FROM feedback "
+                "GROUP BY student_id, student_name"
+            ).fetchall()
+        feedback_versions = {(row[0], row[1]): (row[2], row[3]) for row in feedback}
+        return {
+            (row[0], row[1]): (row[2], row[3]) + feedback_versions.get((row[0], row[1]), (0, 0))
+            for row in messages
+        }
+
+    def load_conversation_by_key(self, key):
+        student_id, student_name = key
+        return self.load_conversation(student_id, student_name)
+
+    def _refresh_student_directory(self, directory):
+        # 버전은 (행 수, 마지막 id) - 마지막 id 뒤에 추가된 행만 읽음
+        with self._connect() as conn:
+            version = tuple(conn.execute("SELECT COUNT(*), MAX(id) FROM students").fetchone())
+            if directory is not None and directory.version == version:
+                return directory
+            if directory is None or version[0] < directory.record_count:
+                directory = StudentDirectory()
+            last_id = directory.version[1] if directory.version is not None else None
+            rows = conn.execute(
+                "SELECT session_id, student_name, student_id, timestamp FROM students WHERE id > ? ORDER BY id",
+                (last_id or 0,)
+            ).fetchall()
+        directory.extend(dict(row) for row in rows)
+        directory.version = version
+        return directory
+
+    def _new_transcript_index(self, student_id, student_name):
+        return SqliteTranscriptIndex(self, student_id, student_name)
+
+    def backup_files(self):
+        # 쓰는 중에도 일관된 사본이 되도록 SQLite 온라인 백업으로 임시 파일에 복사한 뒤 넘김
+        fd, snapshot_path = tempfile.mkstemp(dir=os.path.dirname(self.db_path) or ".", prefix=".backup-", suffix=".db")
+        os.close(fd)
+        try:
+            with closing_connection(sqlite3.connect(self.db_path, timeout=30)) as source, \
+                    closing_connection(sqlite3.connect(snapshot_path)) as target:
+                source.backup(target)
+            yield SQLITE_FILENAME, snapshot_path
+        finally:
+            os.remove(snapshot_path)
+
+    @staticmethod
+    def _build_conversations(messages, feedback):
+        conversations = {}
+        for row in messages:
+            key = (row["student_id"], row["student_name"])
+            if key not in conversations:
+                conversations[key] = {
+                    "session_id": row["session_id"],
+                    "student_name": row["student_name"],
+                    "student_id": row["student_id"],
+                    "messages": []
+                }
+            conversations[key]["messages"].append({
+                "role": row["role"],
+                "content": row["content"],
+                "timestamp": row["timestamp"]
+            })
+        for row in feedback:
+            conversation = conversations.get((row["student_id"], row["student_name"]))
+            if conversation is not None:
+                conversation.setdefault("feedback", []).append({
+                    "content": row["content"],
+                    "timestamp": row["timestamp"]
+                })
+        return list(conversations.values())
+
+    def is_empty(self):
+        with self._connect() as conn:
+            return all(
+                conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0
+                for table in ("students", "messages", "feedback")
+            )
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(data_dir, name=None):
+    """환경변수 STORAGE_BACKEND에 따라 프로세스 전체에서 공유하는 저장소 반환"""
+    name = (name or os.environ.get(STORAGE_BACKEND_ENV, DEFAULT_BACKEND)).lower()
+    key = (os.path.abspath(data_dir), name)
+    with _backends_lock:
+        if key not in _backends:
+            if name == "sqlite":
+                _backends[key] = SqliteBackend(os.path.join(data_dir, SQLITE_FILENAME))
+            elif name == "json":
+                _backends[key] = JsonFileBackend(data_dir)
+            else:
+                raise ValueError(f"알 수 없는 저장소 종류: {name}")
+        return _backends[key]
+
+
+def migrate_json_to_sqlite(data_dir, db_path=None):
+    """기존 JSON 폴더(students.json + conversations/)를 SQLite로 가져오기"""
+    source = JsonFileBackend(data_dir)
+    target = SqliteBackend(db_path or os.path.join(data_dir, SQLITE_FILENAME))
+    if not target.is_empty():
+        raise RuntimeError(f"이미 데이터가 있는 데이터베이스입니다: {target.db_path}")
+
+    students = source.load_students()
+    conversations = source.load_all_conversations()
+    message_count = 0
+    feedback_count = 0
+    with target._connect() as conn:
+        conn.executemany(
+            "INSERT INTO students (session_id, student_id, student_name, timestamp) VALUES (?, ?, ?, ?)",
+            [(s.get("session_id"), s["student_id"], s["student_name"], s["timestamp"]) for s in students]
+        )
+        for conversation in conversations:
+            key = (conversation.get("session_id"), conversation["student_id"], conversation["student_name"])
+            conn.executemany(
+                "INSERT INTO messages (session_id, student_id, student_name, role, content, timestamp) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [key + (m["role"], m["content"], m["timestamp"]) for m in conversation["messages"]]
+            )
+            conn.executemany(
+                "INSERT INTO feedback (session_id, student_id, student_name, content, timestamp) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [key + (f["content"], f["timestamp"]) for f in conversation.get("feedback", [])]
+            )
+            message_count += len(conversation["messages"])
+            feedback_count += len(conversation.get("feedback", []))
+    return {"students": len(students), "conversations": len(conversations),
+            "messages": message_count, "feedback": feedback_count}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="스토리보드 데이터 저장소 관리")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="JSON 데이터를 SQLite로 가져오기")
+    migrate_parser.add_argument("--data-dir", default="data")
+    migrate_parser.add_argument("--db", default=None, help=f"기본값: <data-dir>/{SQLITE_FILENAME}")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        try:
+            result = migrate_json_to_sqlite(args.data_dir, args.db)
+        except RuntimeError as e:
+            print(f"가져오기 실패: {e}")
+            return 1
+        print(f"학생 기록 {result['students']}건, 대화 {result['conversations']}개, "
+              f"메시지 {result['messages']}건, 피드백 {result['feedback']}건을 가져왔습니다.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
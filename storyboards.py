@@ -0,0 +1,299 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from analysis import call_with_retry, normalize_message
+from storage import closing_connection, conversation_stem
+
+# 스토리보드 구조 추출 (대화 → 제목·주제·장면 목록)
+# - 추출 결과는 대화 내용 해시를 키로 SQLite에 남겨, 바뀌지 않은 대화는 다시 추출하지 않음
+# - 학급 전체 추출은 백그라운드 작업으로 제한된 스레드 풀에서 동시에 실행
+
+STORYBOARD_MODEL = "gpt-4o"
+DEFAULT_MAX_WORKERS = 4
+
+STORYBOARD_SYSTEM_PROMPT = "You are a helper summarizing storyboard plans."
+
+STORYBOARD_PROMPT_TEMPLATE = """
+    아래 대화는 기후 위기 스토리보드 수행평가를 위한 학생과 AI의 대화입니다.
+    이 대화 내용을 바탕으로 학생이 구상하고 있는 스토리보드(4컷 만화 또는 영상 구성안)를 정리해주세요.
+
+    출력 형식은 반드시 아래 JSON 포맷을 지켜주세요:
+    {{
+        "title": "추론된 스토리보드 제목",
+        "theme": "핵심 주제 (예: 맹그로브 숲의 파괴)",
+        "scenes": [
+            {{
+                "scene_num": 1,
+                "visual": "화면 구성 및 그림 설명 (구체적으로)",
+                "audio": "대사 또는 내레이션",
+                "time": "예상 시간"
+            }}
+        ],
+        "overall_summary": "전체 줄거리 요약 (한 문단)"
+    }}
+
+    대화 내용:
+    {conversation_text}
+    """
+
+# 프롬프트나 모델이 바뀌면 해시가 달라져 이전 추출 결과를 재사용하지 않음
+PROMPT_VERSION = hashlib.sha256(
+    (STORYBOARD_SYSTEM_PROMPT + STORYBOARD_PROMPT_TEMPLATE).encode("utf-8")
+).hexdigest()[:12]
+
+
+def conversation_text(messages):
+    """프롬프트에 넣을 대화 내용 (한 줄에 메시지 하나)"""
+    lines = []
+    for msg in messages:
+        role = "학생" if msg["role"] == "user" else "AI 조수"
+        content = msg["content"]
+        if isinstance(content, list):
+            content = " ".join([c["text"] for c in content if c["type"] == "text"])
+        lines.append(f"{role}: {content}\n")
+    return "".join(lines)
+
+
+def content_hash(messages):
+    """추출에 쓰이는 대화 내용의 해시 (피드백처럼 추출에 쓰이지 않는 기록은 포함하지 않음)"""
+    digest = hashlib.sha256(f"{PROMPT_VERSION}\0{STORYBOARD_MODEL}\0".encode("utf-8"))
+    digest.update(normalize_message(conversation_text(messages)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def extract_storyboard(client, messages):
+    """대화 내용으로 스토리보드 구조를 추출 (실패하면 None)"""
+    prompt = STORYBOARD_PROMPT_TEMPLATE.format(conversation_text=conversation_text(messages))
+    try:
+        response = call_with_retry(
+            client.chat.completions.create,
+            model=STORYBOARD_MODEL,
+            messages=[{"role": "system", "content": STORYBOARD_SYSTEM_PROMPT},
+                      {"role": "user", "content": prompt}],
+            response_format={"type": "json_object"}
+        )
+        return json.loads(response.choices[0].message.content)
+    except Exception as e:
+        print(f"스토리보드 추출 실패: {str(e)}")
+        return None
+
+
+class StoryboardStore:
+    """학생·대화 내용 해시별 스토리보드 추출 결과 (SQLite, 서버를 다시 시작해도 남음)"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS storyboards ("
+                "student_id TEXT NOT NULL, student_name TEXT NOT NULL, content_hash TEXT NOT NULL, "
+                "result TEXT NOT NULL, created_at TEXT NOT NULL, "
+                "PRIMARY KEY (student_id, student_name, content_hash));"
+                "CREATE INDEX IF NOT EXISTS idx_storyboards_hash ON storyboards (content_hash);"
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return closing_connection(conn)
+
+    def _row_to_entry(self, row):
+        entry = dict(row)
+        entry["result"] = json.loads(entry["result"])
+        return entry
+
+    def get(self, content_hash, student_id=None, student_name=None):
+        """해시가 같은 추출 결과 (학생을 주면 그 학생의 결과, 아니면 아무 학생의 결과)"""
+        query = "SELECT * FROM storyboards WHERE content_hash = ?"
+        params = [content_hash]
+        if student_id is not None:
+            query += " AND student_id = ? AND student_name = ?"
+            params += [student_id, student_name]
+        with self._connect() as conn:
+            row = conn.execute(query + " LIMIT 1", params).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def keys(self):
+        """저장된 (학번, 이름, 해시) 집합"""
+        with self._connect() as conn:
+            return {tuple(row) for row in conn.execute(
+                "SELECT student_id, student_name, content_hash FROM storyboards")}
+
+    def put(self, content_hash, student_id, student_name, result):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO storyboards (content_hash, student_id, student_name, result, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (content_hash, student_id, student_name, json.dumps(result, ensure_ascii=False), now)
+            )
+
+    def latest(self, student_id, student_name):
+        """학생의 가장 최근 추출 결과 (없으면 None)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM storyboards WHERE student_id = ? AND student_name = ? ORDER BY rowid DESC LIMIT 1",
+                (student_id, student_name)
+            ).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def latest_all(self):
+        """학생별 가장 최근 추출 결과 목록"""
+        with self._connect() as conn:
+            # 행은 추가 순서대로 rowid가 커지므로 학생별 가장 큰 rowid가 가장 최근 결과
+            rows = conn.execute(
+                "SELECT * FROM storyboards WHERE rowid IN "
+                "(SELECT MAX(rowid) FROM storyboards GROUP BY student_id, student_name) "
+                "ORDER BY student_id, student_name"
+            ).fetchall()
+        return [self._row_to_entry(row) for row in rows]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_storyboard_store(db_path):
+    """경로별로 프로세스 전체에서 공유하는 추출 결과 저장소"""
+    key = os.path.abspath(db_path)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = StoryboardStore(db_path)
+        return _stores[key]
+
+
+def extract_and_store(client, store, conversation):
+    """저장된 결과가 있으면 그대로, 없으면 추출해서 저장 - (결과 항목, 새로 추출했는지)
+
+    다른 학생의 대화와 내용이 같으면 그 결과를 이 학생의 결과로 복사한다.
+    """
+    student_id, student_name = conversation["student_id"], conversation["student_name"]
+    hashed = content_hash(conversation["messages"])
+    entry = store.get(hashed, student_id, student_name)
+    if entry is not None:
+        return entry, False
+    entry = store.get(hashed)
+    extracted = entry is None
+    result = extract_storyboard(client, conversation["messages"]) if extracted else entry["result"]
+    if result is None:
+        return None, True
+    store.put(hashed, student_id, student_name, result)
+    return store.get(hashed, student_id, student_name), extracted
+
+
+class HashIndex:
+    """학생별 대화 내용 해시 - 저장소 버전이 바뀐 학생의 대화만 다시 읽어 계산 (analysis.SummaryIndex와 같은 방식)"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def refresh(self):
+        """[{"key", "student_id", "student_name", "content_hash"}] (학번 순)"""
+        with self._lock:
+            versions = self.backend.conversation_versions()
+            for key in [key for key in self._entries if key not in versions]:
+                del self._entries[key]
+            for key, version in versions.items():
+                if key in self._entries and self._entries[key][0] == version:
+                    continue
+                conversation = self.backend.load_conversation_by_key(key)
+                if conversation is None:
+                    self._entries.pop(key, None)
+                    continue
+                self._entries[key] = (version, {
+                    "key": key,
+                    "student_id": conversation["student_id"],
+                    "student_name": conversation["student_name"],
+                    "content_hash": content_hash(conversation["messages"]),
+                })
+            return sorted((entry for _, entry in self._entries.values()),
+                          key=lambda entry: (entry["student_id"], entry["student_name"]))
+
+
+_hash_indexes = {}
+_hash_indexes_lock = threading.Lock()
+
+
+def get_hash_index(backend):
+    """저장소별로 프로세스 전체에서 공유하는 대화 해시 집계"""
+    with _hash_indexes_lock:
+        if id(backend) not in _hash_indexes:
+            _hash_indexes[id(backend)] = HashIndex(backend)
+        return _hash_indexes[id(backend)]
+
+
+# 학급 전체 추출 (jobs.JobRunner에 등록해서 사용)
+STORYBOARD_JOB_KIND = "storyboard_extraction"
+# 이만큼의 학생을 추출할 때마다 결과를 저장하고 취소 요청을 확인
+JOB_CHUNK_SIZE = 10
+
+EXTRACTED = "extracted"
+CACHED = "cached"
+FAILED = "failed"
+
+
+def _extract_entry(client, store, backend, entry):
+    """대화를 다시 읽어 추출 (해시를 계산한 뒤 대화가 이어졌으면 지금 내용으로 추출해 저장)"""
+    conversation = backend.load_conversation_by_key(entry["key"])
+    if conversation is None:
+        return FAILED
+    stored, extracted = extract_and_store(client, store, conversation)
+    if stored is None:
+        return FAILED
+    return EXTRACTED if extracted else CACHED
+
+
+def run_storyboard_job(job, client, backend, store, chunk_size=JOB_CHUNK_SIZE):
+    """학급 전체 대화의 스토리보드를 제한된 스레드 풀에서 동시에 추출
+
+    job.params: max_workers (선택)
+    저장된 결과와 대화 해시가 같은 학생은 요청 없이 건너뛰고, 학생별 처리 결과
+    (extracted / cached / failed)를 작업 저장소에 남긴다. 실패한 학생은 다음 작업에서 다시 시도한다.
+    """
+    entries = get_hash_index(backend).refresh()
+    done_keys = job.done_keys()
+    entries = [entry for entry in entries
+               if conversation_stem(entry["student_id"], entry["student_name"]) not in done_keys]
+    known = store.keys()
+    total = len(entries) + len(done_keys)
+
+    def row(entry, status):
+        return {"student_id": entry["student_id"], "student_name": entry["student_name"],
+                "content_hash": entry["content_hash"], "status": status}
+
+    def is_known(entry):
+        return (entry["student_id"], entry["student_name"], entry["content_hash"]) in known
+
+    cached = [entry for entry in entries if is_known(entry)]
+    if cached:
+        job.checkpoint({conversation_stem(entry["student_id"], entry["student_name"]): row(entry, CACHED)
+                        for entry in cached})
+    pending = [entry for entry in entries if not is_known(entry)]
+    done = total - len(pending)
+    job.progress(done, total)
+
+    max_workers = max(1, job.params.get("max_workers", DEFAULT_MAX_WORKERS))
+    # 묶음이 작업자 수보다 작으면 스레드가 놀게 되므로 묶음 크기는 작업자 수 이상
+    chunk_size = max(chunk_size, max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storyboard") as executor:
+        for start in range(0, len(pending), chunk_size):
+            if job.cancelled():
+                return
+            chunk = pending[start:start + chunk_size]
+            futures = {executor.submit(_extract_entry, client, store, backend, entry): entry for entry in chunk}
+            results = {}
+            for future in as_completed(futures):
+                entry = futures[future]
+                results[conversation_stem(entry["student_id"], entry["student_name"])] = row(entry, future.result())
+            job.checkpoint(results)
+            done += len(chunk)
+            job.progress(done, total)
@@ -1,12 +1,27 @@
 import streamlit as st
 import json
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import pandas as pd
-from openai import OpenAI
+import openai
 import traceback
-import base64
+
+import analysis
+import backup
+import chat
+import context_window
+import images
+import jobs
+import metrics
+import openai_client
+import prefilter
+import prompts
+import response_cache
+import scene_images
+import scheduler
+import storage
+import storyboards
 
 # 페이지 기본 설정
 st.set_page_config(
@@ -30,252 +45,202 @@ if not OPENAI_API_KEY:
     st.stop()
 
 
-# 이미지를 Base64로 변환하는 함수
-def encode_image(image_file):
-    return base64.b64encode(image_file.read()).decode('utf-8')
-
-
-# 대화 내용을 바탕으로 스토리보드 구조 추출 함수
-def extract_storyboard_structure(messages):
-    conversation_text = ""
-    for msg in messages:
-        role = "학생" if msg["role"] == "user" else "AI 조수"
-        content = msg["content"]
-        if isinstance(content, list):
-            content = " ".join([c["text"] for c in content if c["type"] == "text"])
-        conversation_text += f"{role}: {content}\n"
-
-    prompt = f"""
-    아래 대화는 기후 위기 스토리보드 수행평가를 위한 학생과 AI의 대화입니다.
-    이 대화 내용을 바탕으로 학생이 구상하고 있는 스토리보드(4컷 만화 또는 영상 구성안)를 정리해주세요.
-    
-    출력 형식은 반드시 아래 JSON 포맷을 지켜주세요:
-    {{
-        "title": "추론된 스토리보드 제목",
-        "theme": "핵심 주제 (예: 맹그로브 숲의 파괴)",
-        "scenes": [
-            {{
-                "scene_num": 1,
-                "visual": "화면 구성 및 그림 설명 (구체적으로)",
-                "audio": "대사 또는 내레이션",
-                "time": "예상 시간"
-            }}
-        ],
-        "overall_summary": "전체 줄거리 요약 (한 문단)"
-    }}
-    
-    대화 내용:
-    {conversation_text}
-    """
-
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "system", "content": "You are a helper summarizing storyboard plans."},
-                      {"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
-        )
-        return json.loads(response.choices[0].message.content)
-    except Exception as e:
-        return None
-
-
-# DALL-E 3로 장면 이미지 생성 함수
-def generate_scene_image(image_prompt):
-    try:
-        response = client.images.generate(
-            model="dall-e-3",
-            prompt=f"A storyboard sketch style illustration. {image_prompt}",
-            size="1024x1024",
-            quality="standard",
-            n=1,
-        )
-        return response.data[0].url
-    except Exception as e:
-        st.error(f"이미지 생성 실패: {e}")
-        return None
-
 
 # 학생별 최대 API 호출 횟수 설정
 MAX_API_CALLS_PER_STUDENT = 50
+# 반별로 새로 만들 수 있는 장면 이미지 수 (이미 만든 이미지를 다시 보는 것은 세지 않음)
+MAX_SCENE_IMAGES_PER_CLASS = 60
+API_LIMIT_MESSAGE = "API 호출 횟수가 제한에 도달했습니다. 선생님에게 문의해주세요."
 
-# 학생별 API 호출 횟수 추적
-if "student_api_calls" not in st.session_state:
-    st.session_state.student_api_calls = {}
 
+# 응답 캐시 설정 (세션별 LRU + 선택적으로 모든 세션이 공유하는 캐시)
+RESPONSE_CACHE_MAX_ENTRIES = 32
+RESPONSE_CACHE_MAX_BYTES = 256 * 1024
+RESPONSE_CACHE_TTL_SECONDS = 30 * 60
+USE_SHARED_RESPONSE_CACHE = True
 
-# ✅ [수정] GPT API 호출 함수 - 이미지 포함 시 자동으로 gpt-4o 사용
-def get_gpt_response(messages, use_gpt4=False):
-    student_id = st.session_state.student_id
-
-    if student_id not in st.session_state.student_api_calls:
-        st.session_state.student_api_calls[student_id] = 0
 
-    if st.session_state.student_api_calls[student_id] >= MAX_API_CALLS_PER_STUDENT:
-        return "API 호출 횟수가 제한에 도달했습니다. 선생님에게 문의해주세요."
+def get_cached_response(cache_key):
+    response_text = st.session_state.response_cache.get(cache_key)
+    if response_text is None and USE_SHARED_RESPONSE_CACHE:
+        response_text = response_cache.get_shared_cache().get(cache_key)
+        if response_text is not None:
+            st.session_state.response_cache.put(cache_key, response_text)
+    return response_text
 
-    # 이미지가 포함된 메시지가 있는지 확인 → 있으면 자동으로 gpt-4o 사용
-    has_image = any("image_data" in msg and msg.get("image_data") for msg in messages)
-    if has_image:
-        use_gpt4 = True  # ✅ 이미지 있으면 반드시 gpt-4o
 
-    cache_key = str([msg["content"] for msg in messages if msg["role"] == "user"]) + str(use_gpt4)
-    if cache_key in st.session_state.response_cache:
-        return st.session_state.response_cache[cache_key]
+def store_cached_response(cache_key, response_text):
+    st.session_state.response_cache.put(cache_key, response_text)
+    if USE_SHARED_RESPONSE_CACHE:
+        response_cache.get_shared_cache().put(cache_key, response_text)
 
-    try:
-        st.session_state.api_call_count += 1
-        st.session_state.student_api_calls[student_id] += 1
-
-        model = FEEDBACK_MODEL if use_gpt4 else DEFAULT_MODEL
-
-        # API로 보낼 메시지 포맷 재구성 (이미지 처리)
-        api_messages = []
-        for msg in messages:
-            if "image_data" in msg and msg["image_data"]:
-                content_payload = [
-                    {"type": "text", "text": msg["content"]},
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{msg['image_data']}"}
-                    }
-                ]
-                api_messages.append({"role": msg["role"], "content": content_payload})
-            else:
-                api_messages.append({"role": msg["role"], "content": msg["content"]})
 
-        api_params = {
-            "model": model,
-            "messages": api_messages
-        }
+# 응답을 토큰 단위로 받아 채팅 말풍선에 바로 표시할지 여부
+STREAM_RESPONSES = True
 
-        if not model.startswith("o1"):
-            api_params["temperature"] = 0.7
 
-        response = client.chat.completions.create(**api_params)
-        response_text = response.choices[0].message.content
-
-        st.session_state.response_cache[cache_key] = response_text
-        return response_text
-
-    except Exception as e:
-        st.error(f"GPT 응답 생성 중 오류가 발생했습니다: {str(e)}")
-        print(f"Error details: {traceback.format_exc()}")
-        return "죄송합니다, 응답을 생성하는 중에 오류가 발생했습니다. 다시 시도해 주세요."
-
-
-# GPT를 활용한 메시지 관련성 분석 함수
-def analyze_message_relevance(message_content):
-    """GPT를 사용해서 메시지가 스토리보드 관련인지 판단"""
-
-    analysis_prompt = f"""
-    다음 학생의 메시지가 기후 위기 스토리보드 작성과 관련된 의미있는 내용인지 판단해주세요.
-    
-    학생 메시지: "{message_content}"
-    
-    다음 기준으로 판단해주세요:
-    
-    관련된 내용:
-    - 스토리보드 주제, 구성, 캐릭터, 장면에 대한 질문이나 아이디어
-    - 기후 위기 관련 내용 문의 및 토론
-    - 창작 과정에서의 구체적인 고민이나 요청
-    - 스토리보드 제작 방법에 대한 질문
-    - 발표 준비나 피드백 요청
-    - 구체적인 시나리오나 상황 설정에 대한 논의
-    
-    관련없는 내용:
-    - 단순 인사말 ("안녕하세요", "감사합니다", "네", "좋아요")
-    - 수행평가와 무관한 잡담이나 개인적인 이야기
-    - 너무 짧거나 의미없는 응답 ("몰라요", "음", "어")
-    - 단순 확인 응답 ("알겠습니다", "네 맞아요")
-    
-    답변: "관련됨" 또는 "관련없음" 중 하나만 정확히 답하세요.
-    """
+# ✅ [수정] GPT API 호출 함수 - 이미지 포함 시 자동으로 gpt-4o 사용
+# stream=True 이면 현재 위치(채팅 말풍선 등)에 응답을 직접 표시하고 전체 응답을 반환
+# (첫 글자가 올 때까지만 spinner_text를 보여줌)
+def get_gpt_response(messages, use_gpt4=False, stream=False, spinner_text="💬 응답을 생성 중입니다...",
+                     image_policy=chat.IMAGE_HISTORY_POLICY):
+    student_id = st.session_state.student_id
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": analysis_prompt}],
-            temperature=0.1,
-        )
-        result = response.choices[0].message.content.strip()
-        return "관련됨" in result
-    except Exception as e:
-        print(f"메시지 분석 중 오류: {str(e)}")
-        return True
+    if student_budget.remaining(student_id) <= 0:
+        return API_LIMIT_MESSAGE
 
+    # 모든 요청은 프로세스 전체 스케줄러를 거침 (조직 한도 관리, 학생별로 돌아가며 처리)
+    # 요청이 몰려 기다리는 동안에는 대기 순서를 보여줌
+    queue_notice = st.empty()
 
-def count_relevant_prompts(conversation):
-    """대화에서 스토리보드 관련 프롬프트 수 계산"""
-    relevant_count = 0
+    def show_queue_position(position):
+        queue_notice.info(f"⏳ 질문이 몰려 순서를 기다리고 있어요. 앞에 {position}건이 있습니다.")
 
-    for msg in conversation["messages"]:
-        if msg["role"] == "user":
-            if len(msg["content"].strip()) < 3:
-                continue
-            if analyze_message_relevance(msg["content"]):
-                relevant_count += 1
+    scheduled_client = scheduler.ScheduledClient(client, request_scheduler, student_id,
+                                                 on_wait=show_queue_position)
 
-    return relevant_count
+    # 모델·모든 메시지·이미지를 포함한 요청 전체로 캐시 키 생성
+    # (요약하기 전의 대화로 만들어 캐시에 있으면 요약 요청도 보내지 않음)
+    cache_key = response_cache.make_key(chat.build_api_params(messages, image_store, use_gpt4, image_policy))
+    cached_response = get_cached_response(cache_key)
+    if cached_response is not None:
+        if stream:
+            st.markdown(cached_response)
+        return cached_response
 
+    parts = []
+    stream_state = {"finish_reason": None, "usage": None}
+    charged = False
+    try:
+        # 한도 확인과 차감을 한 번에 (여러 탭에서 동시에 보내도 한도를 넘지 않음)
+        if not student_budget.try_consume(student_id):
+            return API_LIMIT_MESSAGE
+        charged = True
+
+        # 오래된 대화는 누적 요약으로 접어 요청 크기를 토큰 예산 안으로 유지
+        # (요약 요청도 학생의 호출 한도에서 1회 차감하고, 한도가 없으면 요약 없이 오래된 턴을 빼고 보냄,
+        #  요약이 실패하면 차감한 1회를 되돌림)
+        messages = st.session_state.conversation_context.build(
+            scheduled_client, messages, charge=lambda: student_budget.try_consume(student_id),
+            refund=lambda: student_budget.release(student_id))
+        api_params = chat.build_api_params(messages, image_store, use_gpt4, image_policy)
+
+        if stream:
+            with st.spinner(spinner_text):
+                response_stream = scheduled_client.chat.completions.create(**api_params, stream=True,
+                                                                           stream_options={"include_usage": True})
+            queue_notice.empty()
+            st.write_stream(chat.stream_text(response_stream, parts, stream_state))
+            # 연결이 끊겨 종료 신호 없이 끝난 스트림은 오류로 처리
+            if stream_state["finish_reason"] is None:
+                raise RuntimeError("응답 스트림이 완료되지 않았습니다.")
+            response_text = "".join(parts)
+            prompts.get_usage_stats().record(stream_state["usage"])
+        else:
+            response = scheduled_client.chat.completions.create(**api_params)
+            response_text = response.choices[0].message.content
+            prompts.get_usage_stats().record(response.usage)
 
-def analyze_conversations_with_gpt(conversations, progress_callback=None):
-    """여러 대화를 GPT로 분석 (진행 상황 표시 포함)"""
-    analyzed_data = []
-    total = len(conversations)
+        store_cached_response(cache_key, response_text)
+        return response_text
 
-    for i, conv in enumerate(conversations):
-        if progress_callback:
-            progress_callback(i + 1, total)
+    except (scheduler.SchedulerTimeout, openai.RateLimitError) as e:
+        print(f"요청 한도로 응답 생성 실패: {str(e)}")
+        # 응답을 받지 못했으므로 차감한 호출 1회를 되돌림
+        if charged:
+            student_budget.release(student_id)
+        busy_text = "지금 질문하는 학생이 많아 답변이 늦어지고 있어요. 잠시 후 다시 질문해 주세요."
+        if stream:
+            st.markdown(busy_text)
+        return busy_text
 
-        student_name = conv["student_name"]
-        student_id = conv["student_id"]
+    except Exception as e:
+        st.error(f"GPT 응답 생성 중 오류가 발생했습니다: {str(e)}")
+        print(f"Error details: {traceback.format_exc()}")
+        # 스트리밍 중간에 끊긴 경우 받은 부분까지는 보여주되 캐시에는 넣지 않음
+        if parts:
+            return "".join(parts) + "\n\n(응답이 중간에 끊겼습니다. 다시 질문해 주세요.)"
+        if charged:
+            student_budget.release(student_id)
+        error_text = "죄송합니다, 응답을 생성하는 중에 오류가 발생했습니다. 다시 시도해 주세요."
+        if stream:
+            st.markdown(error_text)
+        return error_text
 
-        relevant_count = count_relevant_prompts(conv)
-        total_user_messages = sum(1 for msg in conv["messages"] if msg["role"] == "user")
-        assistant_msg_count = sum(1 for msg in conv["messages"] if msg["role"] == "assistant")
+    finally:
+        queue_notice.empty()
 
-        if conv["messages"]:
-            first_msg_time = datetime.strptime(conv["messages"][0]["timestamp"], "%Y-%m-%d %H:%M:%S")
-            last_msg_time = datetime.strptime(conv["messages"][-1]["timestamp"], "%Y-%m-%d %H:%M:%S")
-            duration = (last_msg_time - first_msg_time).total_seconds() / 60
-        else:
-            duration = 0
 
-        has_feedback = "feedback" in conv and len(conv["feedback"]) > 0
+# 데이터 저장 경로 설정
+DATA_DIR = "data"
 
-        analyzed_data.append({
-            "학생명": student_name,
-            "학번": student_id,
-            "관련 프롬프트 수": relevant_count,
-            "전체 메시지 수": total_user_messages,
-            "AI 응답 수": assistant_msg_count,
-            "관련도": f"{relevant_count}/{total_user_messages}" if total_user_messages > 0 else "0/0",
-            "대화 시간(분)": round(duration, 1),
-            "피드백 여부": "O" if has_feedback else "X"
-        })
+# 저장소 (환경변수 STORAGE_BACKEND=sqlite 이면 SQLite, 기본은 JSON 파일)
+backend = storage.get_backend(DATA_DIR)
 
-    return analyzed_data
+# GPT 관련성 판정 캐시 (한 번 판단한 메시지는 다시 분석하지 않음)
+RELEVANCE_CACHE_FILE = os.path.join(DATA_DIR, "relevance_cache.db")
+relevance_cache = analysis.get_verdict_cache(RELEVANCE_CACHE_FILE)
 
+# 업로드 이미지 저장소 (대화 기록에는 이미지 ID만 남김)
+IMAGES_DIR = os.path.join(DATA_DIR, "images")
+image_store = images.get_image_store(IMAGES_DIR)
 
-# 데이터 저장 경로 설정
-DATA_DIR = "data"
-CONVERSATIONS_DIR = os.path.join(DATA_DIR, "conversations")
-STUDENTS_FILE = os.path.join(DATA_DIR, "students.json")
+# 데이터 백업 (압축 파일은 data/backups/에 남음)
+backup_exporter = backup.BackupExporter(backend, os.path.join(DATA_DIR, backup.BACKUP_DIRNAME), IMAGES_DIR)
 
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(CONVERSATIONS_DIR, exist_ok=True)
+# 관리자 화면 대화 보기 (긴 대화는 쪽으로 나눠 보여줌)
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+TRANSCRIPT_PAGE_SIZES = [20, 50, 100]
+TRANSCRIPT_ROLES = {"전체": None, "학생": "user", "AI": "assistant"}
+# 학생 검색 결과를 선택 목록에 올리는 최대 인원
+STUDENT_SEARCH_LIMIT = 50
 
-if not os.path.exists(STUDENTS_FILE):
-    with open(STUDENTS_FILE, 'w', encoding='utf-8') as f:
-        json.dump([], f)
+# OpenAI 클라이언트 (프로세스 전체가 연결 풀을 공유하는 클라이언트를 가져옴)
+client = openai_client.get_client(OPENAI_API_KEY)
 
-# OpenAI 클라이언트 초기화
-client = OpenAI(api_key=OPENAI_API_KEY)
+# 프로세스 전체 요청 스케줄러 (학생 대화가 관리자 일괄 분석보다 먼저 처리됨)
+request_scheduler = scheduler.get_scheduler()
 
-# 모델 설정
-DEFAULT_MODEL = "gpt-4o-mini"
-FEEDBACK_MODEL = "gpt-4o"
+# 프로세스 전체 지표 - 환경변수 METRICS_PORT를 주면 Prometheus가 수집할 /metrics 주소를 염
+METRICS_REFRESH_SECONDS = 5
+if os.environ.get("METRICS_PORT"):
+    try:
+        metrics.start_http_server(int(os.environ["METRICS_PORT"]), os.environ.get("METRICS_ADDRESS", "127.0.0.1"))
+    except OSError as e:
+        print(f"지표 서버를 열지 못했습니다: {str(e)}")
+
+# 관리자 화면의 단건 요청(스토리보드 구조 추출)용 클라이언트
+admin_client = scheduler.ScheduledClient(client, request_scheduler, "admin")
+
+# 학생별 API 호출 한도 (서버에 기록되어 새로고침해도 초기화되지 않음)
+API_BUDGET_FILE = os.path.join(DATA_DIR, "api_budget.db")
+student_budget = scheduler.get_student_budget(API_BUDGET_FILE, MAX_API_CALLS_PER_STUDENT)
+
+# 관리자 일괄 분석은 백그라운드 작업으로 실행 (화면을 새로 그리거나 탭을 닫아도 계속 진행되고,
+# 학생별 결과가 저장되어 중단된 작업은 이어서 실행할 수 있음)
+JOBS_FILE = os.path.join(DATA_DIR, "jobs.db")
+# 일괄 분석, 스토리보드 일괄 추출, 장면 이미지 생성이 서로 기다리지 않도록 작업 세 개까지 동시에 실행
+job_runner = jobs.get_job_runner(JOBS_FILE, max_workers=3)
+# 일괄 분석은 낮은 우선순위로 보내 학생 대화를 막지 않음
+batch_client = scheduler.ScheduledClient(client, request_scheduler, "admin-analysis", lane=scheduler.LANE_BATCH)
+job_runner.register(analysis.ANALYSIS_JOB_KIND,
+                    lambda job: analysis.run_analysis_job(job, batch_client, backend, cache=relevance_cache))
+
+# 스토리보드 추출 결과 (대화 내용 해시별로 저장되어 바뀌지 않은 대화는 다시 추출하지 않음)
+STORYBOARDS_FILE = os.path.join(DATA_DIR, "storyboards.db")
+storyboard_store = storyboards.get_storyboard_store(STORYBOARDS_FILE)
+storyboard_client = scheduler.ScheduledClient(client, request_scheduler, "admin-storyboards",
+                                              lane=scheduler.LANE_BATCH)
+job_runner.register(storyboards.STORYBOARD_JOB_KIND,
+                    lambda job: storyboards.run_storyboard_job(job, storyboard_client, backend, storyboard_store))
+
+# 장면 이미지 (프롬프트별로 한 번만 만들어 이미지 저장소에 내려받아 두고, 반별 예산 안에서만 새로 만듦)
+SCENE_IMAGES_FILE = os.path.join(DATA_DIR, "scene_images.db")
+scene_image_cache = scene_images.get_scene_image_cache(SCENE_IMAGES_FILE)
+scene_image_budget = scene_images.get_image_budget(SCENE_IMAGES_FILE, MAX_SCENE_IMAGES_PER_CLASS)
+job_runner.register(scene_images.SCENE_IMAGE_JOB_KIND,
+                    lambda job: scene_images.run_scene_image_job(job, storyboard_client, storyboard_store,
+                                                                 scene_image_cache, scene_image_budget, image_store))
 
 # 세션 상태 초기화
 if "session_id" not in st.session_state:
@@ -285,61 +250,7 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
     st.session_state.messages.append({
         "role": "system",
-        "content": """학생들의 수행평가를 도움을 주기위한 대화를 하려고 하는데, 역할, 말투, 핵심 주제, 수행평가 단계, 제한사항, 참고사항을 고려하여 응답해주세요. 
-        # 역할 : 중학교 3학년 학생들이 기후 위기 관련 스토리보드를 작성하는 것을 돕는 조수
-        # 말투 : 학생들에게 친절하고 이해하기 쉬운 언어로 응답
-        # 핵심 주제
-        ## 기후위기
-        ### 소비는 탄소 발자국을 남긴다
-        - **스마트폰과 자원 소비**: 스마트폰 생산에 40여 가지 광물이 사용되며, 평균 교체 주기는 2.7년
-        - **데이터 센터의 환경 영향**: 전 세계 이산화탄소 배출의 2%가 데이터 센터에서 발생
-        - **플라스틱 문제**: 1950년 200만톤 생산에서 2015년 4억 7000만톤으로 증가
-        - **패스트 패션의 영향**: 2000년 500억벌에서 2015년 1000억벌로 판매량 증가
-
-        ### 우리가 먹는 것 하나하나가
-        - **고기 소비와 환경**: 축산업은 직접 이산화탄소 배출의 18%, 간접 포함 시 30% 차지
-        - **초콜릿과 카카오 재배**: 지난 50년간 코트디부아르 숲의 80%가 사라짐
-        - **새우 양식과 맹그로브 숲**: 맹그로브 숲은 탄소 흡수력이 열대우림의 2.5배이나 새우 양식으로 파괴됨
-        - **음식물 쓰레기**: 생산된 음식의 1/3은 먹기도 전에 버려짐
-
-        ### 남극이 펭귄을 잃게 될 때
-        - **북극 빙하**: 30년간 북극 빙하 50%가 감소, 2035년에는 해빙이 없을 것으로 예상
-        - **영구동토층 융해**: 메탄 발생과 감염병 확산 위험
-        - **남극 기온 상승**: 최근 50년간 3도 상승하여 펭귄 서식에 위협
-        - **물 순환 문제**: 가뭄과 폭우의 반복으로 수자원 위기
-
-        ### 기후위기에 대응하는 우리의 실천
-        - **화석연료 기업의 영향**: 최근 50년간 전 세계 온실가스 배출량의 35% 차지
-        - **친환경 교통**: 자전거 친화 도시의 확산과 공유 차량 시스템
-        - **재생에너지 확대**: 화석연료 중심에서 재생에너지 중심 전환 필요
-        - **지속가능한 생활방식**: 라벨 없는 상품, 텀블러 공유 서비스 등 새로운 시도
-        
-        # 수행평가 단계
-        1. 모둠별 활동(스토리보드 주제 선정)
-        * 넓은 주제의 주제보다는 좁은 범위의 주제 선정(예: 데이터 센터 → 데이터 센터의 위치, 맹그로브 숲 → 맹그로브 숲의 영향)
-        * 주제를 잘 표현하기 위해서는 몇 장의 스토리보드가 적절한지 결정
-        * 모둠원들이 공유해야 하는 스토리보드의 전체 분위기 및 등장인물, 배경등 미리 정하기
-        2. 개인별 스토리보드 작성
-        * 모둠의 스토리보드 중에서 역할 분담받은 특정 장면의 스토리보드를 만들기
-        * 특정 장면을 표현하기 위한 몇 가지 컷 만들기
-        * 각 컷의 비디오(이미지)와 해당 컷의 설명, 대략적인 소요시간 표현하기
-        3. 발표
-        * 모둠에서 작성한 스토리보드를 한 명이 발표
-        * 발표시에 어떠한 주제를 어떠한 분위기에서 어떤 인물이 어떻게 했다는 것을 표현
-        # 제한사항
-        * 수행평가임을 분명히 하고 대화에서 수행평가와 관련없는 대화가 실시될 경우에는 감점이 될 수 있음.
-        * 수행평가 관련 대화가 아닌 대화를 3번 연속해서 진행할 시에 경고하기.
-        # 참고사항
-        1. 모둠 구성 : 3 ~ 4명
-        2. 학생들은 수행평가 단계1, 단계2, 단계3 에서 도움 요청 예정
-        3. 요청하는 단계를 이해한후 대답 요구
-        4. 창의적이고 효과적인 스토리보드 제작하기 위해 도움을 줌
-        # 이미지 피드백 (학생이 스토리보드 사진을 업로드한 경우)
-        * 학생이 손으로 그린 스토리보드 스케치나 사진을 업로드하면 아래 순서로 피드백을 제공한다:
-          1. 그림에서 잘된 점을 먼저 구체적으로 칭찬한다 (컷 구성, 인물 표현, 배경 묘사 등 언급)
-          2. 기후 위기 메시지가 그림을 통해 얼마나 잘 전달되는지 평가한다
-          3. 개선하면 더 좋을 점을 2~3가지 구체적으로 제안한다 (예: "3번 컷에서 배경에 녹아내리는 빙하를 추가하면...")
-          4. 다음 단계에서 어떻게 발전시킬 수 있는지 방향을 제시한다"""
+        "content": prompts.system_prompt()
     })
 
 if "student_info_submitted" not in st.session_state:
@@ -348,15 +259,18 @@ if "student_info_submitted" not in st.session_state:
 if "feedback_mode" not in st.session_state:
     st.session_state.feedback_mode = False
 
-if "api_call_count" not in st.session_state:
-    st.session_state.api_call_count = 0
-
 if "response_cache" not in st.session_state:
-    st.session_state.response_cache = {}
+    st.session_state.response_cache = response_cache.ResponseCache(
+        RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL_SECONDS
+    )
+
+# 긴 대화의 요약 상태 (세션마다 하나)
+if "conversation_context" not in st.session_state:
+    st.session_state.conversation_context = context_window.ConversationContext()
 
 # ✅ [신규] 업로드된 이미지를 세션에 임시 보관하는 상태
-if "pending_image_data" not in st.session_state:
-    st.session_state.pending_image_data = None
+if "pending_image_id" not in st.session_state:
+    st.session_state.pending_image_id = None
 if "pending_image_name" not in st.session_state:
     st.session_state.pending_image_name = None
 
@@ -364,46 +278,17 @@ if "pending_image_name" not in st.session_state:
 # 학생 정보 저장
 def save_student_info(data):
     try:
-        with open(STUDENTS_FILE, 'r', encoding='utf-8') as f:
-            students = json.load(f)
-        students.append(data)
-        with open(STUDENTS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(students, f, ensure_ascii=False, indent=2)
+        backend.add_student(data)
         return True
     except Exception as e:
         st.error(f"학생 정보 저장 중 오류 발생: {str(e)}")
         return False
 
 
-# 대화 저장
+# 대화 저장 (JSON 저장소는 학생별 추가 전용 로그에 한 줄씩 기록)
 def save_conversation(data):
-    student_id = data["student_id"]
-    student_name = data["student_name"]
-    filename = f"{student_id}_{student_name}.json"
-    conversation_file = os.path.join(CONVERSATIONS_DIR, filename)
-
     try:
-        if os.path.exists(conversation_file):
-            with open(conversation_file, 'r', encoding='utf-8') as f:
-                conversation = json.load(f)
-        else:
-            conversation = {
-                "session_id": data["session_id"],
-                "student_name": student_name,
-                "student_id": student_id,
-                "messages": []
-            }
-
-        message = {
-            "role": data["type"].split("_")[0],
-            "content": data["content"],
-            "timestamp": data["timestamp"]
-        }
-        conversation["messages"].append(message)
-
-        with open(conversation_file, 'w', encoding='utf-8') as f:
-            json.dump(conversation, f, ensure_ascii=False, indent=2)
-
+        backend.append_message(data)
         return True
     except Exception as e:
         st.error(f"대화 저장 중 오류 발생: {str(e)}")
@@ -412,31 +297,12 @@ def save_conversation(data):
 
 # 피드백 저장
 def save_feedback(data):
-    student_id = data["student_id"]
-    student_name = data["student_name"]
-    filename = f"{student_id}_{student_name}.json"
-    conversation_file = os.path.join(CONVERSATIONS_DIR, filename)
-
     try:
-        if os.path.exists(conversation_file):
-            with open(conversation_file, 'r', encoding='utf-8') as f:
-                conversation = json.load(f)
-
-            if "feedback" not in conversation:
-                conversation["feedback"] = []
-
-            feedback = {
-                "content": data["content"],
-                "timestamp": data["timestamp"]
-            }
-            conversation["feedback"].append(feedback)
-
-            with open(conversation_file, 'w', encoding='utf-8') as f:
-                json.dump(conversation, f, ensure_ascii=False, indent=2)
-
+        if backend.conversation_exists(data["student_id"], data["student_name"]):
+            backend.append_feedback(data)
             return True
         else:
-            st.error(f"대화 파일을 찾을 수 없습니다: {conversation_file}")
+            st.error(f"대화 기록을 찾을 수 없습니다: {data['student_id']}_{data['student_name']}")
             return False
     except Exception as e:
         st.error(f"피드백 저장 중 오류 발생: {str(e)}")
@@ -452,6 +318,15 @@ def save_data(data):
         return save_conversation(data)
 
 
+# 업로드 이미지 썸네일 표시 (원본이 지워졌으면 자리 표시 문구만)
+def show_thumbnail(image_id):
+    thumbnail = image_store.thumbnail(image_id)
+    if thumbnail is None:
+        st.caption("(업로드한 이미지를 찾을 수 없습니다)")
+        return
+    st.image(thumbnail, caption="업로드한 스토리보드 이미지", width=350)
+
+
 # 사이드바 - 스토리보드 작성 가이드
 with st.sidebar:
     st.title("스토리보드 작성 가이드")
@@ -466,20 +341,8 @@ with st.sidebar:
     3. **문제 해결 방식 탐색하기**: "맹그로브 숲이 사라지는 것을 막기 위해서는 뭘 해야할까?"
     4. **대비 활용하기**: "현재와 맹그로브 숲이 사라진 미래의 환경을 대비하여 보여준다면?"
     5. **지역 특성 반영하기**: "우리 지역에서 볼 수 있는 기후 변화의 신호는?"
-
-    ### 평가 기준
-    #### 스토리보드 평가 (40점)
-    - **A등급 (40점)**: 5개 이상의 효과적인 프롬프트를 작성하면서 기존의 문제점을 정확하게 파악하고 체계적으로 개선함
-    - **B등급 (35점)**: 4개의 효과적인 프롬프트를 작성하면서 기존의 문제점을 정확하게 파악하고 체계적으로 개선함
-    - **C등급 (30점)**: 3개의 효과적인 프롬프트를 작성하면서 문제점 파악과 개선이 대체적으로 체계적
-    - **D등급 (25점)**: 2개의 기본적인 프롬프트를 작성
-    - **E등급 (20점)**: 1개의 단순한 프롬프트만 사용
-
-    #### 발표 평가 (20점)
-    - **A등급 (20점)**: 핵심 메시지를 기후 위기와 관련지어 명확하게 발표
-    - **B등급 (15점)**: 핵심 메시지를 기후 위기와 관련지었지만 명확하게 전달되지 않음
-    - **C등급 (10점)**: 핵심 메시지를 기후 위기와 관련짓지 않고 발표
     """)
+    st.markdown("### 평가 기준\n" + prompts.rubric())
 
     if st.button("내 스토리보드 피드백 받기"):
         if len([m for m in st.session_state.messages if m["role"] == "user"]) > 0:
@@ -489,31 +352,7 @@ with st.sidebar:
             st.warning("먼저 스토리보드 작성을 위한 대화가 필요합니다.")
 
     with st.expander("📚 필독서 내용 요약"):
-        st.markdown("""
-        ### 소비는 탄소 발자국을 남긴다
-        - **스마트폰과 자원 소비**: 스마트폰 생산에 40여 가지 광물이 사용되며, 평균 교체 주기는 2.7년
-        - **데이터 센터의 환경 영향**: 전 세계 이산화탄소 배출의 2%가 데이터 센터에서 발생
-        - **플라스틱 문제**: 1950년 200만톤 생산에서 2015년 4억 7000만톤으로 증가
-        - **패스트 패션의 영향**: 2000년 500억벌에서 2015년 1000억벌로 판매량 증가
-
-        ### 우리가 먹는 것 하나하나가
-        - **고기 소비와 환경**: 축산업은 직접 이산화탄소 배출의 18%, 간접 포함 시 30% 차지
-        - **초콜릿과 카카오 재배**: 지난 50년간 코트디부아르 숲의 80%가 사라짐
-        - **새우 양식과 맹그로브 숲**: 맹그로브 숲은 탄소 흡수력이 열대우림의 2.5배이나 새우 양식으로 파괴됨
-        - **음식물 쓰레기**: 생산된 음식의 1/3은 먹기도 전에 버려짐
-
-        ### 남극이 펭귄을 잃게 될 때
-        - **북극 빙하**: 30년간 북극 빙하 50%가 감소, 2035년에는 해빙이 없을 것으로 예상
-        - **영구동토층 융해**: 메탄 발생과 감염병 확산 위험
-        - **남극 기온 상승**: 최근 50년간 3도 상승하여 펭귄 서식에 위협
-        - **물 순환 문제**: 가뭄과 폭우의 반복으로 수자원 위기
-
-        ### 기후위기에 대응하는 우리의 실천
-        - **화석연료 기업의 영향**: 최근 50년간 전 세계 온실가스 배출량의 35% 차지
-        - **친환경 교통**: 자전거 친화 도시의 확산과 공유 차량 시스템
-        - **재생에너지 확대**: 화석연료 중심에서 재생에너지 중심 전환 필요
-        - **지속가능한 생활방식**: 라벨 없는 상품, 텀블러 공유 서비스 등 새로운 시도
-        """)
+        st.markdown(prompts.reading_summary())
 
 # ─────────────────────────────────────────────
 # 메인 화면
@@ -547,22 +386,7 @@ if not st.session_state.student_info_submitted:
 
             welcome_message = {
                 "role": "assistant",
-                "content": f"""안녕하세요, {student_name} 학생! 기후 위기 스토리보드 작성을 도와드릴게요.
-저는 스토리보드 모둠활동, 개별활동, 발표준비에 도움을 드릴 수 있어요.
-그리고 여러분이 만들 스토리보드는 기후 위기에 관한 중요한 메시지를 전달하는 도구가 될 거예요. 
-어떤 아이디어나 질문이 있으신가요?
-
-예를 들어:
-- 어떤 주제로 하는 것이 좋을까?
-- 어떤 형식으로 스토리보드를 만들고 싶으신가요? (짧은 만화, 시나리오, 광고 등)
-- 스토리보드에 포함되어야 하는 내용은 무엇일까?
-- 스토리보드에 어떤 캐릭터나 상황을 포함시키고 싶으신가요?
-- 발표할 때에는 어떤 점을 위주로 발표하면 좋을까?
-
-자유롭게 질문하거나 아이디어를 나눠주세요!
-
-📷 **스토리보드 스케치를 직접 그려서 사진으로 찍어 업로드하면 AI가 그림을 보고 피드백해드려요!**
-"""
+                "content": prompts.welcome_message(student_name)
             }
             st.session_state.messages.append(welcome_message)
 
@@ -586,8 +410,7 @@ elif st.session_state.student_info_submitted:
     if st.session_state.feedback_mode:
         st.subheader("스토리보드 피드백")
 
-        with st.spinner("피드백을 생성 중입니다..."):
-            feedback_prompt = """지금까지의 대화를 바탕으로 내 스토리보드 작업에 대해 다음 항목에 대한 피드백을 제공해주세요:
+        feedback_prompt = """지금까지의 대화를 바탕으로 내 스토리보드 작업에 대해 다음 항목에 대한 피드백을 제공해주세요:
             1. 수행평가와 관련되어 사용한 프롬프트의 수와 질 (평가 기준에 따른 현재 등급)
             2. 스토리보드의 기후 위기 관련성
             3. 개선할 점과 강화할 점
@@ -595,21 +418,27 @@ elif st.session_state.student_info_submitted:
 
             피드백은 구체적이고 건설적이며 격려하는 방식으로 제공해주세요."""
 
-            feedback_messages = [m for m in st.session_state.messages]
-            feedback_messages.append({"role": "user", "content": feedback_prompt})
-
-            feedback = get_gpt_response(feedback_messages, use_gpt4=True)
-            st.markdown(f"### 피드백 결과\n{feedback}")
+        feedback_messages = [m for m in st.session_state.messages]
+        feedback_messages.append({"role": "user", "content": feedback_prompt})
 
-            feedback_data = {
-                "session_id": st.session_state.session_id,
-                "student_name": st.session_state.student_name,
-                "student_id": st.session_state.student_id,
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "type": "feedback",
-                "content": feedback
-            }
-            save_data(feedback_data)
+        st.markdown("### 피드백 결과")
+        if STREAM_RESPONSES:
+            feedback = get_gpt_response(feedback_messages, use_gpt4=True, stream=True,
+                                        spinner_text="피드백을 생성 중입니다...", image_policy="latest")
+        else:
+            with st.spinner("피드백을 생성 중입니다..."):
+                feedback = get_gpt_response(feedback_messages, use_gpt4=True, image_policy="latest")
+            st.markdown(feedback)
+
+        feedback_data = {
+            "session_id": st.session_state.session_id,
+            "student_name": st.session_state.student_name,
+            "student_id": st.session_state.student_id,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "type": "feedback",
+            "content": feedback
+        }
+        save_data(feedback_data)
 
         if st.button("스토리보드 작성으로 돌아가기"):
             st.session_state.feedback_mode = False
@@ -621,8 +450,8 @@ elif st.session_state.student_info_submitted:
         for msg in st.session_state.messages:
             if msg["role"] != "system":
                 with st.chat_message(msg["role"]):
-                    if "image_data" in msg and msg["image_data"]:
-                        st.image(base64.b64decode(msg["image_data"]), caption="업로드한 스토리보드 이미지", width=350)
+                    if msg.get("image_id"):
+                        show_thumbnail(msg["image_id"])
                     st.markdown(msg["content"])
 
         # ✅ [수정] 이미지 업로드 영역 - expander 제거하고 항상 노출
@@ -635,39 +464,47 @@ elif st.session_state.student_info_submitted:
 
         # 업로드된 이미지 미리보기 + 세션 임시 저장
         if uploaded_file is not None:
-            # 파일이 새로 올라온 경우에만 인코딩 (파일명 변경 시 갱신)
+            # 파일이 새로 올라온 경우에만 전처리 후 저장소에 저장 (파일명 변경 시 갱신)
             if st.session_state.pending_image_name != uploaded_file.name:
-                st.session_state.pending_image_data = encode_image(uploaded_file)
+                try:
+                    st.session_state.pending_image_id = image_store.put_upload(uploaded_file)
+                except images.ImageRejected as e:
+                    # 너무 크거나 지원하지 않는 형식의 이미지는 원본도 보내지 않음
+                    print(f"업로드 이미지 거부: {str(e)}")
+                    st.session_state.pending_image_id = None
                 st.session_state.pending_image_name = uploaded_file.name
 
-            st.image(uploaded_file, caption="📌 업로드된 이미지 - 아래 채팅창에 질문을 입력하면 AI가 분석합니다.", width=350)
-            st.info("💬 아래 채팅창에 질문을 입력하세요. 예) '이 스케치 어때요?', '개선할 점이 있나요?'")
+            if st.session_state.pending_image_id is None:
+                st.error("이 이미지는 처리할 수 없어요. 크기가 너무 크거나 지원하지 않는 형식입니다. 다른 사진을 올려주세요.")
+            else:
+                st.image(uploaded_file, caption="📌 업로드된 이미지 - 아래 채팅창에 질문을 입력하면 AI가 분석합니다.", width=350)
+                st.info("💬 아래 채팅창에 질문을 입력하세요. 예) '이 스케치 어때요?', '개선할 점이 있나요?'")
 
         # 사용자 입력
         user_input = st.chat_input("스토리보드에 대해 질문하거나 아이디어를 입력하세요...")
 
         if user_input:
             # ✅ 세션에 임시 저장된 이미지 사용 (업로더 상태와 무관하게 안정적)
-            image_data = st.session_state.pending_image_data
+            image_id = st.session_state.pending_image_id
 
-            # 사용자 메시지 객체 구성
+            # 사용자 메시지 객체 구성 (이미지는 저장소 ID만 보관)
             user_message_obj = {
                 "role": "user",
                 "content": user_input,
-                "image_data": image_data  # None이면 텍스트 전용
+                "image_id": image_id  # None이면 텍스트 전용
             }
 
             st.session_state.messages.append(user_message_obj)
 
             # 화면에 사용자 메시지 표시
             with st.chat_message("user"):
-                if image_data:
-                    st.image(base64.b64decode(image_data), caption="업로드한 스토리보드 이미지", width=350)
+                if image_id:
+                    show_thumbnail(image_id)
                 st.markdown(user_input)
 
             # JSON 저장 (텍스트만 저장하여 대시보드 호환성 유지)
             current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            log_content = f"[이미지 첨부] {user_input}" if image_data else user_input
+            log_content = f"[이미지 첨부] {user_input}" if image_id else user_input
             chat_log = {
                 "session_id": st.session_state.session_id,
                 "student_name": st.session_state.student_name,
@@ -678,15 +515,18 @@ elif st.session_state.student_info_submitted:
             }
             save_data(chat_log)
 
-            # ✅ GPT 응답 생성 (이미지 있으면 자동으로 gpt-4o 사용)
-            spinner_msg = "🖼️ 스토리보드 이미지를 분석 중입니다..." if image_data else "💬 응답을 생성 중입니다..."
-            with st.spinner(spinner_msg):
-                response = get_gpt_response(st.session_state.messages)
+            # ✅ GPT 응답 생성 (이미지 있으면 자동으로 gpt-4o 사용) - 받는 대로 말풍선에 표시
+            spinner_msg = "🖼️ 스토리보드 이미지를 분석 중입니다..." if image_id else "💬 응답을 생성 중입니다..."
+            with st.chat_message("assistant"):
+                if STREAM_RESPONSES:
+                    response = get_gpt_response(st.session_state.messages, stream=True, spinner_text=spinner_msg)
+                else:
+                    with st.spinner(spinner_msg):
+                        response = get_gpt_response(st.session_state.messages)
+                    st.markdown(response)
 
-            # 응답 표시 및 저장
+            # 응답 저장
             st.session_state.messages.append({"role": "assistant", "content": response})
-            with st.chat_message("assistant"):
-                st.markdown(response)
 
             response_log = {
                 "session_id": st.session_state.session_id,
@@ -699,8 +539,8 @@ elif st.session_state.student_info_submitted:
             save_data(response_log)
 
             # ✅ 이미지 전송 후 임시 이미지 초기화 (같은 이미지 중복 전송 방지)
-            if image_data:
-                st.session_state.pending_image_data = None
+            if image_id:
+                st.session_state.pending_image_id = None
                 st.session_state.pending_image_name = None
                 st.rerun()
 
@@ -711,20 +551,54 @@ if st.query_params.get("admin", "false") == "true":
     st.markdown("---")
     st.header("👨‍🏫 관리자 대시보드")
 
-    st.metric("총 API 호출 횟수", st.session_state.api_call_count)
+    st.metric("총 API 호출 횟수 (전체 학급)", int(scheduler.API_REQUESTS.total()),
+              help="서버가 시작된 뒤 모든 학생 세션과 관리자 화면에서 보낸 호출 수 (자세한 내용은 실시간 지표 탭)")
+
+    if USE_SHARED_RESPONSE_CACHE:
+        shared_cache_stats = response_cache.get_shared_cache().stats()
+        st.caption(
+            f"공유 응답 캐시: 적중 {shared_cache_stats['hits']} / 미스 {shared_cache_stats['misses']} "
+            f"(적중률 {shared_cache_stats['hit_rate']:.0%}), "
+            f"{shared_cache_stats['entries']}개 항목, {shared_cache_stats['bytes'] / 1024:.0f} KB"
+        )
 
-    admin_tab1, admin_tab2, admin_tab3, admin_tab4 = st.tabs(["학생 목록", "대화 내용", "데이터 분석", "백업 다운로드"])
+    prompt_cache_stats = prompts.get_usage_stats().stats()
+    st.caption(
+        f"프롬프트 캐시: 입력 토큰 {prompt_cache_stats['prompt_tokens']:,}개 중 "
+        f"{prompt_cache_stats['cached_tokens']:,}개 캐시 처리 ({prompt_cache_stats['cached_rate']:.0%}), "
+        f"캐시 적중 요청 {prompt_cache_stats['cache_hit_requests']} / {prompt_cache_stats['requests']}"
+    )
+
+    scheduler_stats = request_scheduler.stats()
+    budget_students, budget_calls, budget_exhausted = student_budget.totals()
+    st.caption(
+        f"요청 스케줄러: 처리 {scheduler_stats['dispatched']}건, "
+        f"대기 중 대화 {scheduler_stats['waiting_interactive']}건 / 일괄 분석 {scheduler_stats['waiting_batch']}건, "
+        f"평균 대기 {scheduler_stats['avg_wait']:.1f}초 (최대 {scheduler_stats['max_wait']:.1f}초), "
+        f"429 응답 {scheduler_stats['rate_limited']}회 · "
+        f"학생 API 호출 누적 {budget_calls}회 ({budget_students}명, 한도 도달 {budget_exhausted}명)"
+    )
+
+    latency_rows = openai_client.get_latency_stats().stats()
+    if latency_rows:
+        with st.expander("⏱️ API 호출 지연 시간 (새 연결 수립 / 전체)"):
+            latency_df = pd.DataFrame(latency_rows)
+            latency_df.columns = ["엔드포인트", "호출 수", "새 연결 수", "연결 평균(초)", "전체 p50(초)", "전체 p95(초)"]
+            st.dataframe(latency_df.round(3), use_container_width=True, hide_index=True)
+
+    admin_tab1, admin_tab2, admin_tab3, admin_tab4, admin_tab5, admin_tab6 = st.tabs(
+        ["학생 목록", "대화 내용", "데이터 분석", "스토리보드 모음", "백업 다운로드", "실시간 지표"])
 
     with admin_tab1:
         st.subheader("등록된 학생 목록")
         try:
-            with open(STUDENTS_FILE, 'r', encoding='utf-8') as f:
-                students = json.load(f)
+            # 다시 로그인한 기록은 합쳐 학번별로 한 줄씩 보여줌
+            directory = backend.student_directory()
 
-            if students:
-                student_df = pd.DataFrame(students)
+            if len(directory):
+                student_df = pd.DataFrame(directory.rows())
                 st.dataframe(student_df)
-                st.info(f"총 {len(students)}명의 학생이 등록되었습니다.")
+                st.info(f"총 {len(directory)}명의 학생이 등록되었습니다. (접속 기록 {directory.record_count}건)")
                 csv = student_df.to_csv(index=False)
                 st.download_button(
                     label="학생 목록 다운로드 (CSV)",
@@ -740,43 +614,104 @@ if st.query_params.get("admin", "false") == "true":
     with admin_tab2:
         st.subheader("학생별 대화 내용")
         try:
-            with open(STUDENTS_FILE, 'r', encoding='utf-8') as f:
-                students = json.load(f)
-
-            if students:
-                student_options = [f"{s['student_name']} ({s['student_id']})" for s in students]
-                selected_student = st.selectbox("학생 선택", options=student_options)
-
-                selected_name, selected_id = selected_student.split(" (")
-                selected_id = selected_id.rstrip(")")
-
-                conversation_file = os.path.join(CONVERSATIONS_DIR, f"{selected_id}_{selected_name}.json")
-
-                if os.path.exists(conversation_file):
-                    with open(conversation_file, 'r', encoding='utf-8') as f:
-                        conversation = json.load(f)
+            directory = backend.student_directory()
+
+            if len(directory):
+                # 학생이 많아도 선택 목록에는 검색 결과만 올림 (학번으로 바로 찾으므로 이름을 다시 해석하지 않음)
+                col1, col2 = st.columns([1, 2])
+                with col1:
+                    selected_class = st.selectbox("반", ["전체"] + directory.classes())
+                with col2:
+                    student_query = st.text_input("학생 검색 (학번 또는 이름)")
+                matches = directory.search(student_query, None if selected_class == "전체" else selected_class,
+                                           limit=STUDENT_SEARCH_LIMIT + 1)
+                if len(matches) > STUDENT_SEARCH_LIMIT:
+                    st.caption(f"검색된 학생이 많아 {STUDENT_SEARCH_LIMIT}명까지만 보여줍니다. 검색어를 더 입력해 주세요.")
+                    matches = matches[:STUDENT_SEARCH_LIMIT]
+                selected_id = st.selectbox(
+                    "학생 선택", options=[student["student_id"] for student in matches],
+                    format_func=lambda student_id: f"{directory.get(student_id)['student_name']} ({student_id})"
+                )
 
-                    with st.expander("💬 대화 내용 전체 보기", expanded=True):
-                        for msg in conversation["messages"]:
+                student = directory.get(selected_id) if selected_id is not None else None
+                selected_name = student["student_name"] if student is not None else None
+                if student is not None and len(student["names"]) > 1:
+                    # 같은 학번으로 다른 이름을 쓴 경우 대화가 이름별로 따로 저장됨
+                    selected_name = st.selectbox("이름 (같은 학번으로 로그인한 이름)", student["names"][::-1])
+
+                if student is None:
+                    st.info("검색된 학생이 없습니다.")
+                elif backend.conversation_exists(selected_id, selected_name):
+                    # 대화 전체를 읽지 않고 기록 색인으로 거른 뒤 보이는 쪽의 메시지만 읽음
+                    transcript = backend.transcript_index(selected_id, selected_name)
+
+                    @st.fragment
+                    def show_transcript(transcript, key):
+                        """조건에 맞는 메시지를 한 쪽씩 보여줌 (쪽을 넘기거나 검색해도 이 부분만 다시 그림)"""
+                        col1, col2, col3 = st.columns([2, 3, 1])
+                        with col1:
+                            role_label = st.radio("보낸 사람", list(TRANSCRIPT_ROLES), horizontal=True,
+                                                  key=f"transcript_role_{key}")
+                        with col2:
+                            query = st.text_input("내용 검색", key=f"transcript_query_{key}")
+                        with col3:
+                            page_size = st.selectbox("쪽당 메시지 수", TRANSCRIPT_PAGE_SIZES,
+                                                     key=f"transcript_page_size_{key}")
+
+                        start = end = None
+                        first, last = transcript.time_range()
+                        try:
+                            first_time = datetime.strptime(first, TIMESTAMP_FORMAT) if first else None
+                            last_time = datetime.strptime(last, TIMESTAMP_FORMAT) if last else None
+                        except ValueError:
+                            first_time = last_time = None
+                        if first_time and last_time and first_time < last_time:
+                            start_time, end_time = st.slider(
+                                "시간 범위", min_value=first_time, max_value=last_time, value=(first_time, last_time),
+                                step=timedelta(minutes=1), format="MM/DD HH:mm", key=f"transcript_time_{key}"
+                            )
+                            start = start_time.strftime(TIMESTAMP_FORMAT) if start_time > first_time else None
+                            end = end_time.strftime(TIMESTAMP_FORMAT) if end_time < last_time else None
+
+                        positions = transcript.select(role=TRANSCRIPT_ROLES[role_label], start=start, end=end)
+                        positions = transcript.search(positions, query)
+                        if not positions:
+                            st.info("조건에 맞는 메시지가 없습니다.")
+                            return
+
+                        page_count = (len(positions) + page_size - 1) // page_size
+                        page = st.number_input("쪽", min_value=1, max_value=page_count, value=1, step=1,
+                                               key=f"transcript_page_{key}")
+                        st.caption(f"전체 {transcript.count()}개 중 {len(positions)}개 · {page}/{page_count}쪽")
+                        for msg in transcript.read(positions[(page - 1) * page_size:page * page_size]):
                             if msg["role"] == "user":
                                 st.info(f"**학생 ({msg['timestamp']}):**\n{msg['content']}")
                             elif msg["role"] == "assistant":
                                 st.success(f"**AI ({msg['timestamp']}):**\n{msg['content']}")
 
+                    with st.expander("💬 대화 내용 보기", expanded=True):
+                        show_transcript(transcript, selected_id)
+
                     st.markdown("---")
                     st.subheader("🎬 AI 스토리보드 분석기")
                     st.info("학생과의 대화 내용을 바탕으로 스토리보드 구성안을 자동으로 추출합니다.")
 
-                    analysis_key = f"analysis_{selected_id}"
-
                     if st.button("스토리보드 구조 추출하기", key=f"btn_extract_{selected_id}"):
                         with st.spinner("대화 내용을 분석하여 스토리보드를 재구성 중입니다..."):
-                            st.session_state[analysis_key] = extract_storyboard_structure(conversation["messages"])
-
-                    if analysis_key in st.session_state and st.session_state[analysis_key]:
-                        storyboard_data = st.session_state[analysis_key]
-
-                        st.success("분석 완료!")
+                            conversation = backend.load_conversation(selected_id, selected_name)
+                            entry, extracted = storyboards.extract_and_store(admin_client, storyboard_store,
+                                                                             conversation)
+                        if entry is None:
+                            st.error("스토리보드 내용을 추출하지 못했습니다. 대화 내용이 충분한지 확인해주세요.")
+                        elif not extracted:
+                            st.caption("대화 내용이 바뀌지 않아 저장된 추출 결과를 사용합니다.")
+
+                    # 추출 결과는 저장소에 남으므로 새로고침하거나 다른 관리자가 봐도 다시 추출하지 않음
+                    storyboard_entry = storyboard_store.latest(selected_id, selected_name)
+                    if storyboard_entry is not None:
+                        storyboard_data = storyboard_entry["result"]
+
+                        st.success(f"분석 완료! (추출 시각: {storyboard_entry['created_at']})")
                         col1, col2 = st.columns([1, 3])
                         with col1:
                             st.metric("제목", storyboard_data.get("title", "제목 없음"))
@@ -789,39 +724,92 @@ if st.query_params.get("admin", "false") == "true":
                         if scenes:
                             st.table(pd.DataFrame(scenes).set_index("scene_num"))
 
-                            st.markdown("### 🎨 주요 장면 시각화 (DALL-E 3)")
-                            st.caption("가장 첫 번째 장면을 예시로 생성합니다. (비용 발생 주의)")
-
-                            if st.button("첫 장면 이미지 생성하기", key=f"btn_img_{selected_id}"):
-                                first_scene = scenes[0]
-                                visual_desc = first_scene.get("visual", "")
-
-                                if visual_desc:
-                                    with st.spinner("DALL-E 3가 이미지를 그리고 있습니다..."):
-                                        image_url = generate_scene_image(f"{storyboard_data['theme']}. {visual_desc}")
-                                        if image_url:
-                                            st.image(image_url, caption=f"Scene 1: {visual_desc}")
-                                            st.success("이미지 생성 완료!")
-                                else:
-                                    st.warning("장면 설명이 부족하여 이미지를 생성할 수 없습니다.")
-
-                    elif analysis_key in st.session_state and st.session_state[analysis_key] is None:
-                        st.error("스토리보드 내용을 추출하지 못했습니다. 대화 내용이 충분한지 확인해주세요.")
-
-                    if "feedback" in conversation and conversation["feedback"]:
+                            st.markdown("### 🎨 장면 시각화 (DALL-E 3)")
+                            class_name = storage.class_of(selected_id)
+                            st.caption(f"모든 장면의 이미지를 한꺼번에 생성합니다. 한 번 만든 이미지는 저장해 두고 "
+                                       f"다시 요청하지 않습니다. (비용 발생 주의 · {class_name} 남은 이미지 "
+                                       f"{scene_image_budget.remaining(class_name)}/{scene_image_budget.limit}장)")
+
+                            scene_job = job_runner.store.latest(scene_images.SCENE_IMAGE_JOB_KIND)
+                            scene_job_active = scene_job is not None and scene_job["status"] in jobs.ACTIVE_STATUSES
+                            if st.button("모든 장면 이미지 생성하기", key=f"btn_img_{selected_id}",
+                                         disabled=scene_job_active):
+                                job_runner.submit(scene_images.SCENE_IMAGE_JOB_KIND,
+                                                  {"student_id": selected_id, "student_name": selected_name,
+                                                   "content_hash": storyboard_entry["content_hash"]})
+                                st.rerun()
+
+                            # 생성 중인 동안에는 이 부분만 2초마다 다시 그려 만들어진 이미지부터 보여줌
+                            @st.fragment(run_every=2 if scene_job_active else None)
+                            def show_scene_images(student_id, student_name, storyboard_data):
+                                job = job_runner.store.latest(scene_images.SCENE_IMAGE_JOB_KIND)
+                                if job is not None and (job["params"].get("student_id"), job["params"].get(
+                                        "student_name")) != (student_id, student_name):
+                                    if job["status"] in jobs.ACTIVE_STATUSES:
+                                        st.caption("다른 학생의 장면 이미지를 생성하는 중입니다. 끝난 뒤에 다시 눌러주세요.")
+                                    job = None
+                                if job is not None:
+                                    if scene_job_active and job["status"] not in jobs.ACTIVE_STATUSES:
+                                        st.rerun()
+                                    if job["status"] in jobs.ACTIVE_STATUSES:
+                                        progress = job["done"] / job["total"] if job["total"] else 0.0
+                                        st.progress(progress)
+                                        st.text(f'이미지 생성 중... {job["done"]}/{job["total"]}장면')
+                                        if not job["cancel_requested"] and st.button(
+                                                "이미지 생성 취소", key=f"cancel_scene_images_{student_id}"):
+                                            job_runner.cancel(job["id"])
+                                    elif job["status"] == jobs.COMPLETED:
+                                        statuses = [row["status"] for row in job_runner.store.results(job["id"])]
+                                        st.caption(f'최근 생성: {job["updated_at"]} - 새로 생성 '
+                                                   f'{statuses.count(scene_images.GENERATED)}장, 저장된 이미지 사용 '
+                                                   f'{statuses.count(scene_images.CACHED)}장')
+                                    else:
+                                        labels = {jobs.FAILED: "실패", jobs.CANCELLED: "취소됨",
+                                                  jobs.INTERRUPTED: "중단됨"}
+                                        st.warning(f'최근 이미지 생성이 {labels[job["status"]]} 상태입니다. '
+                                                   f'({job["done"]}/{job["total"]}장면 저장됨)'
+                                                   + (f' 오류: {job["error"]}' if job["error"] else ''))
+                                        if st.button("이어서 생성", key=f"resume_scene_images_{student_id}"):
+                                            job_runner.resume(job["id"])
+                                            st.rerun()
+
+                                # 저장된 이미지만 찾아 보여줌 (새로 요청하지 않음)
+                                scene_results = scene_images.scene_images(scene_image_cache, image_store,
+                                                                          storyboard_data)
+                                if any(image_id for _, image_id in scene_results):
+                                    columns = st.columns(min(4, len(scene_results)))
+                                    for index, (scene, image_id) in enumerate(scene_results):
+                                        with columns[index % len(columns)]:
+                                            caption = f"Scene {scene.get('scene_num', index + 1)}: {scene.get('visual', '')}"
+                                            thumbnail = image_store.thumbnail(image_id) if image_id else None
+                                            if thumbnail is not None:
+                                                st.image(thumbnail, caption=caption)
+                                            else:
+                                                st.caption(f"{caption} (이미지 없음)")
+
+                            show_scene_images(selected_id, selected_name, storyboard_data)
+
+                    feedback_records = transcript.read(transcript.select(kind=storage.FEEDBACK),
+                                                       kind=storage.FEEDBACK)
+                    if feedback_records:
                         st.subheader("피드백 기록")
-                        for feedback in conversation["feedback"]:
+                        for feedback in feedback_records:
                             st.warning(f"**피드백 ({feedback['timestamp']}):**\n{feedback['content']}")
 
-                    conversation_json = json.dumps(conversation, ensure_ascii=False, indent=2)
-                    st.download_button(
-                        label="대화 내용 다운로드 (JSON)",
-                        data=conversation_json,
-                        file_name=f"{selected_id}_{selected_name}_대화.json",
-                        mime="application/json"
-                    )
+                    # 다운로드 파일은 요청할 때만 대화 전체를 읽어 만듦
+                    download_key = f"transcript_download_{selected_id}"
+                    if st.button("대화 내용 다운로드 준비 (JSON)", key=f"btn_download_{selected_id}"):
+                        conversation = backend.load_conversation(selected_id, selected_name)
+                        st.session_state[download_key] = json.dumps(conversation, ensure_ascii=False, indent=2)
+                    if download_key in st.session_state:
+                        st.download_button(
+                            label="대화 내용 다운로드 (JSON)",
+                            data=st.session_state[download_key],
+                            file_name=f"{selected_id}_{selected_name}_대화.json",
+                            mime="application/json"
+                        )
                 else:
-                    st.error(f"대화 파일을 찾을 수 없습니다: {conversation_file}")
+                    st.error(f"대화 기록을 찾을 수 없습니다: {selected_id}_{selected_name}")
             else:
                 st.info("아직 등록된 학생이 없습니다.")
         except Exception as e:
@@ -831,15 +819,10 @@ if st.query_params.get("admin", "false") == "true":
         st.subheader("데이터 분석")
 
         try:
-            all_conversations = []
-            for filename in os.listdir(CONVERSATIONS_DIR):
-                if filename.endswith('.json'):
-                    file_path = os.path.join(CONVERSATIONS_DIR, filename)
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        conversation = json.load(f)
-                        all_conversations.append(conversation)
-
-            if all_conversations:
+            # 바뀐 학생의 대화만 다시 읽어 요약 (나머지는 이전 계산 결과 재사용)
+            student_summaries = analysis.get_summary_index(backend).refresh()
+
+            if student_summaries:
                 analysis_method = st.radio(
                     "분석 방법 선택:",
                     ["빠른 분석 (기존 방식)", "정밀 분석 (GPT 활용)"],
@@ -847,27 +830,69 @@ if st.query_params.get("admin", "false") == "true":
                 )
 
                 if analysis_method == "정밀 분석 (GPT 활용)":
-                    if st.button("GPT 분석 시작", type="primary"):
-                        progress_bar = st.progress(0)
-                        status_text = st.empty()
-
-                        def update_progress(current, total):
-                            progress = current / total
-                            progress_bar.progress(progress)
-                            status_text.text(f'분석 진행 중... {current}/{total} ({progress:.1%})')
-
-                        with st.spinner("GPT를 활용한 정밀 분석 중..."):
-                            student_message_data = analyze_conversations_with_gpt(
-                                all_conversations,
-                                progress_callback=update_progress
-                            )
+                    max_workers = st.number_input(
+                        "동시 분석 요청 수",
+                        min_value=1,
+                        max_value=32,
+                        value=analysis.DEFAULT_MAX_WORKERS,
+                        help="한 번에 보내는 GPT 요청 수입니다. 요청 한도(429) 오류가 잦으면 줄여주세요."
+                    )
 
-                        progress_bar.empty()
-                        status_text.text("분석 완료!")
-                        st.session_state.gpt_analysis_result = student_message_data
+                    analysis_job = job_runner.store.latest(analysis.ANALYSIS_JOB_KIND)
+                    job_active = analysis_job is not None and analysis_job["status"] in jobs.ACTIVE_STATUSES
+
+                    if st.button("GPT 분석 시작", type="primary", disabled=job_active):
+                        job_runner.submit(analysis.ANALYSIS_JOB_KIND, {"max_workers": int(max_workers)})
+                        st.rerun()
+
+                    # 진행 중인 동안에는 이 부분만 2초마다 다시 그림 (작업이 끝나면 전체를 새로 그려 결과 표시)
+                    @st.fragment(run_every=2 if job_active else None)
+                    def show_analysis_job():
+                        job = job_runner.store.latest(analysis.ANALYSIS_JOB_KIND)
+                        if job is None:
+                            return
+                        if job_active and job["status"] not in jobs.ACTIVE_STATUSES:
+                            st.rerun()
+
+                        progress = job["done"] / job["total"] if job["total"] else 0.0
+                        if job["status"] in jobs.ACTIVE_STATUSES:
+                            st.progress(progress)
+                            st.text(f'분석 진행 중... {job["done"]}/{job["total"]}명 ({progress:.1%})')
+                            if job["cancel_requested"]:
+                                st.caption("취소 요청됨 - 지금 분석 중인 학생까지 저장한 뒤 멈춥니다.")
+                            elif st.button("분석 취소", key="cancel_analysis_job"):
+                                job_runner.cancel(job["id"])
+                        elif job["status"] == jobs.COMPLETED:
+                            st.caption(f'최근 분석: {job["updated_at"]} 완료 ({job["total"]}명)')
+                        else:
+                            labels = {jobs.FAILED: "실패", jobs.CANCELLED: "취소됨", jobs.INTERRUPTED: "중단됨"}
+                            st.warning(f'최근 분석이 {labels[job["status"]]} 상태입니다. '
+                                       f'({job["done"]}/{job["total"]}명 저장됨)'
+                                       + (f' 오류: {job["error"]}' if job["error"] else ''))
+                            if st.button("이어서 분석", key="resume_analysis_job"):
+                                job_runner.resume(job["id"])
+                                st.rerun()
+
+                    show_analysis_job()
+
+                    # 최근 분석 작업 전체의 집계 (묶음마다 더해 작업에 저장된 값)
+                    run_stats = analysis_job["summary"] if analysis_job is not None else {}
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1:
+                        st.metric("로컬 판정 (최근 분석)", run_stats.get("relevant", 0) + run_stats.get("irrelevant", 0),
+                                  help=f"관련됨 {run_stats.get('relevant', 0)} · 관련없음 {run_stats.get('irrelevant', 0)} · "
+                                       f"GPT로 판단 {run_stats.get('ambiguous', 0)} (인사·단순 응답과 주제가 분명한 메시지는 GPT를 부르지 않음)")
+                    with col2:
+                        st.metric("캐시 적중 (최근 분석)", run_stats.get("hits", 0),
+                                  help=f"서버 실행 후 누적: {relevance_cache.hits}")
+                    with col3:
+                        st.metric("캐시 미스 (최근 분석)", run_stats.get("misses", 0),
+                                  help=f"서버 실행 후 누적: {relevance_cache.misses}")
+                    with col4:
+                        st.metric("저장된 판정 수", relevance_cache.size())
 
-                    if hasattr(st.session_state, 'gpt_analysis_result'):
-                        student_message_data = st.session_state.gpt_analysis_result
+                    if analysis_job is not None and analysis_job["status"] == jobs.COMPLETED:
+                        student_message_data = job_runner.store.results(analysis_job["id"])
 
                         def evaluate_grade(prompt_count):
                             if prompt_count >= 5:
@@ -922,11 +947,9 @@ if st.query_params.get("admin", "false") == "true":
                         st.info("👆 위의 'GPT 분석 시작' 버튼을 클릭하여 정밀 분석을 시작하세요.")
 
                 else:
-                    total_messages = sum(len(conv["messages"]) for conv in all_conversations)
-                    user_messages = sum(
-                        sum(1 for msg in conv["messages"] if msg["role"] == "user") for conv in all_conversations)
-                    assistant_messages = sum(
-                        sum(1 for msg in conv["messages"] if msg["role"] == "assistant") for conv in all_conversations)
+                    total_messages = sum(row["total_messages"] for row in student_summaries)
+                    user_messages = sum(row["user_messages"] for row in student_summaries)
+                    assistant_messages = sum(row["assistant_messages"] for row in student_summaries)
 
                     col1, col2, col3 = st.columns(3)
                     with col1:
@@ -937,28 +960,14 @@ if st.query_params.get("admin", "false") == "true":
                         st.metric("AI 응답 수", assistant_messages)
 
                     student_message_data = []
-                    for conv in all_conversations:
-                        student_name = conv["student_name"]
-                        student_id = conv["student_id"]
-                        user_msg_count = sum(1 for msg in conv["messages"] if msg["role"] == "user")
-                        assistant_msg_count = sum(1 for msg in conv["messages"] if msg["role"] == "assistant")
-
-                        if conv["messages"]:
-                            first_msg_time = datetime.strptime(conv["messages"][0]["timestamp"], "%Y-%m-%d %H:%M:%S")
-                            last_msg_time = datetime.strptime(conv["messages"][-1]["timestamp"], "%Y-%m-%d %H:%M:%S")
-                            duration = (last_msg_time - first_msg_time).total_seconds() / 60
-                        else:
-                            duration = 0
-
-                        has_feedback = "feedback" in conv and len(conv["feedback"]) > 0
-
+                    for row in student_summaries:
                         student_message_data.append({
-                            "학생명": student_name,
-                            "학번": student_id,
-                            "학생 메시지 수": user_msg_count,
-                            "AI 응답 수": assistant_msg_count,
-                            "대화 시간(분)": round(duration, 1),
-                            "피드백 여부": "O" if has_feedback else "X"
+                            "학생명": row["student_name"],
+                            "학번": row["student_id"],
+                            "학생 메시지 수": row["user_messages"],
+                            "AI 응답 수": row["assistant_messages"],
+                            "대화 시간(분)": row["duration"],
+                            "피드백 여부": "O" if row["has_feedback"] else "X"
                         })
 
                     def evaluate_grade_simple(prompt_count):
@@ -1010,31 +1019,262 @@ if st.query_params.get("admin", "false") == "true":
             st.error(f"상세 오류: {traceback.format_exc()}")
 
     with admin_tab4:
+        st.subheader("학급 스토리보드 모음")
+        st.info("모든 학생의 대화에서 스토리보드 구성안을 한꺼번에 추출합니다. "
+                "지난 추출 뒤로 대화가 바뀌지 않은 학생은 다시 추출하지 않습니다.")
+
+        try:
+            storyboard_workers = st.number_input(
+                "동시 추출 요청 수",
+                min_value=1,
+                max_value=16,
+                value=storyboards.DEFAULT_MAX_WORKERS,
+                help="한 번에 보내는 GPT 요청 수입니다. 요청 한도(429) 오류가 잦으면 줄여주세요."
+            )
+
+            storyboard_job = job_runner.store.latest(storyboards.STORYBOARD_JOB_KIND)
+            storyboard_job_active = storyboard_job is not None and storyboard_job["status"] in jobs.ACTIVE_STATUSES
+
+            if st.button("전체 스토리보드 추출", type="primary", disabled=storyboard_job_active):
+                job_runner.submit(storyboards.STORYBOARD_JOB_KIND, {"max_workers": int(storyboard_workers)})
+                st.rerun()
+
+            # 진행 중인 동안에는 이 부분만 2초마다 다시 그림 (작업이 끝나면 전체를 새로 그려 결과 표시)
+            @st.fragment(run_every=2 if storyboard_job_active else None)
+            def show_storyboard_job():
+                job = job_runner.store.latest(storyboards.STORYBOARD_JOB_KIND)
+                if job is None:
+                    return
+                if storyboard_job_active and job["status"] not in jobs.ACTIVE_STATUSES:
+                    st.rerun()
+
+                progress = job["done"] / job["total"] if job["total"] else 0.0
+                if job["status"] in jobs.ACTIVE_STATUSES:
+                    st.progress(progress)
+                    st.text(f'추출 진행 중... {job["done"]}/{job["total"]}명 ({progress:.1%})')
+                    if job["cancel_requested"]:
+                        st.caption("취소 요청됨 - 지금 추출 중인 학생까지 저장한 뒤 멈춥니다.")
+                    elif st.button("추출 취소", key="cancel_storyboard_job"):
+                        job_runner.cancel(job["id"])
+                elif job["status"] == jobs.COMPLETED:
+                    statuses = [row["status"] for row in job_runner.store.results(job["id"])]
+                    st.caption(f'최근 추출: {job["updated_at"]} 완료 - 새로 추출 '
+                               f'{statuses.count(storyboards.EXTRACTED)}명, 저장된 결과 사용 '
+                               f'{statuses.count(storyboards.CACHED)}명, 실패 {statuses.count(storyboards.FAILED)}명')
+                else:
+                    labels = {jobs.FAILED: "실패", jobs.CANCELLED: "취소됨", jobs.INTERRUPTED: "중단됨"}
+                    st.warning(f'최근 추출이 {labels[job["status"]]} 상태입니다. '
+                               f'({job["done"]}/{job["total"]}명 저장됨)'
+                               + (f' 오류: {job["error"]}' if job["error"] else ''))
+                    if st.button("이어서 추출", key="resume_storyboard_job"):
+                        job_runner.resume(job["id"])
+                        st.rerun()
+
+            show_storyboard_job()
+
+            # 학생별 최근 추출 결과와 지금 대화의 해시를 비교해 대화가 바뀐 학생을 표시
+            current_hashes = {(entry["student_id"], entry["student_name"]): entry["content_hash"]
+                              for entry in storyboards.get_hash_index(backend).refresh()}
+            storyboard_entries = storyboard_store.latest_all()
+            if storyboard_entries:
+                storyboard_rows = []
+                for entry in storyboard_entries:
+                    storyboard_data = entry["result"]
+                    scenes = storyboard_data.get("scenes", [])
+                    storyboard_rows.append({
+                        "학번": entry["student_id"],
+                        "이름": entry["student_name"],
+                        "반": storage.class_of(entry["student_id"]),
+                        "제목": storyboard_data.get("title", "제목 없음"),
+                        "주제": storyboard_data.get("theme", "주제 미정"),
+                        "장면 수": len(scenes),
+                        "장면": " / ".join(scene.get("visual", "") for scene in scenes),
+                        "상태": ("최신" if current_hashes.get((entry["student_id"], entry["student_name"]))
+                                 == entry["content_hash"] else "대화 바뀜"),
+                        "추출 시각": entry["created_at"],
+                    })
+                storyboard_df = pd.DataFrame(storyboard_rows)
+
+                changed = int((storyboard_df["상태"] == "대화 바뀜").sum())
+                st.caption(f"추출한 학생 {len(storyboard_df)}명 / 대화가 있는 학생 {len(current_hashes)}명"
+                           + (f" · 추출 뒤 대화가 바뀐 학생 {changed}명" if changed else ""))
+
+                storyboard_class = st.selectbox("반", ["전체"] + list(dict.fromkeys(storyboard_df["반"])),
+                                                key="storyboard_class")
+                if storyboard_class != "전체":
+                    storyboard_df = storyboard_df[storyboard_df["반"] == storyboard_class]
+                st.dataframe(storyboard_df, use_container_width=True, hide_index=True)
+
+                st.download_button(
+                    label="스토리보드 모음 다운로드 (CSV)",
+                    data=storyboard_df.to_csv(index=False),
+                    file_name="스토리보드_모음.csv",
+                    mime="text/csv"
+                )
+            else:
+                st.info("아직 추출한 스토리보드가 없습니다. 위의 '전체 스토리보드 추출' 버튼을 눌러 주세요.")
+        except Exception as e:
+            st.error(f"스토리보드 모음 로드 중 오류: {str(e)}")
+
+    with admin_tab5:
         st.subheader("전체 데이터 백업")
 
-        if st.button("모든 데이터 ZIP으로 다운로드"):
-            import zipfile
-            import io
-
-            zip_buffer = io.BytesIO()
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                if os.path.exists(STUDENTS_FILE):
-                    with open(STUDENTS_FILE, 'r', encoding='utf-8') as f:
-                        zipf.writestr("students.json", f.read())
-
-                for filename in os.listdir(CONVERSATIONS_DIR):
-                    if filename.endswith('.json'):
-                        file_path = os.path.join(CONVERSATIONS_DIR, filename)
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            zipf.writestr(f"conversations/{filename}", f.read())
-
-            zip_buffer.seek(0)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            st.download_button(
-                label="데이터 백업 다운로드",
-                data=zip_buffer,
-                file_name=f"storyboard_data_backup_{timestamp}.zip",
-                mime="application/zip"
+        # 파일을 바이트 그대로 임시 파일에 조금씩 써서 만들고 data/backups/에 남김 (전체를 메모리에 올리지 않음)
+        last_backup = backup_exporter.load_state()
+        if last_backup is not None:
+            st.caption(f"최근 백업: {last_backup['created_at']} ({last_backup['archive']})")
+        backup_col1, backup_col2 = st.columns(2)
+        with backup_col1:
+            full_backup_clicked = st.button("전체 백업 만들기")
+        with backup_col2:
+            incremental_backup_clicked = st.button("변경분만 백업하기", disabled=last_backup is None,
+                                                   help="최근 백업 이후 새로 생기거나 바뀐 파일만 담습니다.")
+
+        if full_backup_clicked or incremental_backup_clicked:
+            try:
+                with st.spinner("백업 파일을 만드는 중입니다..."):
+                    st.session_state.backup_result = backup_exporter.export(incremental=incremental_backup_clicked)
+            except Exception as e:
+                st.error(f"백업 중 오류 발생: {str(e)}")
+            else:
+                # 최근 백업 정보와 변경분 백업 버튼을 새 백업 기준으로 다시 그림
+                st.rerun()
+
+        backup_result = st.session_state.get("backup_result")
+        if backup_result is not None and os.path.exists(backup_result["path"]):
+            mode_label = "전체" if backup_result["mode"] == backup.FULL else "변경분"
+            st.success(
+                f"{mode_label} 백업을 만들었습니다: 파일 {backup_result['files']}개 중 {backup_result['included']}개 포함"
+                + (f", 삭제된 파일 {backup_result['removed']}개" if backup_result['removed'] else "")
+                + f" (압축 파일 {backup_result['archive_bytes'] / 1024:,.0f} KB)"
+            )
+            with open(backup_result["path"], 'rb') as backup_file:
+                st.download_button(
+                    label="데이터 백업 다운로드",
+                    data=backup_file,
+                    file_name=backup_result["archive"],
+                    mime="application/zip"
+                )
+            st.caption("압축 파일 안의 manifest.json에 모든 파일의 해시가 있습니다. 변경분 백업은 전체 백업 위에 "
+                       "순서대로 풀어 복원합니다.")
+
+    with admin_tab6:
+        st.subheader("실시간 지표")
+        st.caption("서버 프로세스 전체(모든 학생 세션)의 값입니다. 서버를 다시 시작하면 처음부터 다시 셉니다. "
+                   f"{METRICS_REFRESH_SECONDS}초마다 새로 고칩니다.")
+
+        def timeline_frame(name, label=None):
+            rows = metrics.get_registry().timeline(name, label)
+            if not rows:
+                return pd.DataFrame()
+            return pd.DataFrame(rows).set_index("time").fillna(0)
+
+        @st.fragment(run_every=METRICS_REFRESH_SECONDS)
+        def show_metrics():
+            requests_by_key = scheduler.API_REQUESTS.values()
+            tokens_by_key = scheduler.API_TOKENS.values()
+            latency_by_model = {row["model"]: row for row in scheduler.API_SECONDS.summary()}
+            models = sorted({model for model, _, _ in requests_by_key})
+
+            model_rows = []
+            for model in models:
+                calls = sum(value for (m, _, _), value in requests_by_key.items() if m == model)
+                ok_calls = sum(value for (m, _, outcome), value in requests_by_key.items()
+                               if m == model and outcome == "ok")
+                prompt_tokens = tokens_by_key.get((model, "prompt"), 0)
+                cached_tokens = tokens_by_key.get((model, "cached"), 0)
+                completion_tokens = tokens_by_key.get((model, "completion"), 0)
+                latency = latency_by_model.get(model, {})
+                model_rows.append({
+                    "모델": model,
+                    "호출 수": calls,
+                    "실패": calls - ok_calls,
+                    "입력 토큰": prompt_tokens,
+                    "캐시 처리 입력": cached_tokens,
+                    "출력 토큰": completion_tokens,
+                    "평균(초)": latency.get("avg", 0.0),
+                    "p95(초, 구간 상한)": latency.get("p95", 0.0),
+                    "예상 비용($)": metrics.estimate_cost(model, prompt_tokens, cached_tokens, completion_tokens,
+                                                       images=ok_calls),
+                })
+
+            total_calls = sum(row["호출 수"] for row in model_rows)
+            total_cost = sum(row["예상 비용($)"] or 0.0 for row in model_rows)
+            retries = analysis.RETRIES.total()
+            col1, col2, col3, col4, col5 = st.columns(5)
+            col1.metric("API 호출", total_calls)
+            col2.metric("실패", sum(row["실패"] for row in model_rows),
+                        help="요청 한도(429)·연결 오류·중간에 끊긴 스트림 포함")
+            col3.metric("재시도", int(retries), help="일괄 분석의 재시도와 SDK 자동 재시도")
+            col4.metric("토큰 (입력/출력)", f"{int(sum(row['입력 토큰'] for row in model_rows)):,} / "
+                                         f"{int(sum(row['출력 토큰'] for row in model_rows)):,}")
+            col5.metric("예상 비용", f"${total_cost:.2f}", help="metrics.MODEL_PRICES 기준 어림값")
+
+            if not model_rows:
+                st.info("아직 API 호출이 없습니다.")
+            else:
+                st.dataframe(pd.DataFrame(model_rows).round(4), use_container_width=True, hide_index=True)
+
+                st.markdown(f"**최근 1시간 추이** ({metrics.TIMELINE_INTERVAL:.0f}초 단위)")
+                chart_col1, chart_col2, chart_col3 = st.columns(3)
+                with chart_col1:
+                    st.caption("모델별 호출 수")
+                    st.line_chart(timeline_frame("openai_requests_total", "model"))
+                with chart_col2:
+                    st.caption("토큰 수 (prompt 중 cached는 캐시 처리분)")
+                    st.line_chart(timeline_frame("openai_tokens_total", "kind"))
+                with chart_col3:
+                    st.caption("모델별 평균 응답 시간(초)")
+                    latency_sum = timeline_frame("openai_request_seconds_sum", "model")
+                    latency_count = timeline_frame("openai_request_seconds_count", "model")
+                    if not latency_count.empty:
+                        st.line_chart(latency_sum / latency_count.replace(0, float("nan")))
+
+            st.markdown("**저장 시간**")
+            write_rows = storage.WRITE_SECONDS.summary()
+            if write_rows:
+                write_df = pd.DataFrame(write_rows)
+                write_df.columns = ["저장소", "작업", "횟수", "평균(초)", "p50(초, 구간 상한)", "p95(초, 구간 상한)"]
+                st.dataframe(write_df.round(4), use_container_width=True, hide_index=True)
+            lock_stats = storage.get_lock_stats().stats()
+            queue_rows = {row["lane"]: row for row in scheduler.QUEUE_SECONDS.summary()}
+            st.caption(
+                f"파일 잠금 {lock_stats['acquisitions']}회 중 대기 {lock_stats['contended']}회 "
+                f"(최대 {lock_stats['max_wait'] * 1000:.1f}ms) · 스케줄러 대기 평균 "
+                f"대화 {queue_rows.get('interactive', {}).get('avg', 0.0):.2f}초 / "
+                f"일괄 분석 {queue_rows.get('batch', {}).get('avg', 0.0):.2f}초"
             )
 
-            st.success("데이터가 성공적으로 압축되었습니다. 다운로드 버튼을 클릭하여 백업 파일을 저장하세요.")
+            st.markdown("**캐시**")
+            cache_rows = []
+            for (cache, result), value in sorted(response_cache.LOOKUPS.values().items()):
+                cache_rows.append({"캐시": f"응답 캐시 ({'공유' if cache == 'shared' else '세션'})",
+                                   "결과": "적중" if result == "hit" else "미스", "횟수": value})
+            for (result,), value in sorted(analysis.VERDICT_CACHE_LOOKUPS.values().items()):
+                cache_rows.append({"캐시": "관련성 판정 캐시", "결과": "적중" if result == "hit" else "미스",
+                                   "횟수": value})
+            for (verdict,), value in sorted(prefilter.VERDICTS.values().items()):
+                labels = {"relevant": "로컬 판정 관련됨", "irrelevant": "로컬 판정 관련없음", "ambiguous": "GPT로 판단"}
+                cache_rows.append({"캐시": "로컬 사전 분류", "결과": labels[verdict], "횟수": value})
+            prompt_tokens = sum(value for (_, kind), value in tokens_by_key.items() if kind == "prompt")
+            cached_tokens = sum(value for (_, kind), value in tokens_by_key.items() if kind == "cached")
+            if prompt_tokens:
+                cache_rows.append({"캐시": "프롬프트 캐시 (입력 토큰)", "결과": "적중", "횟수": cached_tokens})
+                cache_rows.append({"캐시": "프롬프트 캐시 (입력 토큰)", "결과": "미스",
+                                   "횟수": prompt_tokens - cached_tokens})
+            if cache_rows:
+                st.dataframe(pd.DataFrame(cache_rows), use_container_width=True, hide_index=True)
+
+        show_metrics()
+
+        prometheus_text = metrics.get_registry().render()
+        st.download_button(
+            label="지표 내보내기 (Prometheus 텍스트)",
+            data=prometheus_text,
+            file_name=f"storyboard_metrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prom",
+            mime="text/plain"
+        )
+        with st.expander("Prometheus 텍스트 보기"):
+            st.caption("서버를 METRICS_PORT 환경변수와 함께 실행하면 Prometheus가 "
+                       "http://서버주소:포트/metrics 에서 같은 내용을 주기적으로 수집할 수 있습니다.")
+            st.code(prometheus_text, language="text")